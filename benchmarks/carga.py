@@ -0,0 +1,311 @@
+# benchmarks/carga.py
+"""
+Prueba de carga de la API contra un PostgREST local (el falso de postgrest_falso.py
+o un Postgres + PostgREST propio) con una mezcla de requests realista.
+
+Uso:
+    python benchmarks/carga.py                                   # 16 conexiones, 30 s
+    python benchmarks/carga.py --concurrencia 64 --duracion 60 --workers 4
+    python benchmarks/carga.py --mezcla listado=1,detalle=4 --salida resultados/v1.json
+    python benchmarks/carga.py --comparar resultados/v1.json      # diferencia contra otra corrida
+    python benchmarks/carga.py --supabase-url http://localhost:3000 --supabase-key <jwt>
+
+Levanta el PostgREST falso (salvo que se pase --supabase-url) y la API con uvicorn en
+subprocesos, siembra carpetas de operaciones en un BASE_DIR temporal y reparte las
+requests entre los escenarios según los pesos de --mezcla. Los primeros --calentamiento
+segundos no se miden. Informa throughput y latencias p50/p95/p99 por escenario y en total;
+con --salida se guarda el resultado en JSON para comparar entre versiones.
+
+Requiere httpx y uvicorn (ya están en requirements.txt).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLAVE_FALSA = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark"
+
+logging.basicConfig(level="INFO", format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("ganbatte_carga")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+MEZCLA_POR_DEFECTO = "listado=30,detalle=35,crear=10,costos=15,archivos=10"
+SUBCARPETAS = ["Cotizaciones", "Documentos", "Facturas", "Fotos"]
+
+
+# -----------------------
+# Escenarios
+# -----------------------
+def payload_cotizacion(azar: random.Random, clientes: List[str]) -> Dict[str, Any]:
+    maritima = azar.random() < 0.6
+    return {
+        "cliente": azar.choice(clientes),
+        "tipo_operacion": "IM" if maritima else "IA",
+        "modo_transporte": "Maritima FCL" if maritima else "Aerea",
+        "incoterm_origen": "FOB", "incoterm_destino": "CIF",
+        "origen": "Shanghai" if maritima else "Miami", "destino": "San Antonio" if maritima else "Santiago",
+        "validez_dias": 15,
+        "linea_maritima": "MSC" if maritima else None,
+        "aerolinea": None if maritima else "LATAM",
+        "tipo_contenedor": azar.choice(["20DV", "40DV", "40HC"]) if maritima else None,
+        "cantidad_contenedores": azar.randint(1, 3),
+        "valor_comercial": round(azar.uniform(5000, 90000), 2),
+        "peso_total_kg": round(azar.uniform(100, 20000), 1),
+        "volumen_m3": round(azar.uniform(1, 60), 2),
+    }
+
+
+def payload_costos(azar: random.Random, codigo: str) -> Dict[str, Any]:
+    conceptos = ["Flete marítimo", "THC", "Documentación", "Seguro", "Transporte terrestre", "Agenciamiento", "Handling"]
+    costos = []
+    for concepto in azar.sample(conceptos, azar.randint(3, len(conceptos))):
+        costo = round(azar.uniform(30, 3000), 2)
+        costos.append({"concepto": concepto, "costo": costo, "venta": round(costo * 1.2, 2), "tipo": "Otro"})
+    return {"codigo_cotizacion": codigo, "costos": costos}
+
+
+def armar_request(escenario: str, azar: random.Random, datos: Dict[str, List[str]]):
+    """(método, path, json) del escenario con datos elegidos al azar entre los sembrados."""
+    if escenario == "listado":
+        return "GET", "/cotizaciones", None
+    if escenario == "detalle":
+        return "GET", f"/cotizaciones/{azar.choice(datos['cotizaciones'])}", None
+    if escenario == "crear":
+        return "POST", "/cotizaciones", payload_cotizacion(azar, datos["clientes"])
+    if escenario == "costos":
+        return "POST", "/costos_personalizados/guardar", payload_costos(azar, azar.choice(datos["cotizaciones"]))
+    if escenario == "archivos":
+        return "GET", f"/operaciones/{azar.choice(datos['operaciones'])}/archivos", None
+    raise ValueError(f"Escenario desconocido: {escenario}")
+
+
+# -----------------------
+# Preparación
+# -----------------------
+def leer_mezcla(texto: str) -> Dict[str, float]:
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.partition("=")
+        mezcla[nombre.strip()] = float(peso or 1)
+    return mezcla
+
+
+def leer_datos_sembrados(supabase_url: str, supabase_key: str) -> Dict[str, List[str]]:
+    headers = {"apikey": supabase_key, "Authorization": f"Bearer {supabase_key}"}
+    with httpx.Client(base_url=f"{supabase_url}/rest/v1", headers=headers, timeout=30) as cliente:
+        cotizaciones = cliente.get("/cotizaciones", params={"select": "codigo_legible,codigo_operacion"}).json()
+        clientes = cliente.get("/clientes", params={"select": "nombre", "activo": "eq.true"}).json()
+    return {
+        "cotizaciones": [c["codigo_legible"] for c in cotizaciones if c.get("codigo_legible")],
+        "operaciones": [c["codigo_operacion"] for c in cotizaciones if c.get("codigo_operacion")],
+        # La carpeta de una operación lleva el código de su cotización
+        "carpetas": [c["codigo_legible"] for c in cotizaciones if c.get("codigo_operacion")],
+        "clientes": [c["nombre"] for c in clientes],
+    }
+
+
+def sembrar_carpetas(base_dir: str, cotizaciones: List[str], archivos_por_subcarpeta: int = 5):
+    """Carpetas de operación con archivos, como las crea /crear_carpeta/ y /guardar-pdf-carpeta."""
+    for codigo in cotizaciones:
+        for subcarpeta in SUBCARPETAS:
+            ruta = os.path.join(base_dir, codigo.replace("/", os.sep), subcarpeta)
+            os.makedirs(ruta, exist_ok=True)
+            for i in range(archivos_por_subcarpeta):
+                with open(os.path.join(ruta, f"documento_{i + 1}.pdf"), "wb") as f:
+                    f.write(b"%PDF-1.4\n" + os.urandom(512))
+
+
+def esperar_servidor(url: str, segundos: float = 30):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió en {url}")
+
+
+# -----------------------
+# Carga
+# -----------------------
+async def ejecutar_carga(url_api: str, mezcla: Dict[str, float], datos: Dict[str, List[str]],
+                         concurrencia: int, duracion: float, calentamiento: float, semilla: int):
+    muestras: List[tuple] = []
+    escenarios, pesos = list(mezcla), list(mezcla.values())
+    inicio_medicion = time.perf_counter() + calentamiento
+    fin = inicio_medicion + duracion
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+
+    async with httpx.AsyncClient(base_url=url_api, limits=limites, timeout=60) as cliente:
+        async def usuario(numero: int):
+            azar = random.Random(semilla + numero)
+            while True:
+                escenario = azar.choices(escenarios, weights=pesos)[0]
+                metodo, path, cuerpo = armar_request(escenario, azar, datos)
+                inicio = time.perf_counter()
+                if inicio >= fin:
+                    return
+                try:
+                    respuesta = await cliente.request(metodo, path, json=cuerpo)
+                    estado = respuesta.status_code
+                except httpx.HTTPError:
+                    estado = 0
+                termino = time.perf_counter()
+                if inicio >= inicio_medicion:
+                    muestras.append((escenario, termino - inicio, estado))
+
+        await asyncio.gather(*(usuario(i) for i in range(concurrencia)))
+    return muestras
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, int(round(p / 100 * len(valores) + 0.5)) - 1))
+    return valores[indice]
+
+
+def resumir(muestras: List[tuple], duracion: float) -> Dict[str, Dict[str, Any]]:
+    grupos: Dict[str, List[tuple]] = {"total": muestras}
+    for muestra in muestras:
+        grupos.setdefault(muestra[0], []).append(muestra)
+
+    resumen = {}
+    for nombre, filas in grupos.items():
+        latencias = sorted(m[1] * 1000 for m in filas)
+        errores = sum(1 for m in filas if m[2] == 0 or m[2] >= 400)  # todos los escenarios usan datos válidos
+        resumen[nombre] = {
+            "requests": len(filas),
+            "errores": errores,
+            "rps": round(len(filas) / duracion, 1),
+            "p50_ms": round(percentil(latencias, 50), 2),
+            "p95_ms": round(percentil(latencias, 95), 2),
+            "p99_ms": round(percentil(latencias, 99), 2),
+            "max_ms": round(latencias[-1], 2) if latencias else 0.0,
+        }
+    return resumen
+
+
+def imprimir(resumen: Dict[str, Dict[str, Any]], anterior: Optional[Dict[str, Dict[str, Any]]] = None):
+    columnas = ["requests", "errores", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    print(f"{'escenario':<12}" + "".join(f"{c:>12}" for c in columnas))
+    for nombre in sorted(resumen, key=lambda n: (n == "total", n)):
+        fila = resumen[nombre]
+        print(f"{nombre:<12}" + "".join(f"{fila[c]:>12}" for c in columnas))
+        if anterior and nombre in anterior:
+            deltas = []
+            for c in columnas:
+                previo = anterior[nombre].get(c) or 0
+                deltas.append(f"{(fila[c] - previo) / previo * 100:+.1f}%" if previo else "-")
+            print(f"{'  vs prev':<12}" + "".join(f"{d:>12}" for d in deltas))
+
+
+def version_git() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de cotizaciones")
+    parser.add_argument("--concurrencia", type=int, default=16, help="Usuarios simultáneos")
+    parser.add_argument("--duracion", type=float, default=30, help="Segundos medidos")
+    parser.add_argument("--calentamiento", type=float, default=3, help="Segundos iniciales sin medir")
+    parser.add_argument("--mezcla", default=MEZCLA_POR_DEFECTO, help="Pesos por escenario (nombre=peso,...)")
+    parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--cotizaciones", type=int, default=2000, help="Cotizaciones sembradas en el PostgREST falso")
+    parser.add_argument("--latencia-db-ms", type=float, default=2, help="Latencia simulada por llamada del PostgREST falso")
+    parser.add_argument("--supabase-url", help="PostgREST existente (no se levanta el falso)")
+    parser.add_argument("--supabase-key", default=CLAVE_FALSA)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="Archivo JSON donde guardar el resultado")
+    parser.add_argument("--comparar", help="Resultado JSON anterior para mostrar la diferencia")
+    args = parser.parse_args()
+
+    mezcla = leer_mezcla(args.mezcla)
+    procesos: List[subprocess.Popen] = []
+    directorio = tempfile.mkdtemp(prefix="ganbatte_carga_")
+    try:
+        supabase_url = args.supabase_url
+        if not supabase_url:
+            puerto_db = args.puerto + 1
+            procesos.append(subprocess.Popen([
+                sys.executable, os.path.join(RAIZ, "benchmarks", "postgrest_falso.py"),
+                "--puerto", str(puerto_db), "--cotizaciones", str(args.cotizaciones),
+                "--latencia-ms", str(args.latencia_db_ms), "--semilla", str(args.semilla),
+            ]))
+            supabase_url = f"http://127.0.0.1:{puerto_db}"
+            esperar_servidor(f"{supabase_url}/rest/v1/clientes?limit=1")
+
+        datos = leer_datos_sembrados(supabase_url, args.supabase_key)
+        base_dir = os.path.join(directorio, "Operaciones")
+        sembrar_carpetas(base_dir, datos["carpetas"])
+        logger.info(
+            "Datos: %s cotizaciones, %s operaciones, %s clientes",
+            len(datos["cotizaciones"]), len(datos["operaciones"]), len(datos["clientes"]),
+        )
+
+        entorno = {
+            **os.environ,
+            "SUPABASE_URL": supabase_url, "SUPABASE_KEY": args.supabase_key, "BASE_DIR": base_dir,
+            "PROMETHEUS_MULTIPROC_DIR": os.path.join(directorio, "metricas"),
+            "LOG_LEVEL": "WARNING", "TRAZA_LENTA_MS": "60000",
+        }
+        procesos.append(subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.puerto),
+            "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+        ], cwd=RAIZ, env=entorno))
+        url_api = f"http://127.0.0.1:{args.puerto}"
+        esperar_servidor(f"{url_api}/health/ready")
+
+        logger.info("Carga: %s usuarios, %ss (+%ss calentamiento), mezcla %s",
+                    args.concurrencia, args.duracion, args.calentamiento, mezcla)
+        muestras = asyncio.run(ejecutar_carga(
+            url_api, mezcla, datos, args.concurrencia, args.duracion, args.calentamiento, args.semilla,
+        ))
+    finally:
+        for proceso in reversed(procesos):
+            proceso.terminate()
+            try:
+                proceso.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+
+    resumen = resumir(muestras, args.duracion)
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)["resumen"]
+    imprimir(resumen, anterior)
+
+    if args.salida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({
+                "fecha": datetime.now().isoformat(),
+                "version": version_git(),
+                "parametros": {k: v for k, v in vars(args).items() if k not in ("supabase_key", "salida", "comparar")},
+                "resumen": resumen,
+            }, f, indent=2, ensure_ascii=False)
+        logger.info("Resultado guardado en %s", args.salida)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+# benchmarks/micro.py
+"""
+Microbenchmarks de las funciones de main.py que corren una vez por fila o por request.
+json_estandar y json_rapido comparan la serialización por defecto de FastAPI con
+RespuestaJSONRapida sobre las mismas filas.
+
+Uso:
+    python benchmarks/micro.py                          # mide y compara contra la línea base
+    python benchmarks/micro.py --guardar                # mide y guarda la línea base
+    python benchmarks/micro.py --casos estado listado --tamanos 10 1000
+    python benchmarks/micro.py --tolerancia 0.15        # falla si algo empeora más de 15%
+
+Cada caso se mide sobre lotes de 10 a 100.000 filas generadas con semilla fija y se
+informa el tiempo por fila (mínimo de --repeticiones). Los tiempos se guardan
+normalizados contra un bucle de calibración, para que la línea base sirva en
+máquinas parecidas. Con una línea base en benchmarks/baselines/micro.json el script
+termina con código 1 si algún caso es más lento que la base más la tolerancia.
+La línea base conviene generarla en la máquina donde se van a comparar las corridas
+(la de CI o una sin otra carga), con la misma versión de Python.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(RAIZ, "benchmarks", "baselines", "micro.json")
+
+# main.py sin base de datos ni logs de debug: solo se usan sus funciones puras
+os.environ.setdefault("BASE_DIR", os.path.join(tempfile.gettempdir(), "ganbatte_micro"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["SUPABASE_URL"] = ""
+os.environ["SUPABASE_KEY"] = ""
+sys.path.insert(0, RAIZ)
+import main  # noqa: E402
+
+TAMANOS = [10, 100, 1000, 10000, 100000]
+ESTADOS = ["creada", "enviada", "aceptada", "rechazada", "vencida", "por_vencer", None]
+EQUIPOS = ["20' STANDARD", "40' HC", "40' high cube", "20DV", "40HC", "40' NOR", "20' REEFER", "45' PW", "", None]
+LINEAS = ["MAERSK", "MSC", "CMA CGM", "HAPAG-LLOYD"]
+CAMPOS_GASTOS = ["thc", "toll", "gate", "delivery_order", "ccf", "handling", "logistic_fee", "bl_fee",
+                 "ingreso_sim", "cert_flete", "cert_fob"]
+CONCEPTOS = ["Flete marítimo", "THC", "Documentación", "Seguro", "Transporte terrestre", "Agenciamiento",
+             "Almacenaje", "Handling", "THC"]
+
+
+# -----------------------
+# Datos de entrada
+# -----------------------
+def filas_cotizaciones(n: int, azar: random.Random) -> List[Dict[str, Any]]:
+    """Filas como las devuelve PostgREST para cotizaciones (fechas en texto ISO)."""
+    ahora = datetime.now()
+    filas = []
+    for i in range(n):
+        creada = ahora - timedelta(days=azar.uniform(0, 120))
+        validez = azar.choice([7, 15, 30])
+        filas.append({
+            "id": str(i), "codigo_legible": f"GAN-IM-{creada:%y/%m}/{i % 999 + 1:03d}" if azar.random() < 0.95 else None,
+            "cliente": f"Cliente {i % 50:03d} SpA", "tipo_operacion": azar.choice(["IM", "EM", "IA", "EA"]),
+            "modo_transporte": "Maritima FCL", "estado": azar.choice(ESTADOS),
+            "origen": "Shanghai", "destino": "San Antonio", "validez_dias": validez,
+            "linea_maritima": azar.choice(LINEAS), "equipo": "40HC", "tipo_contenedor": "40HC",
+            "cantidad_contenedores": azar.randint(1, 4), "valor_comercial": round(azar.uniform(5000, 90000), 2),
+            "peso_total_kg": azar.choice([round(azar.uniform(100, 20000), 1), "", None, "1200"]),
+            "volumen_m3": round(azar.uniform(1, 60), 2), "cantidad_pallets": azar.choice([0, 4, "", None]),
+            "transit_time_days": azar.choice([None, 30, "35"]), "transbordo": azar.random() < 0.3,
+            "fecha_creacion": creada.isoformat(),
+            "fecha_validez": (creada + timedelta(days=validez)).isoformat() if azar.random() < 0.9 else None,
+        })
+    return filas
+
+
+def filas_gastos(n: int, azar: random.Random) -> List[Dict[str, Any]]:
+    filas = []
+    for _ in range(n):
+        fila = {c: azar.choice([0, None, round(azar.uniform(20, 400), 2)]) for c in CAMPOS_GASTOS}
+        fila.update({"linea_maritima": azar.choice(LINEAS), "equipo": azar.choice(["20DV", "40HC"])})
+        filas.append(fila)
+    return filas
+
+
+def costos_cotizacion(azar: random.Random) -> List[Dict[str, Any]]:
+    return [
+        {"concepto": c, "costo": round(azar.uniform(30, 3000), 2), "venta": str(round(azar.uniform(30, 3500), 2)),
+         "tipo": "Otro", "es_predefinido": azar.random() < 0.5, "detalles": {"moneda": "USD"} if azar.random() < 0.3 else {}}
+        for c in azar.sample(CONCEPTOS, azar.randint(3, len(CONCEPTOS)))
+    ]
+
+
+# -----------------------
+# Casos: reciben n y devuelven la función a medir (procesa las n filas)
+# -----------------------
+def caso_estado(n: int, azar: random.Random) -> Callable[[], Any]:
+    entradas = [(f.get("fecha_validez"), f.get("validez_dias"), f.get("estado")) for f in filas_cotizaciones(n, azar)]
+    calcular = main.calcular_estado_y_validez
+    return lambda: [calcular(fecha, dias, estado) for fecha, dias, estado in entradas]
+
+
+def caso_conceptos(n: int, azar: random.Random) -> Callable[[], Any]:
+    filas = filas_gastos(n, azar)
+    mapear = main.map_to_concepts
+    return lambda: [mapear(fila, i % 2 == 0, "IM") for i, fila in enumerate(filas)]
+
+
+def caso_equipo(n: int, azar: random.Random) -> Callable[[], Any]:
+    equipos = [azar.choice(EQUIPOS) for _ in range(n)]
+    estandarizar = main.get_standard_equipo
+    return lambda: [estandarizar(equipo) for equipo in equipos]
+
+
+def caso_listado(n: int, azar: random.Random) -> Callable[[], Any]:
+    filas = filas_cotizaciones(n, azar)
+    procesar = main.procesar_cotizacion_listado
+    return lambda: [procesar(fila) for fila in filas]
+
+
+def caso_duplicar(n: int, azar: random.Random) -> Callable[[], Any]:
+    originales = filas_cotizaciones(n, azar)
+    for original in originales:
+        original["costos"] = costos_cotizacion(azar)
+    fecha = datetime.now(timezone(timedelta(hours=-3)))
+
+    def duplicar():
+        # Incluye la validación del body: es la que ahora hace las conversiones de tipo
+        for original in originales:
+            cotizacion = main.CotizacionDuplicar.model_validate(original)
+            main.armar_payload_duplicado(cotizacion, "GAN-IM-25/01/001", "Maritima FCL", fecha)
+            main.armar_costos_duplicados(cotizacion.costos, "GAN-IM-25/01/001", fecha)
+    return duplicar
+
+
+def filas_respuesta(n: int, azar: random.Random) -> List[Dict[str, Any]]:
+    """Cotizaciones procesadas para el listado, con un JSONB anidado como datos_cotizacion de operaciones."""
+    filas = [main.procesar_cotizacion_listado(f) for f in filas_cotizaciones(n, azar)]
+    for fila in filas:
+        fila["datos_cotizacion"] = {k: fila[k] for k in ("origen", "destino", "modo_transporte", "equipo", "valor_comercial")}
+        fila["datos_cotizacion"]["costos"] = costos_cotizacion(azar)
+    return filas
+
+
+def caso_json_estandar(n: int, azar: random.Random) -> Callable[[], Any]:
+    """Camino por defecto de FastAPI: jsonable_encoder + JSONResponse (json de la stdlib)."""
+    from fastapi.encoders import jsonable_encoder
+    filas = filas_respuesta(n, azar)
+    return lambda: main.JSONResponse(jsonable_encoder(filas)).body
+
+
+def caso_json_rapido(n: int, azar: random.Random) -> Callable[[], Any]:
+    filas = filas_respuesta(n, azar)
+    return lambda: main.RespuestaJSONRapida(filas).body
+
+
+CASOS: Dict[str, Callable[[int, random.Random], Callable[[], Any]]] = {
+    "estado": caso_estado,
+    "conceptos": caso_conceptos,
+    "equipo": caso_equipo,
+    "listado": caso_listado,
+    "duplicar": caso_duplicar,
+    "json_estandar": caso_json_estandar,
+    "json_rapido": caso_json_rapido,
+}
+
+
+# -----------------------
+# Medición
+# -----------------------
+def medir(funcion: Callable[[], Any], repeticiones: int) -> float:
+    """Mejor tiempo (segundos) de una llamada; cada repetición dura al menos 0,2 s."""
+    timer = timeit.Timer(funcion)
+    numero, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeticiones, number=numero)) / numero
+
+
+def calibrar(repeticiones: int) -> float:
+    """Tiempo de un bucle fijo en Python puro, usado como unidad para comparar entre máquinas."""
+    def bucle():
+        total = 0
+        datos = {"a": 1, "b": 2.5, "c": "x"}
+        for i in range(20000):
+            total += len(datos) + (i % 7)
+            datos["a"] = i
+        return total
+    return medir(bucle, repeticiones)
+
+
+def main_micro() -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks de funciones por fila de main.py")
+    parser.add_argument("--casos", nargs="+", choices=list(CASOS), default=list(CASOS))
+    parser.add_argument("--tamanos", nargs="+", type=int, default=TAMANOS, help="Cantidad de filas por lote")
+    parser.add_argument("--repeticiones", type=int, default=7)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--linea-base", default=BASELINE, help="Archivo JSON de línea base")
+    parser.add_argument("--guardar", action="store_true", help="Guarda los resultados como nueva línea base")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Empeoramiento admitido (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    base: Dict[str, Any] = {}
+    if os.path.exists(args.linea_base) and not args.guardar:
+        with open(args.linea_base, encoding="utf-8") as f:
+            base = json.load(f).get("casos", {})
+    elif not args.guardar:
+        print(f"Sin línea base en {args.linea_base}: solo se informan tiempos (crearla con --guardar)")
+
+    resultados: Dict[str, Dict[str, float]] = {}
+    regresiones = []
+    print(f"{'caso':<22}{'ns/fila':>12}{'relativo':>12}{'base':>12}{'cambio':>10}")
+    for caso in args.casos:
+        for n in args.tamanos:
+            funcion = CASOS[caso](n, random.Random(args.semilla))
+            segundos = medir(funcion, args.repeticiones)
+            # Recalibrar junto a cada medición: compensa cambios de frecuencia o carga de la máquina
+            unidad = calibrar(args.repeticiones)
+            clave = f"{caso}[{n}]"
+            relativo = segundos / unidad / n
+            resultados[clave] = {"ns_por_fila": round(segundos / n * 1e9, 1), "relativo": relativo}
+
+            linea = f"{clave:<22}{segundos / n * 1e9:>12.1f}{relativo:>12.5f}"
+            if clave in base:
+                cambio = relativo / base[clave]["relativo"] - 1
+                linea += f"{base[clave]['relativo']:>12.5f}{cambio:>+10.1%}"
+                if cambio > args.tolerancia:
+                    regresiones.append((clave, cambio))
+                    linea += "  REGRESIÓN"
+            print(linea, flush=True)
+
+    if args.guardar:
+        os.makedirs(os.path.dirname(args.linea_base), exist_ok=True)
+        with open(args.linea_base, "w", encoding="utf-8") as f:
+            json.dump({
+                "fecha": datetime.now().isoformat(),
+                "python": sys.version.split()[0],
+                "calibracion_ns": round(unidad * 1e9, 1),
+                "casos": resultados,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"Línea base guardada en {args.linea_base}")
+        return 0
+
+    if regresiones:
+        print(f"{len(regresiones)} casos más lentos que la línea base (tolerancia {args.tolerancia:.0%}):")
+        for clave, cambio in regresiones:
+            print(f"  {clave}: {cambio:+.1%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_micro())
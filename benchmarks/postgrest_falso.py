@@ -0,0 +1,414 @@
+# benchmarks/postgrest_falso.py
+"""
+Servidor PostgREST falso, en memoria, con datos sembrados para los benchmarks.
+
+Uso:
+    python benchmarks/postgrest_falso.py --puerto 54321 --cotizaciones 2000 --latencia-ms 2
+
+Implementa lo que usa main.py de la API REST de Supabase: select con lista de columnas,
+filtros eq/neq/gt/gte/lt/lte/like/ilike/in/is (con not.) y or/and, order, limit/offset (o header Range),
+Prefer count=exact, insert (uno o varios), update, delete y upsert por on_conflict.
+Las relaciones embebidas ("clientes(nombre)") y las funciones RPC no existen: el
+select las ignora y /rpc responde 404, como una base sin esas migraciones.
+
+--latencia-ms agrega una espera fija por llamada para simular la ida y vuelta a Supabase.
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+from uuid import UUID, uuid4
+
+logging.basicConfig(level="INFO", format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("ganbatte_postgrest_falso")
+
+PARAMETROS_RESERVADOS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+# -----------------------
+# Datos sembrados
+# -----------------------
+LINEAS = ["MAERSK", "MSC", "CMA CGM", "HAPAG-LLOYD", "ONE", "EVERGREEN", "COSCO", "ZIM"]
+AEROLINEAS = ["LATAM", "AMERICAN", "IBERIA", "LUFTHANSA", "AIR FRANCE"]
+EQUIPOS = ["20DV", "40DV", "40HC", "20RE", "40NOR"]
+PUERTOS = [
+    ("San Antonio", "CLSAI", "San Antonio", "Chile", "puerto"),
+    ("Valparaíso", "CLVAP", "Valparaíso", "Chile", "puerto"),
+    ("Shanghai", "CNSHA", "Shanghai", "China", "puerto"),
+    ("Ningbo", "CNNGB", "Ningbo", "China", "puerto"),
+    ("Rotterdam", "NLRTM", "Rotterdam", "Países Bajos", "puerto"),
+    ("Hamburgo", "DEHAM", "Hamburgo", "Alemania", "puerto"),
+    ("Los Ángeles", "USLAX", "Los Ángeles", "Estados Unidos", "puerto"),
+    ("Callao", "PECLL", "Callao", "Perú", "puerto"),
+    ("Santiago", "SCL", "Santiago", "Chile", "aeropuerto"),
+    ("Miami", "MIA", "Miami", "Estados Unidos", "aeropuerto"),
+    ("Madrid", "MAD", "Madrid", "España", "aeropuerto"),
+    ("Frankfurt", "FRA", "Frankfurt", "Alemania", "aeropuerto"),
+]
+CONCEPTOS = [
+    ("Flete marítimo", "Flete"), ("THC", "Gasto local"), ("Documentación", "Gasto local"),
+    ("Seguro", "Seguro"), ("Transporte terrestre", "Transporte"), ("Agenciamiento", "Servicio"),
+    ("Almacenaje", "Gasto local"), ("Handling", "Gasto local"), ("Desconsolidación", "Gasto local"),
+]
+ESTADOS = ["creada", "enviada", "aceptada", "rechazada", "vencida"]
+PREFIJOS = {"IM": "GAN-IM", "EM": "GAN-EM", "IA": "GAN-IA", "EA": "GAN-EA"}
+
+
+def _uuid(azar: random.Random) -> str:
+    return str(UUID(int=azar.getrandbits(128), version=4))
+
+
+def generar_datos(cotizaciones: int = 2000, semilla: int = 42) -> Dict[str, List[Dict[str, Any]]]:
+    """Tablas con datos de forma realista y reproducibles para una misma semilla."""
+    azar = random.Random(semilla)
+    ahora = datetime.now()
+    datos: Dict[str, List[Dict[str, Any]]] = {
+        "clientes": [], "cotizaciones": [], "costos_cotizacion": [], "operaciones": [],
+        "gastos_locales_maritimos": [], "puertos_aeropuertos": [], "notificaciones": [],
+        "checklist_operacion": [], "lineas_maritimas": [], "aerolineas": [],
+    }
+
+    for i in range(max(10, cotizaciones // 40)):
+        datos["clientes"].append({
+            "id": _uuid(azar), "nombre": f"Cliente {i + 1:03d} SpA", "rut": f"76.{i:03d}.000-{i % 10}",
+            "email": f"contacto{i + 1}@cliente.cl", "activo": True,
+            "fecha_creacion": (ahora - timedelta(days=400)).isoformat(),
+        })
+    for i, (nombre, codigo, ciudad, pais, tipo) in enumerate(PUERTOS):
+        datos["puertos_aeropuertos"].append({
+            "id": i + 1, "nombre": nombre, "codigo": codigo, "ciudad": ciudad, "pais": pais, "tipo": tipo,
+        })
+    for i, nombre in enumerate(LINEAS):
+        datos["lineas_maritimas"].append({"id": i + 1, "nombre": nombre, "activo": True})
+    for i, nombre in enumerate(AEROLINEAS):
+        datos["aerolineas"].append({"id": i + 1, "nombre": nombre, "codigo": nombre[:2], "activo": True})
+    for tipo in ("IM", "EM"):
+        for linea in LINEAS:
+            for equipo in EQUIPOS:
+                montos = {c: round(azar.uniform(20, 400), 2) for c in
+                          ("thc", "toll", "gate", "delivery_order", "ccf", "handling", "logistic_fee", "bl_fee")}
+                datos["gastos_locales_maritimos"].append({
+                    "id": _uuid(azar), "tipo_operacion": tipo, "linea_maritima": linea, "equipo": equipo,
+                    **montos, "ingreso_sim": 0, "cert_flete": 0, "cert_fob": 0,
+                    "total_locales": round(sum(montos.values()), 2), "beneficio": None,
+                    "fecha_actualizacion": ahora.date().isoformat(),
+                })
+
+    correlativos: Dict[str, int] = {}
+    for i in range(cotizaciones):
+        tipo = azar.choice(list(PREFIJOS))
+        maritima = tipo.endswith("M")
+        creada = ahora - timedelta(days=azar.uniform(0, 365))
+        clave = f"{PREFIJOS[tipo]}-{creada:%y/%m}/"
+        correlativos[clave] = correlativos.get(clave, 0) + 1
+        codigo_legible = f"{clave}{correlativos[clave]:03d}"
+        cliente = azar.choice(datos["clientes"])
+        estado = azar.choices(ESTADOS, weights=[3, 4, 2, 1, 2])[0]
+        validez = azar.choice([7, 15, 30])
+        equipo = azar.choice(EQUIPOS) if maritima else None
+        origen, destino = azar.sample(PUERTOS if maritima else PUERTOS[-4:], 2)
+        cotizacion = {
+            "id": _uuid(azar), "codigo": _uuid(azar), "codigo_legible": codigo_legible,
+            "cliente": cliente["nombre"], "cliente_id": cliente["id"], "tipo_operacion": tipo,
+            "modo_transporte": "Maritima FCL" if maritima else "Aerea", "estado": estado,
+            "incoterm_origen": "FOB", "incoterm_destino": "CIF",
+            "origen": origen[0], "destino": destino[0], "referencia": f"PO-{azar.randint(1000, 9999)}",
+            "validez_dias": validez, "email_cliente": None,
+            "linea_maritima": azar.choice(LINEAS) if maritima else None,
+            "aerolinea": None if maritima else azar.choice(AEROLINEAS),
+            "equipo": equipo, "tipo_contenedor": equipo,
+            "cantidad_contenedores": azar.randint(1, 4) if maritima else 0, "cantidad_bls": 1,
+            "valor_comercial": round(azar.uniform(5000, 250000), 2),
+            "peso_total_kg": round(azar.uniform(100, 24000), 1), "peso_cargable_kg": 0.0,
+            "volumen_m3": round(azar.uniform(1, 60), 2), "tipo_embalaje": "Pallets",
+            "cantidad_pallets": azar.randint(0, 20), "transit_time_days": azar.randint(3, 45),
+            "transbordo": azar.random() < 0.3, "dias_libres_almacenaje": azar.choice([0, 3, 7]),
+            "aplica_alimentos": False, "tiene_hielo_seco": False, "gastos_locales": 0.0,
+            "notificaciones_enviadas": [],
+            "fecha_creacion": creada.isoformat(), "fecha_actualizacion": creada.isoformat(),
+            "fecha_estado": creada.isoformat(), "fecha_validez": (creada + timedelta(days=validez)).isoformat(),
+            "codigo_operacion": None,
+        }
+        datos["cotizaciones"].append(cotizacion)
+
+        for concepto, tipo_costo in azar.sample(CONCEPTOS, azar.randint(4, len(CONCEPTOS))):
+            costo = round(azar.uniform(30, 3000), 2)
+            datos["costos_cotizacion"].append({
+                "id": _uuid(azar), "codigo_cotizacion": codigo_legible, "concepto": concepto,
+                "tipo": tipo_costo, "moneda": "USD", "costo": costo, "venta": round(costo * azar.uniform(1.05, 1.4), 2),
+                "es_predefinido": azar.random() < 0.5, "detalles": {}, "fecha_creacion": creada.isoformat(),
+            })
+
+        if estado == "aceptada":
+            codigo_operacion = f"GAN-OP-{creada:%y/%m}/{len(datos['operaciones']) + 1:03d}"
+            cotizacion["codigo_operacion"] = codigo_operacion
+            datos["operaciones"].append({
+                "id": _uuid(azar), "codigo_operacion": codigo_operacion, "cotizacion_origen": codigo_legible,
+                "cliente": cliente["nombre"], "tipo_operacion": tipo, "estado": "en_proceso",
+                "datos_cotizacion": {k: cotizacion[k] for k in ("origen", "destino", "modo_transporte", "equipo")},
+                "fecha_creacion": creada.isoformat(), "fecha_actualizacion": creada.isoformat(),
+            })
+    return datos
+
+
+# -----------------------
+# Evaluación de filtros
+# -----------------------
+def _comparable(valor: Any, texto: str) -> Tuple[Any, Any]:
+    """Convierte el valor de la fila y el del filtro a un tipo común para comparar."""
+    if isinstance(valor, bool):
+        return valor, texto.lower() == "true"
+    if isinstance(valor, (int, float)):
+        try:
+            return valor, float(texto)
+        except ValueError:
+            return str(valor), texto
+    return str(valor), texto
+
+
+def _patron_like(patron: str, ignorar_mayusculas: bool) -> re.Pattern:
+    regex = "".join(".*" if c in "*%" else "." if c == "_" else re.escape(c) for c in patron)
+    return re.compile(f"^{regex}$", re.IGNORECASE | re.DOTALL if ignorar_mayusculas else re.DOTALL)
+
+
+def cumple_filtro(fila: Dict[str, Any], columna: str, expresion: str) -> bool:
+    negado = expresion.startswith("not.")
+    if negado:
+        expresion = expresion[4:]
+    operador, _, argumento = expresion.partition(".")
+    valor = fila.get(columna)
+
+    if operador == "is":
+        resultado = {"null": valor is None, "true": valor is True, "false": valor is False}[argumento]
+    elif operador == "in":
+        opciones = [o.strip().strip('"') for o in argumento.strip("()").split(",")]
+        resultado = valor is not None and any(_comparable(valor, o)[0] == _comparable(valor, o)[1] for o in opciones)
+    elif valor is None:
+        resultado = False
+    elif operador in ("like", "ilike"):
+        resultado = bool(_patron_like(argumento, operador == "ilike").match(str(valor)))
+    else:
+        izquierda, derecha = _comparable(valor, argumento.strip('"'))
+        comparar = {
+            "eq": lambda a, b: a == b, "neq": lambda a, b: a != b,
+            "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+            "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b,
+        }.get(operador)
+        if comparar is None:
+            raise ValueError(f"Operador no soportado: {operador}")
+        resultado = comparar(izquierda, derecha)
+    return not resultado if negado else resultado
+
+
+def _partir_condiciones(texto: str) -> List[str]:
+    """Separa "a.eq.1,and(b.eq.2,c.lt.3)" por las comas de primer nivel (respeta paréntesis y comillas)."""
+    partes, nivel, comillas, actual = [], 0, False, ""
+    for c in texto:
+        if c == '"':
+            comillas = not comillas
+        elif not comillas and c in "()":
+            nivel += 1 if c == "(" else -1
+        elif not comillas and c == "," and nivel == 0:
+            partes.append(actual)
+            actual = ""
+            continue
+        actual += c
+    return partes + [actual] if actual else partes
+
+
+def cumple_logico(fila: Dict[str, Any], operador: str, condiciones: str) -> bool:
+    """Filtros or=(...) / and=(...), con and(...)/or(...) anidados."""
+    resultados = []
+    for parte in _partir_condiciones(condiciones.strip()[1:-1]):
+        anidado = re.match(r"(not\.)?(and|or)(\(.*\))$", parte)
+        if anidado:
+            resultado = cumple_logico(fila, anidado.group(2), anidado.group(3))
+            resultados.append(not resultado if anidado.group(1) else resultado)
+        else:
+            columna, _, expresion = parte.partition(".")
+            resultados.append(cumple_filtro(fila, columna, expresion))
+    return any(resultados) if operador == "or" else all(resultados)
+
+
+def ordenar(filas: List[Dict[str, Any]], orden: str) -> List[Dict[str, Any]]:
+    # Se aplica de la última clave a la primera (sort estable)
+    for clave in reversed([c for c in orden.split(",") if c]):
+        partes = clave.split(".")
+        columna = partes[0]
+        descendente = "desc" in partes[1:]
+        nulos_primero = "nullsfirst" in partes[1:] or (descendente and "nullslast" not in partes[1:])
+        con_valor = [f for f in filas if f.get(columna) is not None]
+        sin_valor = [f for f in filas if f.get(columna) is None]
+        con_valor.sort(key=lambda f: f[columna], reverse=descendente)
+        filas = sin_valor + con_valor if nulos_primero else con_valor + sin_valor
+    return filas
+
+
+def proyectar(filas: List[Dict[str, Any]], select: str) -> List[Dict[str, Any]]:
+    # Quitar relaciones embebidas "tabla(col, ...)", no hay claves foráneas en el falso
+    columnas = [c.strip() for c in re.sub(r"\w+(!\w+)?\([^()]*\)", "", select).split(",") if c.strip()]
+    if not columnas or "*" in columnas:
+        return [dict(f) for f in filas]
+    return [{c: f.get(c) for c in columnas} for f in filas]
+
+
+# -----------------------
+# Servidor
+# -----------------------
+class PostgRESTFalso(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, direccion, datos: Dict[str, List[Dict[str, Any]]], latencia_ms: float = 0):
+        super().__init__(direccion, ManejadorPostgREST)
+        self.datos = datos
+        self.latencia = latencia_ms / 1000
+        self.lock = threading.Lock()
+
+
+class ManejadorPostgREST(BaseHTTPRequestHandler):
+    server: PostgRESTFalso
+    protocol_version = "HTTP/1.1"
+    # Headers y cuerpo en un solo envío: evita la espera de ~40 ms de Nagle + ACK retardado
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, estado: int, cuerpo: Any, headers: Optional[Dict[str, str]] = None):
+        datos = json.dumps(cuerpo, default=str).encode()
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        for clave, valor in (headers or {}).items():
+            self.send_header(clave, valor)
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _procesar(self):
+        # postgrest-py manda "{}" como cuerpo incluso en GET: leerlo siempre para no romper el keep-alive
+        largo = int(self.headers.get("Content-Length") or 0)
+        crudo = self.rfile.read(largo) if largo else b""
+        self.cuerpo = json.loads(crudo) if crudo else None
+        if self.server.latencia:
+            time.sleep(self.server.latencia)
+        url = urlsplit(self.path)
+        partes = [unquote(p) for p in url.path.split("/") if p]
+        if len(partes) < 3 or partes[:2] != ["rest", "v1"]:
+            return self._responder(404, {"message": "Ruta no soportada"})
+        if partes[2] == "rpc":
+            return self._responder(404, {
+                "code": "PGRST202", "message": f"Could not find the function public.{partes[-1]} in the schema cache",
+            })
+
+        tabla = partes[2]
+        parametros = parse_qsl(url.query, keep_blank_values=True)
+        rango = re.fullmatch(r"(\d+)-(\d+)", self.headers.get("Range", ""))
+        if rango:  # .range(inicio, fin) del cliente llega como header, no como query string
+            inicio, fin = int(rango.group(1)), int(rango.group(2))
+            parametros += [("offset", str(inicio)), ("limit", str(fin - inicio + 1))]
+        prefer = self.headers.get("Prefer", "")
+        try:
+            with self.server.lock:
+                estado, filas, total = self._ejecutar(tabla, parametros, prefer)
+        except (ValueError, KeyError) as e:
+            return self._responder(400, {"code": "PGRST100", "message": str(e)})
+
+        headers = {}
+        if "count=exact" in prefer:
+            headers["Content-Range"] = f"0-{max(len(filas) - 1, 0)}/{total}" if filas else f"*/{total}"
+        else:
+            headers["Content-Range"] = f"0-{len(filas) - 1}/*" if filas else "*/*"
+        if self.command != "GET" and "return=minimal" in prefer:
+            filas = []
+        self._responder(estado, filas, headers)
+
+    def _ejecutar(self, tabla: str, parametros: List[Tuple[str, str]], prefer: str):
+        filas = self.server.datos.setdefault(tabla, [])
+        # Los parámetros con punto ("cotizaciones.order") aplican a relaciones embebidas
+        filtros = [(k, v) for k, v in parametros if k not in PARAMETROS_RESERVADOS and "." not in k and k not in ("or", "and")]
+        logicos = [(k, v) for k, v in parametros if k in ("or", "and")]
+        opciones = {k: v for k, v in parametros if k in PARAMETROS_RESERVADOS}
+
+        if self.command == "POST":
+            cuerpo = self.cuerpo
+            nuevas = cuerpo if isinstance(cuerpo, list) else [cuerpo]
+            ahora = datetime.now().isoformat()
+            resultado = []
+            conflicto = opciones.get("on_conflict")
+            for nueva in nuevas:
+                existente = None
+                if conflicto and "merge-duplicates" in prefer:
+                    claves = conflicto.split(",")
+                    existente = next((f for f in filas if all(f.get(c) == nueva.get(c) for c in claves)), None)
+                if existente is not None:
+                    existente.update(nueva)
+                    resultado.append(existente)
+                    continue
+                fila = {"id": str(uuid4()), "fecha_creacion": ahora, **nueva}
+                filas.append(fila)
+                resultado.append(fila)
+            return 201, proyectar(resultado, opciones.get("select", "*")), len(resultado)
+
+        seleccion = [
+            f for f in filas
+            if all(cumple_filtro(f, c, e) for c, e in filtros) and all(cumple_logico(f, k, v) for k, v in logicos)
+        ]
+        if self.command == "PATCH":
+            cambios = self.cuerpo or {}
+            for fila in seleccion:
+                fila.update(cambios)
+            return 200, proyectar(seleccion, opciones.get("select", "*")), len(seleccion)
+        if self.command == "DELETE":
+            ids = {id(f) for f in seleccion}
+            filas[:] = [f for f in filas if id(f) not in ids]
+            return 200, proyectar(seleccion, opciones.get("select", "*")), len(seleccion)
+
+        total = len(seleccion)
+        if "order" in opciones:
+            seleccion = ordenar(seleccion, opciones["order"])
+        inicio = int(opciones.get("offset", 0))
+        limite = opciones.get("limit")
+        seleccion = seleccion[inicio:inicio + int(limite)] if limite is not None else seleccion[inicio:]
+        return 200, proyectar(seleccion, opciones.get("select", "*")), total
+
+    do_GET = do_POST = do_PATCH = do_DELETE = _procesar
+
+
+def iniciar(puerto: int, cotizaciones: int = 2000, latencia_ms: float = 0, semilla: int = 42) -> PostgRESTFalso:
+    """Arranca el servidor en un hilo aparte (para usarlo dentro de otro proceso)."""
+    servidor = PostgRESTFalso(("127.0.0.1", puerto), generar_datos(cotizaciones, semilla), latencia_ms)
+    threading.Thread(target=servidor.serve_forever, name="postgrest-falso", daemon=True).start()
+    return servidor
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="PostgREST falso en memoria para benchmarks")
+    parser.add_argument("--puerto", type=int, default=54321)
+    parser.add_argument("--cotizaciones", type=int, default=2000, help="Cantidad de cotizaciones sembradas")
+    parser.add_argument("--latencia-ms", type=float, default=0, help="Espera agregada a cada llamada")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    datos = generar_datos(args.cotizaciones, args.semilla)
+    servidor = PostgRESTFalso(("127.0.0.1", args.puerto), datos, args.latencia_ms)
+    logger.info(
+        "PostgREST falso en http://127.0.0.1:%s (%s)", args.puerto,
+        ", ".join(f"{tabla}={len(filas)}" for tabla, filas in datos.items() if filas),
+    )
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
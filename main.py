@@ -9,17 +9,58 @@ import asyncio
 import logging
 import traceback  # ← AGREGAR ESTA LÍNEA
 import pathlib # <-- NUEVO
+import time
+import bisect
+import threading
+import unicodedata
+import tempfile
+import json
+import queue
+import random
+import atexit
+import logging.handlers
+import contextvars
+import sys
+import hmac
+import io
+import cProfile
+import pstats
+import collections
+import gzip
+import hashlib
+import csv
+import base64
+from decimal import Decimal
 from uuid import uuid4
 from datetime import datetime, timedelta, date # <-- ¡Aquí está la corrección!
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Tuple
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi import UploadFile, File, Form
-from fastapi.responses import FileResponse, JSONResponse  # ← AGREGAR FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, PlainTextResponse  # ← AGREGAR FileResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, EmailStr
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import Headers
+from pydantic import BaseModel, Field, EmailStr, ConfigDict, BeforeValidator
+from pydantic_core import PydanticUseDefault
+from typing_extensions import Annotated
 from dotenv import load_dotenv
 from pathlib import Path # <-- NUEVO
 
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson RespuestaJSONRapida usa json de la stdlib
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli las respuestas precomprimidas solo se ofrecen en gzip
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre workers (el barrido de alertas corre en cada uno)
+    fcntl = None
+
 
 # Supabase client
 from supabase import create_client, Client
@@ -30,11 +71,92 @@ load_dotenv()
 # -----------------------
 # Logging
 # -----------------------
-logging.basicConfig(
-    level=os.getenv("LOG_LEVEL", "INFO"),
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+# LOG_LEVEL: nivel general. LOG_LEVELS: niveles por módulo ("ganbatte_api.costos=DEBUG,httpx=INFO").
+# LOG_FORMAT: "json" o "texto" (por defecto json en producción).
+# LOG_DEBUG_MUESTREO: fracción de eventos DEBUG que se emiten (1.0 = todos).
+# Los handlers solo encolan; un hilo aparte formatea y escribe en stdout.
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por evento; los campos pasados con extra={...} se incluyen como claves."""
+
+    CAMPOS_ESTANDAR = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        evento = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        for clave, valor in record.__dict__.items():
+            if clave not in self.CAMPOS_ESTANDAR:
+                evento[clave] = valor
+        if record.exc_text:
+            evento["excepcion"] = record.exc_text
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+class MuestreoDebug(logging.Filter):
+    """Deja pasar solo una fracción de los eventos DEBUG; el resto de niveles siempre pasa."""
+
+    def __init__(self, proporcion: float):
+        super().__init__()
+        self.proporcion = proporcion
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.proporcion
+
+# Traza del request en curso (ver sección Tracing); el logging solo usa su request_id
+traza_actual: contextvars.ContextVar = contextvars.ContextVar("traza_actual", default=None)
+
+class AgregarRequestId(logging.Filter):
+    """Agrega a cada evento el request_id del request que lo generó ("-" fuera de un request)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = getattr(traza_actual.get(), "request_id", "-")
+        return True
+
+class ColaLogging(logging.handlers.QueueHandler):
+    """Encola el evento ya resuelto (mensaje y traceback) sin formatearlo en el hilo del request."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        mensaje = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg, record.args, record.exc_info = mensaje, None, None
+        return record
+
+def configurar_logging():
+    formato = os.getenv("LOG_FORMAT") or ("json" if os.getenv("ENV") == "production" else "texto")
+    salida = logging.StreamHandler()
+    if formato == "json":
+        salida.setFormatter(FormatoJSON())
+    else:
+        salida.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - [%(request_id)s] %(message)s"))
+
+    cola = queue.SimpleQueue()
+    handler = ColaLogging(cola)
+    handler.addFilter(MuestreoDebug(float(os.getenv("LOG_DEBUG_MUESTREO", "1.0"))))
+    handler.addFilter(AgregarRequestId())
+    listener = logging.handlers.QueueListener(cola, salida)
+    listener.start()
+    atexit.register(listener.stop)
+
+    raiz = logging.getLogger()
+    raiz.handlers = [handler]
+    raiz.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    # httpx registra cada llamada a Supabase en INFO; solo se ve si se pide en LOG_LEVELS
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    for par in filter(None, os.getenv("LOG_LEVELS", "").split(",")):
+        nombre, _, nivel = par.partition("=")
+        logging.getLogger(nombre.strip()).setLevel(nivel.strip().upper())
+
+configurar_logging()
 logger = logging.getLogger("ganbatte_api")
+logger_cotizaciones = logging.getLogger("ganbatte_api.cotizaciones")
+logger_costos = logging.getLogger("ganbatte_api.costos")
+logger_pdf = logging.getLogger("ganbatte_api.pdf")
 
 # -----------------------
 # Config
@@ -124,6 +246,558 @@ app.add_middleware(
     expose_headers=["*"]  # Expone todos los headers
 )
 
+# -----------------------
+# Respuestas JSON rápidas
+# -----------------------
+# Para listados grandes: el endpoint devuelve RespuestaJSONRapida(datos) y FastAPI no pasa
+# las filas por jsonable_encoder; orjson las serializa en una sola pasada (datetime, date y
+# UUID nativos, Decimal vía _json_default). Se activa por ruta con response_class=RespuestaJSONRapida.
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, Path):
+        return str(obj)
+    raise TypeError(f"Tipo no serializable a JSON: {type(obj).__name__}")
+
+def json_bytes(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_json_default
+    ).encode("utf-8")
+
+class RespuestaJSONRapida(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return json_bytes(content)
+
+# -----------------------
+# Compresión de respuestas
+# -----------------------
+# Las respuestas de más de GZIP_MINIMO_BYTES se comprimen con gzip al vuelo. Los catálogos y
+# el index.html, que cambian poco, se comprimen una sola vez por versión (gzip y, si está
+# instalado, brotli) y se sirven desde CachePrecomprimido con ETag; el middleware no los
+# vuelve a comprimir porque ya llevan Content-Encoding.
+GZIP_MINIMO_BYTES = int(os.getenv("GZIP_MINIMO_BYTES", "1024"))
+CATALOGOS_TTL = int(os.getenv("CATALOGOS_TTL", "300"))
+
+def parsear_accept_encoding(valor: str) -> Dict[str, float]:
+    """Accept-Encoding -> {codificación: q}. q=0 significa que el cliente la rechaza."""
+    aceptadas: Dict[str, float] = {}
+    for parte in valor.split(","):
+        nombre, _, parametros = parte.partition(";")
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        q = 1.0
+        for parametro in parametros.split(";"):
+            clave, _, numero = parametro.partition("=")
+            if clave.strip().lower() == "q":
+                try:
+                    q = float(numero.strip())
+                except ValueError:
+                    q = 0.0
+        aceptadas[nombre] = q
+    return aceptadas
+
+class GZipSegunAcceptEncoding(GZipMiddleware):
+    """GZipMiddleware que respeta gzip;q=0 (Starlette solo busca "gzip" dentro del header)."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            aceptadas = parsear_accept_encoding(Headers(scope=scope).get("accept-encoding", ""))
+            if aceptadas.get("gzip", aceptadas.get("*", 0.0)) <= 0:
+                await self.app(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(GZipSegunAcceptEncoding, minimum_size=GZIP_MINIMO_BYTES, compresslevel=5)
+
+# Sufijo del ETag por codificación: cada cuerpo es una representación distinta y necesita su propio ETag
+SUFIJOS_ETAG = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+class EntradaPrecomprimida:
+    """Cuerpo de una respuesta en cada codificación disponible, con un ETag por codificación."""
+
+    def __init__(self, cuerpo: bytes, media_type: str, version: Any):
+        self.media_type = media_type
+        self.version = version
+        self.creada = time.monotonic()
+        huella = hashlib.blake2b(cuerpo, digest_size=16).hexdigest()
+        self.cuerpos = {"identity": cuerpo}
+        if len(cuerpo) >= GZIP_MINIMO_BYTES:
+            self.cuerpos["gzip"] = gzip.compress(cuerpo, compresslevel=9)
+            if brotli is not None:
+                self.cuerpos["br"] = brotli.compress(cuerpo, quality=11)
+        self.etags = {codificacion: f'"{huella}{SUFIJOS_ETAG[codificacion]}"' for codificacion in self.cuerpos}
+
+class CachePrecomprimido:
+    def __init__(self, maximo: int = 256):
+        self.maximo = maximo
+        self.entradas: "collections.OrderedDict[str, EntradaPrecomprimida]" = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def obtener(self, clave: str, generar: Callable[[], bytes], media_type: str = "application/json",
+                version: Any = None, ttl: Optional[float] = None) -> EntradaPrecomprimida:
+        """
+        Devuelve la entrada de `clave`, regenerándola si cambió `version` o venció `ttl`.
+        Si el cuerpo regenerado es idéntico se conservan los bytes comprimidos.
+        """
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is not None:
+                self.entradas.move_to_end(clave)
+        if entrada is not None and entrada.version == version and (ttl is None or time.monotonic() - entrada.creada < ttl):
+            return entrada
+
+        cuerpo = generar()
+        if entrada is not None and entrada.cuerpos["identity"] == cuerpo:
+            entrada.version, entrada.creada = version, time.monotonic()
+            return entrada
+
+        entrada = EntradaPrecomprimida(cuerpo, media_type, version)
+        with self.lock:
+            self.entradas[clave] = entrada
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.maximo:
+                self.entradas.popitem(last=False)
+        return entrada
+
+cache_precomprimido = CachePrecomprimido()
+
+def elegir_codificacion(accept_encoding: str, disponibles) -> str:
+    """La codificación disponible con mayor q (br antes que gzip si empatan); identity si ninguna sirve."""
+    aceptadas = parsear_accept_encoding(accept_encoding)
+    mejor, mejor_q = "identity", 0.0
+    for codificacion in ("br", "gzip"):
+        if codificacion not in disponibles:
+            continue
+        q = aceptadas.get(codificacion, aceptadas.get("*", 0.0))
+        if q > mejor_q:
+            mejor, mejor_q = codificacion, q
+    return mejor
+
+def etag_coincide(if_none_match: str, etag: str) -> bool:
+    """If-None-Match es una lista de ETags (o "*"); la comparación es débil, como pide el RFC 9110."""
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato == "*" or candidato.removeprefix("W/") == etag:
+            return True
+    return False
+
+def responder_precomprimido(request: Request, entrada: EntradaPrecomprimida, cache_control: str) -> Response:
+    """Respuesta con la mejor codificación que acepte el cliente, o 304 si ya tiene esa representación."""
+    codificacion = elegir_codificacion(request.headers.get("accept-encoding", ""), entrada.cuerpos)
+    headers = {"ETag": entrada.etags[codificacion], "Vary": "Accept-Encoding", "Cache-Control": cache_control}
+    if etag_coincide(request.headers.get("if-none-match", ""), entrada.etags[codificacion]):
+        return Response(status_code=304, headers=headers)
+    if codificacion != "identity":
+        headers["Content-Encoding"] = codificacion
+    return Response(entrada.cuerpos[codificacion], media_type=entrada.media_type, headers=headers)
+
+# -----------------------
+# Métricas (Prometheus)
+# -----------------------
+# Con varios workers de uvicorn cada proceso escribe sus valores en PROMETHEUS_MULTIPROC_DIR
+# y /metrics los suma; la variable debe existir antes de importar prometheus_client.
+# El directorio se tiene que vaciar una vez por arranque, antes de que arranquen los workers
+# (lo hace el CMD de los Dockerfile); si no, los .db de corridas anteriores siguen sumando.
+METRICAS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.path.join(tempfile.gettempdir(), "ganbatte_metricas")
+os.makedirs(METRICAS_DIR, exist_ok=True)
+os.environ["PROMETHEUS_MULTIPROC_DIR"] = METRICAS_DIR
+
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+
+HTTP_REQUESTS = Counter(
+    "ganbatte_http_requests_total", "Requests HTTP atendidos", ["metodo", "ruta", "estado"]
+)
+HTTP_DURACION = Histogram(
+    "ganbatte_http_request_duration_seconds", "Latencia de requests HTTP por ruta", ["metodo", "ruta"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+HTTP_EN_CURSO = Gauge(
+    "ganbatte_http_requests_in_flight", "Requests HTTP en curso", ["metodo"], multiprocess_mode="livesum"
+)
+DB_LLAMADAS = Counter(
+    "ganbatte_db_calls_total", "Llamadas a PostgREST (Supabase)", ["tabla", "operacion", "estado"]
+)
+DB_DURACION = Histogram(
+    "ganbatte_db_call_duration_seconds", "Duración de llamadas a PostgREST por tabla y operación", ["tabla", "operacion"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+def describir_llamada_db(request: httpx.Request) -> Dict[str, str]:
+    """Tabla y operación de una llamada a PostgREST a partir de la URL y el método."""
+    partes = request.url.path.rstrip("/").split("/")
+    if len(partes) >= 2 and partes[-2] == "rpc":
+        return {"tabla": partes[-1], "operacion": "rpc"}
+    operacion = {"GET": "select", "HEAD": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}.get(request.method, request.method.lower())
+    if operacion == "insert" and "merge-duplicates" in request.headers.get("prefer", ""):
+        operacion = "upsert"
+    return {"tabla": partes[-1] if partes else "", "operacion": operacion}
+
+# -----------------------
+# Tracing de requests y llamadas a la base
+# -----------------------
+# Cada request lleva un request_id (X-Request-ID) y registra sus llamadas a PostgREST.
+# Los requests más lentos que TRAZA_LENTA_MS se loguean con la cascada de llamadas y,
+# si OTEL_EXPORTER_OTLP_ENDPOINT está definido, las trazas se envían en formato OTLP/HTTP JSON.
+TRAZA_LENTA_MS = float(os.getenv("TRAZA_LENTA_MS", "1000"))
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "").rstrip("/")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "ganbatte-api")
+
+class TrazaRequest:
+    """Datos de un request en curso y las llamadas a la base hechas mientras se atendía."""
+
+    def __init__(self, request_id: str, metodo: str, path: str, traceparent: Optional[str] = None):
+        self.request_id = request_id
+        self.metodo = metodo
+        self.path = path
+        self.ruta = path
+        self.estado = 0
+        self.trace_id = uuid4().hex
+        self.span_id = uuid4().hex[:16]
+        self.parent_span_id = ""
+        # Continuar la traza del llamador si viene un traceparent W3C válido
+        partes = (traceparent or "").split("-")
+        if len(partes) == 4 and len(partes[1]) == 32 and len(partes[2]) == 16:
+            self.trace_id, self.parent_span_id = partes[1], partes[2]
+        self.inicio_ns = time.time_ns()
+        self.inicio = time.perf_counter()
+        self.duracion_ms = 0.0
+        self.llamadas: List[Dict[str, Any]] = []
+
+    def ns_desde_inicio(self, instante: float) -> int:
+        """Convierte un time.perf_counter() a epoch en nanosegundos."""
+        return self.inicio_ns + int((instante - self.inicio) * 1e9)
+
+    def cascada(self) -> str:
+        lineas = [f"{self.metodo} {self.path} -> {self.estado} en {self.duracion_ms:.1f} ms ({len(self.llamadas)} llamadas a la base)"]
+        for llamada in self.llamadas:
+            lineas.append(
+                f"  +{llamada['desplazamiento_ms']:8.1f} ms {llamada['duracion_ms']:8.1f} ms  "
+                f"{llamada['operacion']} {llamada['tabla']} {llamada['filtros']} filas={llamada['filas']} [{llamada['estado']}]"
+            )
+        return "\n".join(lineas)
+
+def contar_filas(response: httpx.Response) -> Optional[int]:
+    """Filas devueltas según Content-Range de PostgREST ("0-24/*" -> 25, "*/0" -> 0)."""
+    rango = response.headers.get("content-range", "").split("/")[0]
+    if rango == "*":
+        return 0
+    inicio, _, fin = rango.partition("-")
+    if inicio.isdigit() and fin.isdigit():
+        return int(fin) - int(inicio) + 1
+    return None
+
+def _db_inicio_llamada(request: httpx.Request):
+    request.extensions["ganbatte_inicio"] = time.perf_counter()
+
+def _db_fin_llamada(response: httpx.Response):
+    request = response.request
+    inicio = request.extensions.get("ganbatte_inicio")
+    if inicio is None:
+        return
+    fin = time.perf_counter()
+    llamada = describir_llamada_db(request)
+    DB_LLAMADAS.labels(llamada["tabla"], llamada["operacion"], str(response.status_code)).inc()
+    DB_DURACION.labels(llamada["tabla"], llamada["operacion"]).observe(fin - inicio)
+
+    traza = traza_actual.get()
+    if traza is not None:
+        llamada.update({
+            "filtros": "&".join(f"{k}={v}" for k, v in request.url.params.multi_items() if k != "select"),
+            "filas": contar_filas(response),
+            "estado": response.status_code,
+            "desplazamiento_ms": round((inicio - traza.inicio) * 1000, 1),
+            "duracion_ms": round((fin - inicio) * 1000, 1),
+            "inicio_ns": traza.ns_desde_inicio(inicio),
+            "fin_ns": traza.ns_desde_inicio(fin),
+        })
+        traza.llamadas.append(llamada)
+
+def instrumentar_supabase(cliente: Optional[Client]):
+    """Engancha los hooks de medición en la sesión httpx que usa el cliente PostgREST."""
+    if cliente is None:
+        return
+    sesion = cliente.postgrest.session
+    sesion.event_hooks = {
+        "request": [*sesion.event_hooks.get("request", []), _db_inicio_llamada],
+        "response": [*sesion.event_hooks.get("response", []), _db_fin_llamada],
+    }
+
+instrumentar_supabase(supabase)
+
+def _atributo_otlp(clave: str, valor: Any) -> Dict[str, Any]:
+    if isinstance(valor, bool):
+        return {"key": clave, "value": {"boolValue": valor}}
+    if isinstance(valor, int):
+        return {"key": clave, "value": {"intValue": str(valor)}}
+    return {"key": clave, "value": {"stringValue": str(valor)}}
+
+def traza_a_spans_otlp(traza: TrazaRequest) -> List[Dict[str, Any]]:
+    """Span SERVER del request más un span CLIENT por cada llamada a la base."""
+    spans = [{
+        "traceId": traza.trace_id,
+        "spanId": traza.span_id,
+        "parentSpanId": traza.parent_span_id,
+        "name": f"{traza.metodo} {traza.ruta}",
+        "kind": 2,
+        "startTimeUnixNano": str(traza.inicio_ns),
+        "endTimeUnixNano": str(traza.inicio_ns + int(traza.duracion_ms * 1e6)),
+        "attributes": [
+            _atributo_otlp("http.method", traza.metodo),
+            _atributo_otlp("http.route", traza.ruta),
+            _atributo_otlp("http.target", traza.path),
+            _atributo_otlp("http.status_code", traza.estado),
+            _atributo_otlp("request_id", traza.request_id),
+        ],
+        "status": {"code": 2 if traza.estado >= 500 else 0},
+    }]
+    for llamada in traza.llamadas:
+        atributos = [
+            _atributo_otlp("db.system", "postgresql"),
+            _atributo_otlp("db.operation", llamada["operacion"]),
+            _atributo_otlp("db.sql.table", llamada["tabla"]),
+            _atributo_otlp("db.postgrest.filtros", llamada["filtros"]),
+            _atributo_otlp("http.status_code", llamada["estado"]),
+        ]
+        if llamada["filas"] is not None:
+            atributos.append(_atributo_otlp("db.filas", llamada["filas"]))
+        spans.append({
+            "traceId": traza.trace_id,
+            "spanId": uuid4().hex[:16],
+            "parentSpanId": traza.span_id,
+            "name": f"{llamada['operacion']} {llamada['tabla']}",
+            "kind": 3,
+            "startTimeUnixNano": str(llamada["inicio_ns"]),
+            "endTimeUnixNano": str(llamada["fin_ns"]),
+            "attributes": atributos,
+            "status": {"code": 2 if llamada["estado"] >= 400 else 0},
+        })
+    return spans
+
+class ExportadorOTLP:
+    """Envía trazas a un collector OpenTelemetry (OTLP/HTTP JSON) desde un hilo aparte, por lotes."""
+
+    def __init__(self, endpoint: str, lote: int = 100, intervalo: float = 2.0):
+        self.url = f"{endpoint}/v1/traces"
+        self.lote = lote
+        self.intervalo = intervalo
+        self.cola: queue.SimpleQueue = queue.SimpleQueue()
+        threading.Thread(target=self._loop, name="exportador-otlp", daemon=True).start()
+
+    def enviar(self, traza: TrazaRequest):
+        self.cola.put(traza)
+
+    def _loop(self):
+        with httpx.Client(timeout=5.0) as cliente:
+            while True:
+                trazas = []
+                limite = time.monotonic() + self.intervalo
+                while len(trazas) < self.lote:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    try:
+                        trazas.append(self.cola.get(timeout=restante))
+                    except queue.Empty:
+                        break
+                if not trazas:
+                    continue
+                cuerpo = {"resourceSpans": [{
+                    "resource": {"attributes": [
+                        _atributo_otlp("service.name", OTEL_SERVICE_NAME),
+                        _atributo_otlp("process.pid", os.getpid()),
+                    ]},
+                    "scopeSpans": [{
+                        "scope": {"name": "ganbatte_api"},
+                        "spans": [span for traza in trazas for span in traza_a_spans_otlp(traza)],
+                    }],
+                }]}
+                try:
+                    cliente.post(self.url, json=cuerpo)
+                except Exception as e:
+                    logger.warning("No se pudieron exportar %s trazas a %s: %s", len(trazas), self.url, e)
+
+exportador_otlp = ExportadorOTLP(OTLP_ENDPOINT) if OTLP_ENDPOINT else None
+
+@app.middleware("http")
+async def medir_requests(request: Request, call_next):
+    metodo = request.method
+    traza = TrazaRequest(
+        request.headers.get("x-request-id") or uuid4().hex,
+        metodo,
+        request.url.path,
+        request.headers.get("traceparent"),
+    )
+    token = traza_actual.set(traza)
+    HTTP_EN_CURSO.labels(metodo).inc()
+    try:
+        response = await call_next(request)
+        traza.estado = response.status_code
+        response.headers["X-Request-ID"] = traza.request_id
+        return response
+    except Exception:
+        traza.estado = 500
+        raise
+    finally:
+        HTTP_EN_CURSO.labels(metodo).dec()
+        traza.duracion_ms = (time.perf_counter() - traza.inicio) * 1000
+        # Plantilla de la ruta (no el path real) para no multiplicar series por código de cotización
+        traza.ruta = getattr(request.scope.get("route"), "path", "sin_ruta")
+        HTTP_REQUESTS.labels(metodo, traza.ruta, str(traza.estado)).inc()
+        HTTP_DURACION.labels(metodo, traza.ruta).observe(traza.duracion_ms / 1000)
+
+        if traza.duracion_ms >= TRAZA_LENTA_MS:
+            logger.warning(
+                "🐢 Request lento:\n%s", traza.cascada(),
+                extra={"duracion_ms": round(traza.duracion_ms, 1), "llamadas_db": traza.llamadas}
+            )
+        if exportador_otlp is not None:
+            exportador_otlp.enviar(traza)
+        traza_actual.reset(token)
+
+@app.get("/metrics")
+def metricas():
+    """Métricas en formato de texto de Prometheus, sumadas entre todos los workers."""
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+@app.on_event("shutdown")
+async def cerrar_metricas():
+    multiprocess.mark_process_dead(os.getpid())
+
+# -----------------------
+# Profiler (solo administradores)
+# -----------------------
+# Deshabilitado si no se define ADMIN_TOKEN. Las llamadas deben enviar el header X-Admin-Token.
+# - GET /debug/profiler: muestrea las pilas de todos los hilos del worker durante N segundos
+#   y devuelve stacks colapsados (entrada de flamegraph.pl / speedscope).
+# - Header "X-Profile: 1" en cualquier request: cProfile de ese request, consultable luego en
+#   GET /debug/profiler/requests/{request_id}. Mide el hilo del event loop: los endpoints
+#   síncronos (que corren en el threadpool) se ven como espera; para esos usar el muestreo.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PERFILES_DIR = os.path.join(tempfile.gettempdir(), "ganbatte_perfiles")
+PERFILES_MAXIMOS = 50
+_profiler_lock = threading.Lock()
+
+# Funciones en las que un hilo está esperando y no gastando CPU
+PILAS_INACTIVAS = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"),
+    ("selectors.py", "select"), ("socket.py", "accept"), ("socketserver.py", "serve_forever"),
+    ("handlers.py", "dequeue"), ("main.py", "_loop"),
+}
+
+def verificar_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiler deshabilitado (ADMIN_TOKEN no configurado)")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Token de administrador inválido")
+
+def muestrear_pilas(segundos: float, intervalo: float, incluir_inactivos: bool = False) -> collections.Counter:
+    """Cuenta cuántas veces se vio cada pila ("hilo;func (archivo:línea);...") en los hilos del proceso."""
+    propio = threading.get_ident()
+    pilas: collections.Counter = collections.Counter()
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        nombres = {hilo.ident: hilo.name for hilo in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == propio:
+                continue
+            hoja = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+            if not incluir_inactivos and hoja in PILAS_INACTIVAS:
+                continue
+            marcos = []
+            while frame is not None:
+                codigo = frame.f_code
+                marcos.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                frame = frame.f_back
+            marcos.append(nombres.get(ident, f"hilo-{ident}"))
+            pilas[";".join(reversed(marcos))] += 1
+        time.sleep(intervalo)
+    return pilas
+
+@app.get("/debug/profiler")
+def perfilar_worker(request: Request, segundos: float = 10, intervalo_ms: float = 10,
+                    formato: str = "collapsed", incluir_inactivos: bool = False):
+    """Perfil por muestreo del worker que atiende este request (uno a la vez por worker)."""
+    verificar_admin(request)
+    segundos = min(max(segundos, 0.5), 120)
+    intervalo = min(max(intervalo_ms, 1), 1000) / 1000
+    if not _profiler_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Ya hay un perfil en curso en este worker")
+    try:
+        logger.info("🔬 Perfilando worker %s durante %ss", os.getpid(), segundos)
+        pilas = muestrear_pilas(segundos, intervalo, incluir_inactivos)
+    finally:
+        _profiler_lock.release()
+
+    if formato == "json":
+        return {
+            "pid": os.getpid(),
+            "segundos": segundos,
+            "intervalo_ms": intervalo * 1000,
+            "muestras": sum(pilas.values()),
+            "pilas": [{"pila": pila, "muestras": n} for pila, n in pilas.most_common()],
+        }
+    texto = "\n".join(f"{pila} {n}" for pila, n in pilas.most_common())
+    return PlainTextResponse(texto + "\n", headers={"X-Profiler-Pid": str(os.getpid())})
+
+@app.get("/debug/profiler/requests/{request_id}")
+def obtener_perfil_request(request: Request, request_id: str, orden: str = "cumulative",
+                           limite: int = 60, formato: str = "texto"):
+    """Resultado del cProfile de un request marcado con X-Profile (texto de pstats o archivo .prof)."""
+    verificar_admin(request)
+    ruta = os.path.join(PERFILES_DIR, f"{os.path.basename(request_id)}.prof")
+    if not os.path.exists(ruta):
+        raise HTTPException(status_code=404, detail="Perfil no encontrado (¿lo atendió otro worker?)")
+    if formato == "prof":
+        return FileResponse(ruta, media_type="application/octet-stream", filename=f"{request_id}.prof")
+    salida = io.StringIO()
+    try:
+        pstats.Stats(ruta, stream=salida).sort_stats(orden).print_stats(limite)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Orden inválido: {orden}")
+    return PlainTextResponse(salida.getvalue())
+
+def guardar_perfil_request(perfil: cProfile.Profile, request_id: str):
+    os.makedirs(PERFILES_DIR, exist_ok=True)
+    perfil.dump_stats(os.path.join(PERFILES_DIR, f"{os.path.basename(request_id)}.prof"))
+    # Conservar solo los más recientes
+    archivos = sorted(Path(PERFILES_DIR).glob("*.prof"), key=lambda a: a.stat().st_mtime)
+    for viejo in archivos[:-PERFILES_MAXIMOS]:
+        viejo.unlink(missing_ok=True)
+
+@app.middleware("http")
+async def perfilar_request(request: Request, call_next):
+    if not ADMIN_TOKEN or request.headers.get("x-profile") not in ("1", "true"):
+        return await call_next(request)
+    verificado = hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN)
+    if not verificado or not _profiler_lock.acquire(blocking=False):
+        return await call_next(request)
+    # Un solo perfil a la vez por worker (comparte el lock con el muestreo). Mientras dura se
+    # registran también las corrutinas de otros requests que corran en el mismo event loop.
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+        try:
+            response = await call_next(request)
+        finally:
+            perfil.disable()
+    finally:
+        _profiler_lock.release()
+    request_id = response.headers.get("x-request-id") or uuid4().hex
+    await asyncio.to_thread(guardar_perfil_request, perfil, request_id)
+    response.headers["X-Profile-Id"] = request_id
+    return response
+
 def obtener_estructura_carpeta(ruta_base: Path):
     """
     Función recursiva para obtener la estructura de archivos y carpetas.
@@ -158,7 +832,7 @@ def obtener_estructura_carpeta(ruta_base: Path):
                     "size": item.stat().st_size
                 })
     except Exception as e:
-        logger.error(f"Error al leer directorio {ruta_base}: {e}")
+        logger.error("Error al leer directorio %s: %s", ruta_base, e)
         return []
 
     return estructura
@@ -193,7 +867,7 @@ async def subir_archivo_operacion(
         # 5. Ruta completa del archivo
         ruta_final_archivo = os.path.join(ruta_destino_carpeta, archivo.filename)
 
-        logger.info(f"Guardando archivo '{archivo.filename}' en: {ruta_final_archivo}")
+        logger.info("Guardando archivo '%s' en: %s", archivo.filename, ruta_final_archivo)
         
         # 6. Guardar el archivo de forma asíncrona
         # NOTA: Usamos 'wb' para escribir bytes
@@ -211,7 +885,7 @@ async def subir_archivo_operacion(
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception(f"Error subiendo archivo para {codigo_operacion}: {e}")
+        logger.exception("Error subiendo archivo para %s: %s", codigo_operacion, e)
         raise HTTPException(status_code=500, detail=f"Error al subir archivo: {str(e)}")
     
 @app.post("/operaciones/{codigo_operacion:path}/abrir-carpeta")
@@ -225,7 +899,7 @@ async def abrir_carpeta_operacion(codigo_operacion: str):
         codigo_normalizado = codigo_operacion.replace('/', os.sep)
         ruta_base_operacion = get_ruta_operacion(codigo_operacion)
         
-        logger.info(f"Intento de abrir carpeta: {ruta_base_operacion}")
+        logger.info("Intento de abrir carpeta: %s", ruta_base_operacion)
 
         # 2. Crear la carpeta si no existe (importante para que el explorador tenga algo que abrir)
         os.makedirs(ruta_base_operacion, exist_ok=True)
@@ -243,7 +917,7 @@ async def abrir_carpeta_operacion(codigo_operacion: str):
             try:
                 os.startfile(ruta_base_operacion)
             except Exception as e:
-                logger.error(f"Error abriendo carpeta con os.startfile: {e}")
+                logger.error("Error abriendo carpeta con os.startfile: %s", e)
                 # Fallback por si acaso
                 subprocess.Popen(["explorer", str(ruta_base_operacion)]) 
                 
@@ -261,9 +935,73 @@ async def abrir_carpeta_operacion(codigo_operacion: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error abriendo carpeta para {codigo_operacion}: {e}")
+        logger.error("Error abriendo carpeta para %s: %s", codigo_operacion, e)
         raise HTTPException(status_code=500, detail=f"Error al intentar abrir la carpeta: {str(e)}")
 
+def buscar_carpeta_operacion(codigo_operacion: str) -> str:
+    """
+    Código de la carpeta en disco de una operación: el de la cotización que la originó
+    (GAN-OP-... -> GAN-IM-...). Si no se encuentra, el propio código de operación.
+    """
+    if supabase is not None:
+        try:
+            # Buscamos: 'codigo_operacion' (GAN-OP-...) en la DB -> 'codigo_legible' (GAN-IM-...)
+            response = supabase.table("cotizaciones").select("codigo_legible").eq("codigo_operacion", codigo_operacion).limit(1).execute()
+            
+            if response.data and response.data[0].get('codigo_legible'):
+                # ¡Encontrado! Usamos el código de cotización para la carpeta
+                logger.info("DB Mapeo: Carpeta encontrada para %s: %s", codigo_operacion, response.data[0]['codigo_legible'])
+                return response.data[0]['codigo_legible']
+            logger.warning("DB Mapeo: No se encontró código de cotización para %s. Usando código de operación como fallback.", codigo_operacion)
+                
+        except Exception as e:
+            logger.error("Error en el mapeo de códigos de carpeta: %s", e)
+    return codigo_operacion
+
+def listar_archivos_operacion(codigo_operacion: str, codigo_folder_system: str) -> Optional[Dict[str, Any]]:
+    """
+    Archivos de cada subcarpeta de la operación, más recientes primero.
+    None si la carpeta todavía no existe en el servidor.
+    """
+    ruta_base_operacion = get_ruta_operacion(codigo_folder_system)
+    
+    logger.info("Ruta final de búsqueda: %s", ruta_base_operacion) 
+    
+    if not os.path.isdir(ruta_base_operacion):
+        return None
+
+    archivos_por_subcarpeta = {}
+    
+    for subcarpeta_nombre in SUBCARPETAS_OPERACION:
+        ruta_subcarpeta = os.path.join(ruta_base_operacion, subcarpeta_nombre)
+        
+        # Si no existe, no intentamos listar
+        if os.path.isdir(ruta_subcarpeta):
+            archivos_encontrados = []
+            for nombre_archivo in os.listdir(ruta_subcarpeta):
+                ruta_completa_archivo = os.path.join(ruta_subcarpeta, nombre_archivo)
+                
+                if os.path.isfile(ruta_completa_archivo):
+                    timestamp = os.path.getmtime(ruta_completa_archivo)
+                    fecha_modificacion = datetime.fromtimestamp(timestamp).isoformat()
+
+                    # Usamos el código de la URL para la ruta_relativa, ya que así lo espera el frontend.
+                    ruta_relativa_frontend = os.path.join(codigo_operacion, subcarpeta_nombre, nombre_archivo).replace(os.sep, '/')
+
+                    archivos_encontrados.append({
+                        "nombre": nombre_archivo,
+                        "ruta_relativa": ruta_relativa_frontend, 
+                        "fecha_modificacion": fecha_modificacion,
+                        "tamano_bytes": os.path.getsize(ruta_completa_archivo)
+                    })
+
+            archivos_encontrados.sort(key=lambda x: x['fecha_modificacion'], reverse=True)
+            archivos_por_subcarpeta[subcarpeta_nombre] = archivos_encontrados
+        else:
+            archivos_por_subcarpeta[subcarpeta_nombre] = []
+
+    return {"ruta_base": ruta_base_operacion, "subcarpetas": archivos_por_subcarpeta}
+
 @app.get("/operaciones/{codigo_operacion:path}/archivos")
 async def get_archivos_operacion(codigo_operacion: str):
     """
@@ -271,79 +1009,25 @@ async def get_archivos_operacion(codigo_operacion: str):
     """
     
     try:
-        codigo_folder_system = codigo_operacion # Fallback
-        
         # 1. LÓGICA DE BÚSQUEDA DEL CÓDIGO DE CARPETA (Cotización)
-        if supabase is not None:
-            try:
-                # Buscamos: 'codigo_operacion' (GAN-OP-...) en la DB -> 'codigo_legible' (GAN-IM-...)
-                response = supabase.table("cotizaciones").select("codigo_legible").eq("codigo_operacion", codigo_operacion).limit(1).execute()
-                
-                if response.data and response.data[0].get('codigo_legible'):
-                    # ¡Encontrado! Usamos el código de cotización para la carpeta
-                    codigo_folder_system = response.data[0]['codigo_legible']
-                    logger.info(f"DB Mapeo: Carpeta encontrada para {codigo_operacion}: {codigo_folder_system}")
-                else:
-                    logger.warning(f"DB Mapeo: No se encontró código de cotización para {codigo_operacion}. Usando código de operación como fallback.")
-                    
-            except Exception as e:
-                logger.error(f"Error en el mapeo de códigos de carpeta: {e}")
+        codigo_folder_system = buscar_carpeta_operacion(codigo_operacion)
 
-        # 2. CONSTRUIR RUTA (usando el código que SÍ existe en el disco, sea el de cotización o el fallback)
-        ruta_base_operacion = get_ruta_operacion(codigo_folder_system)
-        
-        logger.info(f"Ruta final de búsqueda: {ruta_base_operacion}") 
-        
-        # 3. VERIFICAR EXISTENCIA Y LISTAR ARCHIVOS
-        if not os.path.isdir(ruta_base_operacion):
+        # 2. LISTAR (usando el código que SÍ existe en el disco, sea el de cotización o el fallback)
+        listado = listar_archivos_operacion(codigo_operacion, codigo_folder_system)
+        if listado is None:
             return JSONResponse(status_code=404, content={
                 "error": "Carpeta no encontrada o no creada aún en el servidor.",
-                "ruta_buscada": ruta_base_operacion,
+                "ruta_buscada": get_ruta_operacion(codigo_folder_system),
                 "codigo_usado": codigo_folder_system,
                 "subcarpetas": {}
             })
 
-        archivos_por_subcarpeta = {}
-        subcarpetas = ['Cotizaciones', 'Documentos', 'BLs', 'Facturas', 'Otros']
-        
-        for subcarpeta_nombre in subcarpetas:
-            ruta_subcarpeta = os.path.join(ruta_base_operacion, subcarpeta_nombre)
-            
-            # Si no existe, no intentamos listar
-            if os.path.isdir(ruta_subcarpeta):
-                archivos_encontrados = []
-                for nombre_archivo in os.listdir(ruta_subcarpeta):
-                    ruta_completa_archivo = os.path.join(ruta_subcarpeta, nombre_archivo)
-                    
-                    if os.path.isfile(ruta_completa_archivo):
-                        timestamp = os.path.getmtime(ruta_completa_archivo)
-                        fecha_modificacion = datetime.fromtimestamp(timestamp).isoformat()
-
-                        # Usamos el código de la URL para la ruta_relativa, ya que así lo espera el frontend.
-                        ruta_relativa_frontend = os.path.join(codigo_operacion, subcarpeta_nombre, nombre_archivo).replace(os.sep, '/')
-
-                        archivos_encontrados.append({
-                            "nombre": nombre_archivo,
-                            "ruta_relativa": ruta_relativa_frontend, 
-                            "fecha_modificacion": fecha_modificacion,
-                            "tamano_bytes": os.path.getsize(ruta_completa_archivo)
-                        })
-
-                archivos_encontrados.sort(key=lambda x: x['fecha_modificacion'], reverse=True)
-                archivos_por_subcarpeta[subcarpeta_nombre] = archivos_encontrados
-            else:
-                archivos_por_subcarpeta[subcarpeta_nombre] = []
-        
-        return {
-            "mensaje": "Archivos listados exitosamente",
-            "ruta_base": ruta_base_operacion,
-            "subcarpetas": archivos_por_subcarpeta
-        }
+        return {"mensaje": "Archivos listados exitosamente", **listado}
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception(f"Error listando archivos de operación {codigo_operacion}: {e}")
+        logger.exception("Error listando archivos de operación %s: %s", codigo_operacion, e)
         # Aseguramos que el 500 tenga detalles en la consola
         raise HTTPException(status_code=500, detail=f"Error interno del servidor al listar: {str(e)}")
     
@@ -371,20 +1055,66 @@ ESTADOS_COTIZACION = {
 # Pydantic models
 # -----------------------
 
+# Tipos tolerantes para los formularios del frontend: un campo vacío ("" o null) toma el
+# default del modelo en lugar de fallar; cualquier otro valor se valida normalmente.
+def _vacio_a_default(valor: Any) -> Any:
+    if valor is None or valor == "":
+        raise PydanticUseDefault()
+    return valor
+
+def _entero_flexible(valor: Any) -> Any:
+    valor = _vacio_a_default(valor)
+    return int(valor) if isinstance(valor, float) else valor
+
+def _bool_flexible(valor: Any) -> Any:
+    valor = _vacio_a_default(valor)
+    if isinstance(valor, str) and valor.strip().lower() in ("si", "sí"):
+        return True
+    return valor
+
+NumeroFlexible = Annotated[float, BeforeValidator(_vacio_a_default)]
+EnteroFlexible = Annotated[int, BeforeValidator(_entero_flexible)]
+BoolFlexible = Annotated[bool, BeforeValidator(_bool_flexible)]
+
 class TrackingUpdate(BaseModel):
     codigo_operacion: str
-    etd: str = None
-    eta: str = None
-    fecha_carga: str = None
-    fecha_descarga: str = None
-    equipo: str = None
-    origen: str = None
-    destino: str = None
-    referencia: str = None
-    volumen_m3: float = None
-    peso_total_kg: float = None
-    incoterm_origen: str = None
-    incoterm_destino: str = None
+    etd: Optional[str] = None
+    eta: Optional[str] = None
+    fecha_carga: Optional[str] = None
+    fecha_descarga: Optional[str] = None
+    equipo: Optional[str] = None
+    origen: Optional[str] = None
+    destino: Optional[str] = None
+    referencia: Optional[str] = None
+    volumen_m3: Optional[NumeroFlexible] = None
+    peso_total_kg: Optional[NumeroFlexible] = None
+    incoterm_origen: Optional[str] = None
+    incoterm_destino: Optional[str] = None
+    contenedores: Optional[List[str]] = None
+
+    def campos(self) -> Dict[str, Any]:
+        """Campos de tracking enviados, tal como se fusionan en datos_cotizacion."""
+        return self.model_dump(exclude={"codigo_operacion"}, exclude_none=True)
+
+# Actualización de tracking en lote: cuántos items acepta una solicitud y cuántos van por llamada RPC
+TRACKING_LOTE_MAXIMO = 5000
+TRACKING_LOTE_RPC = int(os.getenv("TRACKING_LOTE_RPC", "500"))
+
+class SolicitudTrackingLote(BaseModel):
+    """Tracking de varias operaciones a la vez (p. ej. un archivo de estados de la naviera)."""
+    actualizaciones: List[TrackingUpdate] = Field(..., min_length=1, max_length=TRACKING_LOTE_MAXIMO)
+
+class ResultadoTracking(BaseModel):
+    codigo_operacion: str
+    estado: str  # actualizada | no_encontrada | error
+    detalle: Optional[str] = None
+
+class RespuestaTrackingLote(BaseModel):
+    recibidas: int
+    actualizadas: int
+    no_encontradas: int
+    errores: int
+    resultados: List[ResultadoTracking]
 
 class ChecklistItem(BaseModel):
     id: Optional[str] = None
@@ -397,6 +1127,26 @@ class ChecklistItemUpdate(BaseModel):
     tarea: Optional[str] = None
     completada: Optional[bool] = None
 
+# Tareas por solicitud en las operaciones de checklist en lote (van en un solo IN en la URL)
+CHECKLIST_LOTE_MAXIMO = 500
+
+class SolicitudChecklistLote(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=CHECKLIST_LOTE_MAXIMO)
+
+class RespuestaChecklistLote(BaseModel):
+    mensaje: str
+    solicitadas: int
+    afectadas: int
+    no_encontradas: List[str]
+
+# Estados de operación conocidos. Toda operación nace 'en_proceso' (convertir_cotizacion_en_operacion,
+# migrations/008) y ni la API ni el frontend definen otro: PUT /operaciones/{codigo} acepta cualquier
+# valor, pero ninguno se usa como cierre. Al introducir un estado de cierre, agregarlo acá con abierta=False.
+ESTADOS_OPERACION = {
+    'en_proceso': {'abierta': True},
+}
+ESTADOS_OPERACION_CERRADOS = [estado for estado, info in ESTADOS_OPERACION.items() if not info['abierta']]
+
 class Operacion(BaseModel):
     id: Optional[str] = None
     codigo_operacion: str
@@ -536,6 +1286,21 @@ class CambioEstadoRequest(BaseModel):
     codigo_legible: str
     nuevo_estado: str
 
+# Cotizaciones por solicitud en el cambio de estado en lote (van en un solo IN en la URL)
+CAMBIO_ESTADO_LOTE_MAXIMO = 500
+
+class CambioEstadoLoteRequest(BaseModel):
+    codigos: List[str] = Field(..., min_length=1, max_length=CAMBIO_ESTADO_LOTE_MAXIMO)
+    nuevo_estado: str
+
+class RespuestaCambioEstadoLote(BaseModel):
+    mensaje: str
+    estado: str
+    color: str
+    actualizadas: List[str]
+    sin_cambios: List[str]
+    no_encontradas: List[str]
+
 class CostoPersonalizado(BaseModel):
     """Representa un costo individual, ya sea predefinido o personalizado."""
     id: Optional[str] = None
@@ -548,10 +1313,141 @@ class CostoPersonalizado(BaseModel):
     detalles: Optional[Dict[str, Any]] = None # Para datos extra como THC, etc.
     moneda: str = "USD"
 
+class CostoAGuardar(BaseModel):
+    """Un costo tal como lo envía el editor de costos (sin código de cotización propio)."""
+    concepto: Optional[str] = None
+    costo: NumeroFlexible = 0.0
+    venta: NumeroFlexible = 0.0
+    es_predefinido: BoolFlexible = False
+    tipo: Optional[str] = None  # None o ausente -> "Otro"
+    detalles: Optional[Dict[str, Any]] = None
+
 class SolicitudGuardarCostos(BaseModel):
     """Estructura para guardar todos los costos asociados a una cotización."""
-    codigo_cotizacion: str
-    costos: List[CostoPersonalizado]
+    codigo_cotizacion: Optional[str] = None
+    costos: List[CostoAGuardar] = []
+
+class RespuestaGuardarCostos(BaseModel):
+    mensaje: str
+    count: int
+    verificados_en_bd: Optional[int] = None
+    count_final: Optional[int] = None
+    codigo_cotizacion: Optional[str] = None
+
+class CostoDuplicado(BaseModel):
+    concepto: Optional[str] = None
+    costo: NumeroFlexible = 0.0
+    venta: NumeroFlexible = 0.0
+    es_predefinido: BoolFlexible = False
+    tipo: Optional[str] = None  # None o ausente -> "OTRO"
+    detalles: Optional[Dict[str, Any]] = None
+
+class CotizacionDuplicar(BaseModel):
+    """Cotización existente (tal como la muestra el frontend) que se quiere duplicar."""
+    model_config = ConfigDict(extra="ignore")
+
+    codigo_legible: Optional[str] = None
+    # El frontend puede mandar null: los valores por defecto se aplican al duplicar
+    cliente: Optional[str] = None
+    cliente_id: Optional[str] = None
+    tipo_operacion: Optional[str] = None
+    modo_transporte: Optional[str] = None
+    origen: Optional[str] = None
+    destino: Optional[str] = None
+    peso_total_kg: NumeroFlexible = 0.0
+    peso_cargable_kg: NumeroFlexible = 0.0
+    volumen_m3: NumeroFlexible = 0.0
+    cantidad_pallets: EnteroFlexible = 0
+    incoterm_origen: Optional[str] = None
+    incoterm_destino: Optional[str] = None
+    referencia: Optional[str] = None
+    email_cliente: Optional[str] = None
+    linea_maritima: Optional[str] = None
+    aerolinea: Optional[str] = None
+    equipo: Optional[str] = None
+    cantidad_contenedores: EnteroFlexible = 1
+    tipo_contenedor: Optional[str] = None
+    cantidad_bls: EnteroFlexible = 1
+    valor_comercial: NumeroFlexible = 0.0
+    tipo_embalaje: Optional[str] = None
+    transit_time_days: EnteroFlexible = 0
+    transbordo: BoolFlexible = False
+    dias_libres_almacenaje: EnteroFlexible = 0
+    pickup_address: Optional[str] = None
+    delivery_address: Optional[str] = None
+    pre_carrier: Optional[str] = None
+    consolidacion_deconsolidacion: Optional[str] = None
+    aplica_alimentos: BoolFlexible = False
+    tiene_hielo_seco: BoolFlexible = False
+    gastos_locales: NumeroFlexible = 0.0
+    costos: List[CostoDuplicado] = []
+
+class RespuestaDuplicar(BaseModel):
+    mensaje: str
+    codigo_nuevo: str
+    costos_duplicados: int
+    exitoso: bool
+
+# Campos que el PUT nunca toca aunque vengan en el body
+CAMPOS_COTIZACION_NO_ACTUALIZABLES = {'codigo', 'codigo_legible', 'fecha_creacion', 'id'}
+
+class CotizacionActualizacion(BaseModel):
+    """Cambios parciales de una cotización: solo se guardan los campos enviados y no nulos.
+
+    Los campos declarados se validan y normalizan; cualquier otra columna que mande el
+    frontend se reenvía tal cual a Supabase (como antes del modelo), salvo las de
+    CAMPOS_COTIZACION_NO_ACTUALIZABLES.
+    """
+    model_config = ConfigDict(extra="allow")
+
+    cliente: Optional[str] = None
+    cliente_id: Optional[str] = None
+    tipo_operacion: Optional[str] = None
+    modo_transporte: Optional[str] = None
+    estado: Optional[str] = None
+    incoterm_origen: Optional[str] = None
+    incoterm_destino: Optional[str] = None
+    origen: Optional[str] = None
+    destino: Optional[str] = None
+    referencia: Optional[str] = None
+    validez_dias: Optional[EnteroFlexible] = None
+    fecha_validez: Optional[str] = None
+    email_cliente: Optional[str] = None
+    linea_maritima: Optional[str] = None
+    aerolinea: Optional[str] = None
+    equipo: Optional[str] = None
+    cantidad_contenedores: Optional[EnteroFlexible] = None
+    tipo_contenedor: Optional[str] = None
+    cantidad_bls: Optional[EnteroFlexible] = None
+    valor_comercial: Optional[NumeroFlexible] = None
+    peso_total_kg: Optional[NumeroFlexible] = None
+    peso_cargable_kg: Optional[NumeroFlexible] = None
+    volumen_m3: Optional[NumeroFlexible] = None
+    tipo_embalaje: Optional[str] = None
+    cantidad_pallets: Optional[EnteroFlexible] = None
+    transit_time_days: Optional[EnteroFlexible] = None
+    transbordo: Optional[BoolFlexible] = None
+    dias_libres_almacenaje: Optional[EnteroFlexible] = None
+    pickup_address: Optional[str] = None
+    delivery_address: Optional[str] = None
+    pre_carrier: Optional[str] = None
+    consolidacion_deconsolidacion: Optional[str] = None
+    aplica_alimentos: Optional[BoolFlexible] = None
+    tiene_hielo_seco: Optional[BoolFlexible] = None
+    gastos_locales: Optional[NumeroFlexible] = None
+    notificaciones_enviadas: Optional[List[Any]] = None
+
+class OperacionActualizacion(BaseModel):
+    datos_cotizacion: Optional[Dict[str, Any]] = None
+
+class EstadoSalud(BaseModel):
+    status: str
+    database: str
+
+class RespuestaCambioEstado(BaseModel):
+    mensaje: str
+    estado: str
+    color: str
 
 class Notificacion(BaseModel):
     cotizacion_codigo: str
@@ -576,7 +1472,20 @@ def read_root():
         "database": "Supabase (o local Postgres cuando se configure)",
     }
 
-@app.get("/health")
+@app.get("/index.html")
+def servir_frontend(request: Request):
+    """Frontend estático; se recomprime solo cuando cambia el archivo."""
+    ruta = Path(__file__).resolve().parent / "index.html"
+    try:
+        info = ruta.stat()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="index.html no encontrado")
+    entrada = cache_precomprimido.obtener(
+        "index.html", ruta.read_bytes, "text/html; charset=utf-8", version=(info.st_mtime_ns, info.st_size)
+    )
+    return responder_precomprimido(request, entrada, "no-cache")
+
+@app.get("/health", response_model=EstadoSalud)
 def health_check():
     try:
         if supabase is None:
@@ -589,32 +1498,85 @@ def health_check():
     return {"status": "healthy", "database": db_status}
 
 
+def aplicar_tracking_lote(campos_por_operacion: Dict[str, Dict[str, Any]], devolver_datos: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Fusiona campos de tracking en datos_cotizacion con la RPC actualizar_tracking_lote (migrations/006),
+    de a TRACKING_LOTE_RPC operaciones por llamada. Devuelve {codigo: {"estado", "detalle", "datos_cotizacion"}};
+    si falla una llamada, solo sus operaciones quedan con estado "error".
+    """
+    resultados: Dict[str, Dict[str, Any]] = {}
+    items = [{"codigo_operacion": codigo, "campos": campos} for codigo, campos in campos_por_operacion.items()]
+    for i in range(0, len(items), TRACKING_LOTE_RPC):
+        lote = items[i:i + TRACKING_LOTE_RPC]
+        try:
+            filas = supabase.rpc("actualizar_tracking_lote", {
+                "p_items": lote,
+                "p_devolver_datos": devolver_datos,
+            }).execute().data or []
+        except Exception as e:
+            logger.warning("⚠️ Falló un lote de tracking (%s operaciones): %s", len(lote), e)
+            for item in lote:
+                resultados[item["codigo_operacion"]] = {"estado": "error", "detalle": str(e), "datos_cotizacion": None}
+            continue
+        for fila in filas:
+            resultados[fila["codigo_operacion"]] = {
+                "estado": "actualizada" if fila.get("actualizado") else "no_encontrada",
+                "detalle": None,
+                "datos_cotizacion": fila.get("datos_cotizacion"),
+            }
+    return resultados
+
 @app.post("/operaciones/tracking")
-async def actualizar_tracking(data: TrackingUpdate):
-    # Buscar operación
-    op_response = supabase.table("operaciones").select("*").eq("codigo_operacion", data.codigo_operacion).single().execute()
-    if op_response.error or not op_response.data:
+def actualizar_tracking(data: TrackingUpdate, background_tasks: BackgroundTasks):
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Base de datos no disponible")
+
+    resultado = aplicar_tracking_lote({data.codigo_operacion: data.campos()}, devolver_datos=True)[data.codigo_operacion]
+    if resultado["estado"] == "no_encontrada":
         raise HTTPException(status_code=404, detail="Operación no encontrada")
-    
-    # Actualizar datos_cotizacion
-    datos_actualizados = op_response.data.get("datos_cotizacion") or {}
-    for key in data.dict(exclude={"codigo_operacion"}):
-        if data.dict()[key] is not None:
-            datos_actualizados[key] = data.dict()[key]
-
-    # Guardar cambios
-    update_response = supabase.table("operaciones").update({"datos_cotizacion": datos_actualizados}).eq("codigo_operacion", data.codigo_operacion).execute()
-    if update_response.error:
+    if resultado["estado"] == "error":
         raise HTTPException(status_code=500, detail="Error al actualizar operación")
+    background_tasks.add_task(reevaluar_alertas_operacion, data.codigo_operacion)
+    return {"message": "Datos de tracking actualizados", "datos_cotizacion": resultado["datos_cotizacion"]}
 
-    return {"message": "Datos de tracking actualizados", "datos_cotizacion": datos_actualizados}
+@app.post("/operaciones/tracking/lote", response_model=RespuestaTrackingLote)
+def actualizar_tracking_lote(solicitud: SolicitudTrackingLote, background_tasks: BackgroundTasks):
+    """
+    Tracking de muchas operaciones en pocas sentencias, con un resultado por item.
+    Si una operación aparece varias veces, sus campos se combinan en orden (gana el último).
+    """
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Base de datos no disponible")
+
+    campos_por_operacion: Dict[str, Dict[str, Any]] = {}
+    for actualizacion in solicitud.actualizaciones:
+        campos_por_operacion.setdefault(actualizacion.codigo_operacion, {}).update(actualizacion.campos())
+
+    resultados = aplicar_tracking_lote(campos_por_operacion)
+    conteo = collections.Counter(r["estado"] for r in resultados.values())
+    actualizadas = [codigo for codigo, r in resultados.items() if r["estado"] == "actualizada"]
+    if actualizadas:
+        background_tasks.add_task(reevaluar_alertas_operaciones, actualizadas)
+    logger.info("🚢 Tracking en lote: %s operaciones, %s actualizadas, %s no encontradas, %s con error",
+                len(resultados), conteo["actualizada"], conteo["no_encontrada"], conteo["error"])
+
+    return {
+        "recibidas": len(solicitud.actualizaciones),
+        "actualizadas": conteo["actualizada"],
+        "no_encontradas": conteo["no_encontrada"],
+        "errores": conteo["error"],
+        "resultados": [
+            {"codigo_operacion": codigo, "estado": r["estado"], "detalle": r["detalle"]}
+            for codigo, r in resultados.items()
+        ],
+    }
 
 
 @app.get("/cotizaciones/{codigo_path:path}")
 async def obtener_cotizacion_completa(codigo_path: str):
     """Obtener una cotización específica - maneja códigos con barras"""
     try:
-        print(f"🔍 Buscando cotización: {codigo_path}")
+        logger_cotizaciones.debug("🔍 Buscando cotización: %s", codigo_path)
         
         if supabase is None:
             raise HTTPException(status_code=503, detail="Base de datos no disponible")
@@ -622,17 +1584,17 @@ async def obtener_cotizacion_completa(codigo_path: str):
         # Buscar por codigo_legible (que puede contener barras)
         response = supabase.table("cotizaciones").select("*").eq("codigo_legible", codigo_path).execute()
         
-        print(f"📊 Resultado de búsqueda: {len(response.data)} registros")
+        logger_cotizaciones.debug("📊 Resultado de búsqueda: %s registros", len(response.data))
         
         if not response.data:
             raise HTTPException(status_code=404, detail=f"Cotización '{codigo_path}' no encontrada")
 
         cotizacion = response.data[0]
-        print(f"✅ Cotización encontrada: {cotizacion['codigo_legible']}")
+        logger_cotizaciones.debug("✅ Cotización encontrada: %s", cotizacion['codigo_legible'])
 
         # Obtener los costos asociados
         costos_response = supabase.table("costos_cotizacion").select("*").eq("codigo_cotizacion", cotizacion['codigo_legible']).execute()
-        print(f"💰 Costos encontrados: {len(costos_response.data or [])}")
+        logger_cotizaciones.debug("💰 Costos encontrados: %s", len(costos_response.data or []))
         
         # Calcular estado actual
         estado_info = calcular_estado_y_validez(
@@ -660,116 +1622,136 @@ async def obtener_cotizacion_completa(codigo_path: str):
         raise HTTPException(status_code=500, detail=f"Error al obtener cotización: {str(e)}")
 
 
-@app.post("/cotizaciones/duplicar")
-async def duplicar_cotizacion(cotizacion_duplicada: dict):
+# -----------------------
+# Duplicación de cotizaciones
+# -----------------------
+def armar_payload_duplicado(original: CotizacionDuplicar, codigo_legible: str, modo_transporte: str, fecha_actual: datetime) -> Dict[str, Any]:
+    """Fila nueva de cotizaciones a partir de la cotización que se duplica (estado y validez reiniciados)."""
+    fecha_validez = fecha_actual + timedelta(days=30)
+    return {
+        "codigo": str(uuid4()),
+        "codigo_legible": codigo_legible,
+        "cliente": original.cliente or "",
+        "cliente_id": original.cliente_id,
+        "tipo_operacion": original.tipo_operacion or "",
+        "modo_transporte": modo_transporte,
+
+        # ✅ CAMPOS CRÍTICOS - EXTRAER DIRECTAMENTE CON VALORES POR DEFECTO
+        "origen": original.origen or "",  # Forzar string vacío si es None
+        "destino": original.destino or "",
+
+        # ✅ CAMPOS DE PESOS Y MEDIDAS (ya convertidos por CotizacionDuplicar)
+        "peso_total_kg": original.peso_total_kg,
+        "peso_cargable_kg": original.peso_cargable_kg,
+        "volumen_m3": original.volumen_m3,
+        "cantidad_pallets": original.cantidad_pallets,
+
+        "estado": "creada",
+        "fecha_creacion": fecha_actual.isoformat(),
+        "fecha_actualizacion": fecha_actual.isoformat(),
+        "fecha_validez": fecha_validez.date().isoformat(),
+        "validez_dias": 30,
+
+        # ✅ OTROS CAMPOS IMPORTANTES
+        "incoterm_origen": original.incoterm_origen,
+        "incoterm_destino": original.incoterm_destino,
+        "referencia": original.referencia,
+        "email_cliente": original.email_cliente,
+        "linea_maritima": original.linea_maritima,
+        "aerolinea": original.aerolinea,
+        "equipo": original.equipo,
+        "cantidad_contenedores": original.cantidad_contenedores,
+        "tipo_contenedor": original.tipo_contenedor,
+        "cantidad_bls": original.cantidad_bls,
+        "valor_comercial": original.valor_comercial,
+        "tipo_embalaje": original.tipo_embalaje,
+        "transit_time_days": original.transit_time_days,
+        "transbordo": original.transbordo,
+        "dias_libres_almacenaje": original.dias_libres_almacenaje,
+        "pickup_address": original.pickup_address,
+        "delivery_address": original.delivery_address,
+        "pre_carrier": original.pre_carrier,
+        "consolidacion_deconsolidacion": original.consolidacion_deconsolidacion,
+        "aplica_alimentos": original.aplica_alimentos,
+        "tiene_hielo_seco": original.tiene_hielo_seco,
+        "gastos_locales": original.gastos_locales
+    }
+
+def armar_costos_duplicados(costos: List[CostoDuplicado], codigo_nuevo: str, fecha_actual: datetime) -> List[Dict[str, Any]]:
+    """Copia de los costos para la cotización nueva, un costo por concepto (se queda el primero)."""
+    conceptos_unicos = {}
+    nuevos_costos = []
+
+    for costo in costos:
+        concepto = (costo.concepto or "").strip()
+        if not concepto:
+            continue
+
+        if concepto not in conceptos_unicos:
+            conceptos_unicos[concepto] = True
+
+            nuevo_costo = {
+                "codigo_cotizacion": codigo_nuevo,
+                "concepto": concepto,
+                "costo": costo.costo,
+                "venta": costo.venta,
+                "es_predefinido": costo.es_predefinido,
+                "tipo": costo.tipo or "OTRO",
+                "fecha_creacion": fecha_actual.isoformat()
+            }
+
+            if costo.detalles:
+                nuevo_costo["detalles"] = costo.detalles
+
+            nuevos_costos.append(nuevo_costo)
+
+    return nuevos_costos
+
+@app.post("/cotizaciones/duplicar", response_model=RespuestaDuplicar)
+async def duplicar_cotizacion(cotizacion_duplicada: CotizacionDuplicar):
     """Duplicar cotización - CORREGIDO para campos específicos"""
     try:
         if supabase is None:
             raise HTTPException(status_code=503, detail="Base de datos no disponible")
 
-        print(f"📋 Iniciando duplicación para: {cotizacion_duplicada.get('codigo_legible', 'N/A')}")
+        logger_cotizaciones.debug("📋 Iniciando duplicación para: %s", cotizacion_duplicada.codigo_legible or 'N/A')
 
         # 🔍 DEBUG ESPECÍFICO PARA CAMPOS PROBLEMÁTICOS
-        print("🔍 CAMPOS CRÍTICOS RECIBIDOS:")
         campos_problematicos = ['origen', 'destino', 'peso_total_kg', 'peso_cargable_kg', 'volumen_m3', 'cantidad_pallets']
-        for campo in campos_problematicos:
-            valor = cotizacion_duplicada.get(campo)
-            print(f"   {campo}: '{valor}' (tipo: {type(valor)})")
+        if logger_cotizaciones.isEnabledFor(logging.DEBUG):
+            logger_cotizaciones.debug("🔍 CAMPOS CRÍTICOS RECIBIDOS:")
+            for campo in campos_problematicos:
+                valor = getattr(cotizacion_duplicada, campo)
+                logger_cotizaciones.debug("   %s: '%s' (tipo: %s)", campo, valor, type(valor))
 
         # ✅ VALIDACIÓN CRÍTICA: Verificar modo_transporte
-        modo_transporte = cotizacion_duplicada.get('modo_transporte', '')
-        print(f"🚚 Modo transporte recibido: '{modo_transporte}'")
+        modo_transporte = cotizacion_duplicada.modo_transporte or ""
+        logger_cotizaciones.debug("🚚 Modo transporte recibido: '%s'", modo_transporte)
         
         MODOS_TRANSPORTE_VALIDOS = ["Aerea", "Maritima FCL", "Maritima LCL", "Terrestre", "Courier"]
         
         if modo_transporte not in MODOS_TRANSPORTE_VALIDOS:
-            print(f"⚠️ Modo transporte inválido: '{modo_transporte}'. Usando valor por defecto.")
+            logger_cotizaciones.warning("⚠️ Modo transporte inválido: '%s'. Usando valor por defecto.", modo_transporte)
             modo_transporte = "Aerea"
 
         # 1. Generar nuevo código correlativo
-        tipo_operacion = cotizacion_duplicada.get('tipo_operacion', '')
-        nuevo_codigo_legible = await generar_proximo_numero(tipo_operacion)
-        print(f"🎯 Nuevo código correlativo generado: {nuevo_codigo_legible}")
+        nuevo_codigo_legible = await generar_proximo_numero(cotizacion_duplicada.tipo_operacion or "")
+        logger_cotizaciones.debug("🎯 Nuevo código correlativo generado: %s", nuevo_codigo_legible)
 
         # 2. Usar fecha ACTUAL con timezone de Argentina
         from datetime import timezone
         fecha_actual = datetime.now(timezone(timedelta(hours=-3)))
-        fecha_validez = fecha_actual + timedelta(days=30)
-
-        # ✅ FUNCIÓN AUXILIAR PARA MANEJAR CAMPOS NUMÉRICOS
-        def safe_numeric_value(value, default=0.0):
-            """Convierte valores vacíos o inválidos a números seguros"""
-            if value is None or value == "":
-                return default
-            try:
-                return float(value)
-            except (ValueError, TypeError):
-                return default
-
-        def safe_int_value(value, default=0):
-            """Convierte valores vacíos o inválidos a enteros seguros"""
-            if value is None or value == "":
-                return default
-            try:
-                return int(value)
-            except (ValueError, TypeError):
-                return default
 
         # 3. ✅ CREAR NUEVA COTIZACIÓN - ENFOCADO EN CAMPOS PROBLEMÁTICOS
-        nueva_cotizacion_data = {
-            "codigo": str(uuid4()),
-            "codigo_legible": nuevo_codigo_legible,
-            "cliente": cotizacion_duplicada.get('cliente', ''),
-            "tipo_operacion": tipo_operacion,
-            "modo_transporte": modo_transporte,
-            
-            # ✅ CAMPOS CRÍTICOS - EXTRAER DIRECTAMENTE CON VALORES POR DEFECTO
-            "origen": cotizacion_duplicada.get('origen') or "",  # Forzar string vacío si es None
-            "destino": cotizacion_duplicada.get('destino') or "",
-            
-            # ✅ CAMPOS DE PESOS Y MEDIDAS - CONVERSIÓN EXPLÍCITA
-            "peso_total_kg": safe_numeric_value(cotizacion_duplicada.get('peso_total_kg'), 0.0),
-            "peso_cargable_kg": safe_numeric_value(cotizacion_duplicada.get('peso_cargable_kg'), 0.0),
-            "volumen_m3": safe_numeric_value(cotizacion_duplicada.get('volumen_m3'), 0.0),
-            "cantidad_pallets": safe_int_value(cotizacion_duplicada.get('cantidad_pallets'), 0),
-            
-            "estado": "creada",
-            "fecha_creacion": fecha_actual.isoformat(),
-            "fecha_actualizacion": fecha_actual.isoformat(),
-            "fecha_validez": fecha_validez.date().isoformat(),
-            "validez_dias": 30,
-            
-            # ✅ OTROS CAMPOS IMPORTANTES
-            "incoterm_origen": cotizacion_duplicada.get('incoterm_origen'),
-            "incoterm_destino": cotizacion_duplicada.get('incoterm_destino'),
-            "referencia": cotizacion_duplicada.get('referencia'),
-            "email_cliente": cotizacion_duplicada.get('email_cliente'),
-            "linea_maritima": cotizacion_duplicada.get('linea_maritima'),
-            "aerolinea": cotizacion_duplicada.get('aerolinea'),
-            "equipo": cotizacion_duplicada.get('equipo'),
-            "cantidad_contenedores": safe_int_value(cotizacion_duplicada.get('cantidad_contenedores'), 1),
-            "tipo_contenedor": cotizacion_duplicada.get('tipo_contenedor'),
-            "cantidad_bls": safe_int_value(cotizacion_duplicada.get('cantidad_bls'), 1),
-            "valor_comercial": safe_numeric_value(cotizacion_duplicada.get('valor_comercial'), 0.0),
-            "tipo_embalaje": cotizacion_duplicada.get('tipo_embalaje'),
-            "transit_time_days": safe_int_value(cotizacion_duplicada.get('transit_time_days')),
-            "transbordo": bool(cotizacion_duplicada.get('transbordo', False)),
-            "dias_libres_almacenaje": safe_int_value(cotizacion_duplicada.get('dias_libres_almacenaje'), 0),
-            "pickup_address": cotizacion_duplicada.get('pickup_address'),
-            "delivery_address": cotizacion_duplicada.get('delivery_address'),
-            "pre_carrier": cotizacion_duplicada.get('pre_carrier'),
-            "consolidacion_deconsolidacion": cotizacion_duplicada.get('consolidacion_deconsolidacion'),
-            "aplica_alimentos": bool(cotizacion_duplicada.get('aplica_alimentos', False)),
-            "tiene_hielo_seco": bool(cotizacion_duplicada.get('tiene_hielo_seco', False)),
-            "gastos_locales": safe_numeric_value(cotizacion_duplicada.get('gastos_locales'), 0.0)
-        }
+        nueva_cotizacion_data = armar_payload_duplicado(cotizacion_duplicada, nuevo_codigo_legible, modo_transporte, fecha_actual)
 
         # 🔍 VERIFICACIÓN FINAL ANTES DE INSERTAR
-        print("✅ DATOS QUE SE INSERTARÁN:")
-        for campo in campos_problematicos:
-            print(f"   {campo}: {nueva_cotizacion_data[campo]}")
+        if logger_cotizaciones.isEnabledFor(logging.DEBUG):
+            logger_cotizaciones.debug("✅ DATOS QUE SE INSERTARÁN:")
+            for campo in campos_problematicos:
+                logger_cotizaciones.debug("   %s: %s", campo, nueva_cotizacion_data[campo])
 
-        print(f"✅ Insertando cotización: {nueva_cotizacion_data['codigo_legible']}")
+        logger_cotizaciones.debug("✅ Insertando cotización: %s", nueva_cotizacion_data['codigo_legible'])
 
         # 4. Insertar la nueva cotización
         response_cotizacion = supabase.table("cotizaciones").insert(nueva_cotizacion_data).execute()
@@ -779,48 +1761,23 @@ async def duplicar_cotizacion(cotizacion_duplicada: dict):
 
         nueva_cotizacion = response_cotizacion.data[0]
         codigo_nuevo = nueva_cotizacion['codigo_legible']
-        print(f"✅ Cotización duplicada creada: {codigo_nuevo}")
+        logger_cotizaciones.info("✅ Cotización duplicada creada: %s", codigo_nuevo)
 
         # 5. Duplicar costos (mantener tu lógica actual)
-        costos_originales = cotizacion_duplicada.get('costos', [])
+        costos_originales = cotizacion_duplicada.costos
         costos_duplicados_count = 0
         
         if costos_originales:
-            print(f"💰 Procesando {len(costos_originales)} costos para duplicación...")
-            
-            conceptos_unicos = {}
-            nuevos_costos = []
+            logger_cotizaciones.debug("💰 Procesando %s costos para duplicación...", len(costos_originales))
             
-            for costo in costos_originales:
-                concepto = costo.get('concepto', '').strip()
-                if not concepto:
-                    continue
-                    
-                if concepto not in conceptos_unicos:
-                    conceptos_unicos[concepto] = True
-                    
-                    nuevo_costo = {
-                        "codigo_cotizacion": codigo_nuevo,
-                        "concepto": concepto,
-                        "costo": safe_numeric_value(costo.get('costo'), 0),
-                        "venta": safe_numeric_value(costo.get('venta'), 0),
-                        "es_predefinido": bool(costo.get('es_predefinido', False)),
-                        "tipo": costo.get('tipo', 'OTRO'),
-                        "fecha_creacion": fecha_actual.isoformat()
-                    }
-                    
-                    if costo.get('detalles'):
-                        nuevo_costo["detalles"] = costo['detalles']
-                    
-                    nuevos_costos.append(nuevo_costo)
-            
-            print(f"✅ Costos únicos a insertar: {len(nuevos_costos)}")
+            nuevos_costos = armar_costos_duplicados(costos_originales, codigo_nuevo, fecha_actual)
+            logger_cotizaciones.debug("✅ Costos únicos a insertar: %s", len(nuevos_costos))
             
             if nuevos_costos:
                 response_costos = supabase.table("costos_cotizacion").insert(nuevos_costos).execute()
                 if response_costos.data:
                     costos_duplicados_count = len(response_costos.data)
-                    print(f"✅ {costos_duplicados_count} costos duplicados exitosamente")
+                    logger_cotizaciones.info("✅ %s costos duplicados exitosamente", costos_duplicados_count)
 
         # 6. Crear carpeta
         try:
@@ -832,11 +1789,11 @@ async def duplicar_cotizacion(cotizacion_duplicada: dict):
                 subcarpeta_path = os.path.join(carpeta_path, subcarpeta)
                 os.makedirs(subcarpeta_path, exist_ok=True)
             
-            print(f"📁 Carpeta creada: {carpeta_path}")
+            logger_cotizaciones.debug("📁 Carpeta creada: %s", carpeta_path)
         except Exception as e:
-            print(f"⚠️ Error creando carpeta: {e}")
+            logger_cotizaciones.error("⚠️ Error creando carpeta: %s", e)
 
-        print(f"🎉 Duplicación completada exitosamente: {codigo_nuevo}")
+        logger_cotizaciones.info("🎉 Duplicación completada exitosamente: %s", codigo_nuevo)
         
         return {
             "mensaje": "Cotización duplicada exitosamente",
@@ -854,7 +1811,7 @@ async def duplicar_cotizacion(cotizacion_duplicada: dict):
 @app.post("/debug/duplicacion-detalle")
 async def debug_duplicacion_detalle(cotizacion_duplicada: dict):
     """Endpoint para debug detallado de datos recibidos"""
-    print("🔍 DEBUG DETALLADO - Datos recibidos para duplicación:")
+    logger_cotizaciones.debug("🔍 DEBUG DETALLADO - Datos recibidos para duplicación:")
     
     # Campos críticos que no se están duplicando
     campos_criticos = [
@@ -870,10 +1827,10 @@ async def debug_duplicacion_detalle(cotizacion_duplicada: dict):
             'tipo': type(valor).__name__,
             'esta_presente': campo in cotizacion_duplicada
         }
-        print(f"   {campo}: {valor} (tipo: {type(valor)}, presente: {campo in cotizacion_duplicada})")
+        logger_cotizaciones.debug("   %s: %s (tipo: %s, presente: %s)", campo, valor, type(valor), campo in cotizacion_duplicada)
     
     # Mostrar todos los campos disponibles
-    print(f"📋 Todos los campos recibidos: {list(cotizacion_duplicada.keys())}")
+    logger_cotizaciones.debug("📋 Todos los campos recibidos: %s", list(cotizacion_duplicada.keys()))
     
     return {
         "mensaje": "Debug completado", 
@@ -883,14 +1840,14 @@ async def debug_duplicacion_detalle(cotizacion_duplicada: dict):
 
 
 @app.put("/cotizaciones/{codigo_legible}")
-async def actualizar_cotizacion(codigo_legible: str, cotizacion: dict):
+async def actualizar_cotizacion(codigo_legible: str, cotizacion: CotizacionActualizacion):
     """Actualizar una cotización existente - CORREGIDO"""
     try:
         if supabase is None:
             raise HTTPException(status_code=503, detail="Base de datos no disponible")
 
-        print(f"✏️ Actualizando cotización: {codigo_legible}")
-        print(f"📤 Datos recibidos: {cotizacion}")
+        logger_cotizaciones.debug("✏️ Actualizando cotización: %s", codigo_legible)
+        logger_cotizaciones.debug("📤 Campos recibidos: %s", sorted(cotizacion.model_fields_set))
         
         # Verificar que la cotización existe
         existing_cot = supabase.table("cotizaciones").select("*").eq("codigo_legible", codigo_legible).execute()
@@ -898,19 +1855,21 @@ async def actualizar_cotizacion(codigo_legible: str, cotizacion: dict):
             raise HTTPException(status_code=404, detail="Cotización no encontrada")
 
         # Preparar datos para actualización (excluir campos que no deben actualizarse)
-        campos_no_actualizables = ['codigo', 'codigo_legible', 'fecha_creacion', 'id']
-        update_data = {k: v for k, v in cotizacion.items() if k not in campos_no_actualizables and v is not None}
+        update_data = cotizacion.model_dump(exclude=CAMPOS_COTIZACION_NO_ACTUALIZABLES, exclude_none=True)
         update_data["fecha_actualizacion"] = datetime.now().isoformat()
 
-        print(f"📝 Campos a actualizar: {list(update_data.keys())}")
+        logger_cotizaciones.debug("📝 Campos a actualizar: %s", list(update_data.keys()))
 
         # Actualizar en la base de datos
         response = supabase.table("cotizaciones").update(update_data).eq("codigo_legible", codigo_legible).execute()
+        if "codigo_operacion" in update_data:
+            # La carpeta de la operación sale de cotizaciones.codigo_operacion (ver carpeta_operacion)
+            olvidar_carpeta_operacion(update_data["codigo_operacion"], existing_cot.data[0].get("codigo_operacion"))
         
         if not response.data:
             raise HTTPException(status_code=500, detail="Error al actualizar cotización")
 
-        logger.info(f"✅ Cotización actualizada: {codigo_legible}")
+        logger.info("✅ Cotización actualizada: %s", codigo_legible)
         return {
             "mensaje": "Cotización actualizada exitosamente",
             "codigo": codigo_legible,
@@ -938,7 +1897,7 @@ async def debug_routes():
             })
     return {"routes": routes}
 
-@app.get("/debug/cotizaciones")
+@app.get("/debug/cotizaciones", response_class=RespuestaJSONRapida)
 async def debug_cotizaciones():
     """Endpoint de diagnóstico para ver todas las cotizaciones"""
     try:
@@ -947,10 +1906,10 @@ async def debug_cotizaciones():
             
         response = supabase.table("cotizaciones").select("codigo_legible, cliente, estado, fecha_creacion").order("fecha_creacion", desc=True).execute()
         
-        return {
+        return RespuestaJSONRapida({
             "total": len(response.data),
             "cotizaciones": response.data
-        }
+        })
     except Exception as e:
         return {"error": str(e)}
 
@@ -965,7 +1924,7 @@ async def guardar_pdf_carpeta(
         codigo_normalizado = codigo_cotizacion.replace('/', '\\')
         codigo_archivo = codigo_cotizacion.replace('/', '_')
         
-        print(f"🔍 GUARDAR PDF - Código: {codigo_cotizacion}")
+        logger_pdf.debug("🔍 GUARDAR PDF - Código: %s", codigo_cotizacion)
 
         # Nombre del archivo - usar el mismo formato que ya existe
         fecha = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -974,8 +1933,8 @@ async def guardar_pdf_carpeta(
         # Ruta de la carpeta
         ruta_carpeta = os.path.join(BASE_DIR, codigo_normalizado, "Cotizaciones")
         
-        print(f"📁 Ruta de carpeta: {ruta_carpeta}")
-        print(f"📄 Nombre archivo: {nombre_archivo}")
+        logger_pdf.debug("📁 Ruta de carpeta: %s", ruta_carpeta)
+        logger_pdf.debug("📄 Nombre archivo: %s", nombre_archivo)
 
         # Crear carpeta si no existe
         os.makedirs(ruta_carpeta, exist_ok=True)
@@ -987,7 +1946,7 @@ async def guardar_pdf_carpeta(
         with open(ruta_archivo, "wb") as f:
             f.write(await archivo.read())
 
-        print(f"✅ PDF guardado exitosamente: {ruta_archivo}")
+        logger_pdf.info("✅ PDF guardado exitosamente: %s", ruta_archivo)
 
         return {
             "mensaje": "PDF guardado exitosamente",
@@ -996,7 +1955,7 @@ async def guardar_pdf_carpeta(
         }
 
     except Exception as e:
-        print(f"❌ Error guardando PDF: {str(e)}")
+        logger_pdf.error("❌ Error guardando PDF: %s", e)
         raise HTTPException(status_code=500, detail=f"Error guardando PDF: {str(e)}")
     
 
@@ -1006,46 +1965,46 @@ async def descargar_pdf(codigo_cotizacion: str, tipo_pdf: str = "interno"):
     Devuelve el PDF - con debug extendido
     """
     try:
-        print(f"🔍 DESCARGAR PDF - INICIANDO")
-        print(f"   Código: {codigo_cotizacion}")
-        print(f"   Tipo: {tipo_pdf}")
+        logger_pdf.debug("🔍 DESCARGAR PDF - INICIANDO")
+        logger_pdf.debug("   Código: %s", codigo_cotizacion)
+        logger_pdf.debug("   Tipo: %s", tipo_pdf)
         
         # Normalizar código para ruta
         codigo_normalizado = codigo_cotizacion.replace('/', '\\')
         ruta_carpeta_cotizaciones = os.path.join(BASE_DIR, codigo_normalizado, "Cotizaciones")
         
-        print(f"📁 Ruta construida: {ruta_carpeta_cotizaciones}")
-        print(f"📁 BASE_DIR: {BASE_DIR}")
+        logger_pdf.debug("📁 Ruta construida: %s", ruta_carpeta_cotizaciones)
+        logger_pdf.debug("📁 BASE_DIR: %s", BASE_DIR)
 
         # Verificar si existe la carpeta
         existe_carpeta = os.path.exists(ruta_carpeta_cotizaciones)
-        print(f"📁 Carpeta existe: {existe_carpeta}")
+        logger_pdf.debug("📁 Carpeta existe: %s", existe_carpeta)
 
         if not existe_carpeta:
-            print(f"❌ Carpeta NO existe: {ruta_carpeta_cotizaciones}")
+            logger_pdf.warning("❌ Carpeta NO existe: %s", ruta_carpeta_cotizaciones)
             raise HTTPException(status_code=404, detail="No se encontró la carpeta de cotizaciones")
 
         # Listar contenido de la carpeta
         try:
             contenido = os.listdir(ruta_carpeta_cotizaciones)
-            print(f"📂 Contenido de la carpeta: {contenido}")
+            logger_pdf.debug("📂 Contenido de la carpeta: %s", contenido)
         except Exception as e:
-            print(f"❌ Error listando carpeta: {e}")
+            logger_pdf.error("❌ Error listando carpeta: %s", e)
             contenido = []
 
         # Buscar archivos PDF
         todos_los_pdf = [f for f in contenido if f.lower().endswith('.pdf')]
-        print(f"📊 Archivos PDF encontrados: {todos_los_pdf}")
+        logger_pdf.debug("📊 Archivos PDF encontrados: %s", todos_los_pdf)
 
         if not todos_los_pdf:
-            print(f"❌ No hay archivos PDF en la carpeta")
+            logger_pdf.warning("❌ No hay archivos PDF en la carpeta")
             raise HTTPException(status_code=404, detail="No se encontraron archivos PDF")
 
         # Parámetros de búsqueda
         codigo_busqueda = codigo_cotizacion.replace('/', '_').lower()
         tipo_busqueda = tipo_pdf.lower()
         
-        print(f"🔍 Parámetros búsqueda - Código: '{codigo_busqueda}', Tipo: '{tipo_busqueda}'")
+        logger_pdf.debug("🔍 Parámetros búsqueda - Código: '%s', Tipo: '%s'", codigo_busqueda, tipo_busqueda)
 
         # Filtrar archivos
         archivos_filtrados = []
@@ -1054,22 +2013,22 @@ async def descargar_pdf(codigo_cotizacion: str, tipo_pdf: str = "interno"):
             tiene_codigo = codigo_busqueda in archivo_lower
             tiene_tipo = tipo_busqueda in archivo_lower
             
-            print(f"   📄 {archivo} - código: {tiene_codigo}, tipo: {tiene_tipo}")
+            logger_pdf.debug("   📄 %s - código: %s, tipo: %s", archivo, tiene_codigo, tiene_tipo)
             
             if tiene_codigo and tiene_tipo:
                 archivos_filtrados.append(archivo)
 
-        print(f"🔍 Archivos que coinciden: {archivos_filtrados}")
+        logger_pdf.debug("🔍 Archivos que coinciden: %s", archivos_filtrados)
 
         # Si no encuentra con ambos criterios, buscar solo por código
         if not archivos_filtrados:
-            print(f"🔍 Búsqueda ampliada - solo por código")
+            logger_pdf.debug("🔍 Búsqueda ampliada - solo por código")
             archivos_filtrados = [f for f in todos_los_pdf if codigo_busqueda in f.lower()]
-            print(f"🔍 Archivos con código: {archivos_filtrados}")
+            logger_pdf.debug("🔍 Archivos con código: %s", archivos_filtrados)
 
         # Si aún no encuentra, usar el primer PDF
         if not archivos_filtrados:
-            print(f"🔍 Usando primer PDF disponible")
+            logger_pdf.debug("🔍 Usando primer PDF disponible")
             archivos_filtrados = [todos_los_pdf[0]]
 
         # Seleccionar el más reciente
@@ -1077,15 +2036,15 @@ async def descargar_pdf(codigo_cotizacion: str, tipo_pdf: str = "interno"):
         archivo_seleccionado = archivos_filtrados[0]
         ruta_archivo = os.path.join(ruta_carpeta_cotizaciones, archivo_seleccionado)
         
-        print(f"✅ Archivo seleccionado: {archivo_seleccionado}")
-        print(f"📄 Ruta completa: {ruta_archivo}")
+        logger_pdf.debug("✅ Archivo seleccionado: %s", archivo_seleccionado)
+        logger_pdf.debug("📄 Ruta completa: %s", ruta_archivo)
 
         # Verificar que el archivo existe
         if not os.path.exists(ruta_archivo):
-            print(f"❌ Archivo NO existe: {ruta_archivo}")
+            logger_pdf.warning("❌ Archivo NO existe: %s", ruta_archivo)
             raise HTTPException(status_code=404, detail="El archivo PDF no existe")
 
-        print(f"✅ Enviando archivo...")
+        logger_pdf.debug("✅ Enviando archivo...")
         
         return FileResponse(
             ruta_archivo,
@@ -1094,11 +2053,10 @@ async def descargar_pdf(codigo_cotizacion: str, tipo_pdf: str = "interno"):
         )
 
     except HTTPException as he:
-        print(f"❌ HTTPException: {he.detail}")
+        logger_pdf.warning("❌ HTTPException: %s", he.detail)
         raise he
     except Exception as e:
-        print(f"❌ ERROR CRÍTICO: {str(e)}")
-        print(f"❌ TRACEBACK: {traceback.format_exc()}")
+        logger_pdf.exception("❌ ERROR CRÍTICO: %s", e)
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
     
 @app.post("/crear_carpeta/")
@@ -1222,11 +2180,11 @@ def calcular_estado_y_validez(fecha_validez: Any, validez_dias: int, estado_actu
     CORREGIDO: Cuando dias_restantes = 0, estado debe ser 'vencida'
     """
     try:
-        print(f"🔍 Calculando estado: estado_db={estado_actual_db}, fecha_validez={fecha_validez}")
+        logger_cotizaciones.debug("🔍 Calculando estado: estado_db=%s, fecha_validez=%s", estado_actual_db, fecha_validez)
         
         # ✅ RESPETAR TODOS LOS ESTADOS MANUALES
         if estado_actual_db in ['creada', 'enviada', 'aceptada', 'rechazada']:
-            print(f"✅ Respetando estado manual: {estado_actual_db}")
+            logger_cotizaciones.debug("✅ Respetando estado manual: %s", estado_actual_db)
             dias_restantes = 0
             
             # Solo calcular días restantes si hay fecha de validez
@@ -1259,7 +2217,7 @@ def calcular_estado_y_validez(fecha_validez: Any, validez_dias: int, estado_actu
         fecha_validez_date = fecha_validez.date() if isinstance(fecha_validez, datetime) else fecha_validez
         dias_restantes = (fecha_validez_date - hoy).days
 
-        print(f"📅 Días restantes calculados: {dias_restantes}")
+        logger_cotizaciones.debug("📅 Días restantes calculados: %s", dias_restantes)
 
         # ✅ CORRECCIÓN: Si dias_restantes es 0 o negativo, está VENCIDA
         if dias_restantes < 0:
@@ -1272,7 +2230,7 @@ def calcular_estado_y_validez(fecha_validez: Any, validez_dias: int, estado_actu
             # Si no tiene estado y no está vencida, mantener como estaba o poner 'creada'
             nuevo_estado = estado_actual_db or 'creada'
 
-        print(f"🎯 Estado final: {nuevo_estado}")
+        logger_cotizaciones.debug("🎯 Estado final: %s", nuevo_estado)
             
         return {
             'estado': nuevo_estado, 
@@ -1288,6 +2246,52 @@ def calcular_estado_y_validez(fecha_validez: Any, validez_dias: int, estado_actu
             'color': ESTADOS_COTIZACION['creada']['color']
         }  
 
+def procesar_cotizacion_listado(cot: Dict[str, Any]) -> Dict[str, Any]:
+    """Agrega a una fila de cotizaciones el código visible y la información de estado para los listados."""
+    cot_data = cot.copy()
+
+    # Usar codigo legible si existe
+    if cot_data.get('codigo_legible'):
+        cot_data['codigo'] = cot_data['codigo_legible']
+    else:
+        # fallback retroactivo
+        tipo_op = cot_data.get('tipo_operacion', 'XX')
+        prefijo = {
+            'IA': 'GAN-IA', 'IM': 'GAN-IM', 'EA': 'GAN-EA',
+            'EM': 'GAN-EM', 'IT': 'GAN-IT', 'ET': 'GAN-ET','MC': 'GAN-MC', 'CO': 'GAN-CO'
+        }.get(tipo_op, 'GAN-XX')
+        fecha = cot_data.get('fecha_creacion', datetime.now())
+        if isinstance(fecha, str):
+            try:
+                fecha = datetime.fromisoformat(fecha.replace('Z', '+00:00'))
+            except Exception:
+                fecha = datetime.now()
+        año = fecha.strftime("%y")
+        mes = fecha.strftime("%m")
+        cot_data['codigo'] = f"{prefijo}-{año}/{mes}/R01"
+
+    # ✅ Pasar el estado ACTUAL de la base de datos
+    estado_info = calcular_estado_y_validez(
+        cot_data.get('fecha_validez'), 
+        cot_data.get('validez_dias', 30),
+        cot_data.get('estado')
+    )
+
+    cot_data['estado_actual'] = estado_info['estado']
+    cot_data['color'] = estado_info['color']
+    cot_data['dias_restantes'] = estado_info['dias_restantes']
+    cot_data['label_estado'] = ESTADOS_COTIZACION.get(estado_info['estado'], {'label': '🔵 ENVIADA'})['label']
+    return cot_data
+
+def fila_notificacion(cotizacion: Dict, tipo_alerta: str, mensaje: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "cotizacion_codigo": cotizacion.get('codigo_legible', cotizacion.get('codigo')),
+        "tipo": tipo_alerta,
+        "mensaje": mensaje or f"Alerta {tipo_alerta} para {cotizacion.get('codigo_legible')}",
+        "fecha": datetime.now().isoformat(),
+        "leido": False
+    }
+
 async def enviar_notificacion(cotizacion: Dict, tipo_alerta: str, mensaje: Optional[str] = None):
     """
     Guarda una notificación en la tabla 'notificaciones' de Supabase.
@@ -1297,18 +2301,23 @@ async def enviar_notificacion(cotizacion: Dict, tipo_alerta: str, mensaje: Optio
             logger.info("Supabase no configurado - notificacion: %s - %s", tipo_alerta, cotizacion.get('codigo_legible'))
             return
 
-        noti = {
-            "cotizacion_codigo": cotizacion.get('codigo_legible', cotizacion.get('codigo')),
-            "tipo": tipo_alerta,
-            "mensaje": mensaje or f"Alerta {tipo_alerta} para {cotizacion.get('codigo_legible')}",
-            "fecha": datetime.now().isoformat(),
-            "leido": False
-        }
+        noti = fila_notificacion(cotizacion, tipo_alerta, mensaje)
         resp = supabase.table("notificaciones").insert(noti).execute()
         logger.info("Notificación guardada: %s (resp: %s rows)", noti['cotizacion_codigo'], len(resp.data) if resp and resp.data else 0)
     except Exception as e:
         logger.exception("Error enviando notificacion: %s", e)  
 
+def enviar_notificaciones(cotizaciones: List[Dict], tipo_alerta: str, mensaje: Optional[str] = None):
+    """Igual que enviar_notificacion para varias cotizaciones, con un insert de varias filas."""
+    if supabase is None or not cotizaciones:
+        return
+    try:
+        filas = [fila_notificacion(cot, tipo_alerta, mensaje) for cot in cotizaciones]
+        supabase.table("notificaciones").insert(filas, returning="minimal").execute()
+        logger.info("Notificaciones guardadas: %s (%s)", len(filas), tipo_alerta)
+    except Exception as e:
+        logger.exception("Error enviando notificaciones: %s", e)
+
 def get_linea_id_by_nombre(nombre_linea: str) -> Optional[int]:
     """Busca el ID de una línea marítima por su nombre."""
     try:
@@ -1319,7 +2328,7 @@ def get_linea_id_by_nombre(nombre_linea: str) -> Optional[int]:
             .execute()
         return response.data["id"]
     except Exception as e:
-        logger.warning(f"Línea marítima '{nombre_linea}' no encontrada: {e}")
+        logger.warning("Línea marítima '%s' no encontrada: %s", nombre_linea, e)
         return None
 
 # -----------------------
@@ -1350,7 +2359,10 @@ async def verificar_vencimientos_loop(interval_seconds: int = 300):
                     estado_info = calcular_estado_y_validez(cot.get('fecha_validez'), cot.get('validez_dias', 30))
                     if estado_info['estado'] != cot.get('estado'):
                         # actualizar estado en DB
-                        supabase.table("cotizaciones").update({"estado": estado_info['estado']}).eq("codigo_legible", cot['codigo_legible']).execute()
+                        supabase.table("cotizaciones").update({
+                            "estado": estado_info['estado'],
+                            "fecha_actualizacion": datetime.now().isoformat(),
+                        }).eq("codigo_legible", cot['codigo_legible']).execute()
                         # crear notificación
                         await enviar_notificacion(cot, f"estado_{estado_info['estado']}", f"Cotización {cot['codigo_legible']} pasó a {estado_info['estado']}")
                         logger.info("Cot %s actualizado a %s", cot.get('codigo_legible'), estado_info['estado'])
@@ -1358,15 +2370,178 @@ async def verificar_vencimientos_loop(interval_seconds: int = 300):
             logger.exception("Error en loop de verificación: %s", e)
         await asyncio.sleep(interval_seconds)
 
+# Tareas de fondo del worker. asyncio solo guarda una referencia débil a cada tarea:
+# sin este set el GC puede descartarlas a mitad de camino. Se cancelan al apagar.
+tareas_fondo: set = set()
+
+def lanzar_tarea_fondo(corrutina) -> asyncio.Task:
+    tarea = asyncio.create_task(corrutina)
+    tareas_fondo.add(tarea)
+    tarea.add_done_callback(tareas_fondo.discard)
+    return tarea
+
 # Start loop on startup (only in development by default)
 @app.on_event("startup")
 async def startup_event():
     logger.info("Iniciando Ganbatte API (ENV=%s)", ENV)
+    # El precalentamiento corre en background: /health/live responde enseguida y
+    # /health/ready recién da 200 cuando terminó.
+    lanzar_tarea_fondo(precalentar())
+    if supabase is not None and ALERTAS_INTERVALO_S > 0:
+        lanzar_tarea_fondo(barrido_alertas_loop())
+    if supabase is not None and TRACKING_INGESTA_INTERVALO_S > 0:
+        lanzar_tarea_fondo(ingesta_tracking_loop())
      # if ENV == "development":
     #     # Start background loop
     #     asyncio.create_task(verificar_vencimientos_loop(300))
     #     logger.info("Scheduler de verificación lanzado (cada 5 minutos).")
 
+@app.on_event("shutdown")
+async def detener_tareas_fondo():
+    for tarea in list(tareas_fondo):
+        tarea.cancel()
+    await asyncio.gather(*tareas_fondo, return_exceptions=True)
+
+# -----------------------
+# Tarifas: gastos locales marítimos en memoria
+# -----------------------
+# Es una tabla chica (tipo de operación x línea x equipo) que solo se edita desde Supabase.
+# Se carga entera y las consultas por (tipo_operacion, linea_maritima, equipo) no van a la DB.
+GASTOS_LOCALES_TTL = int(os.getenv("GASTOS_LOCALES_TTL", "600"))  # segundos
+GASTOS_LOCALES_PAGINA = 1000
+
+class TablaGastosLocales:
+    def __init__(self, filas: List[Dict[str, Any]]):
+        self.filas = filas
+        self.creado = time.monotonic()
+        self._por_clave: Dict[tuple, List[Dict[str, Any]]] = {}
+        for fila in filas:
+            clave = (fila.get("tipo_operacion"), fila.get("linea_maritima"), fila.get("equipo"))
+            self._por_clave.setdefault(clave, []).append(fila)
+
+    def vencida(self) -> bool:
+        return time.monotonic() - self.creado > GASTOS_LOCALES_TTL
+
+    def buscar(self, tipo_operacion: str, linea_maritima: str, equipo: str) -> List[Dict[str, Any]]:
+        """Mismas filas que los .eq() sobre las tres columnas."""
+        return list(self._por_clave.get((tipo_operacion, linea_maritima, equipo), []))
+
+_tabla_gastos_locales: Optional[TablaGastosLocales] = None
+_tabla_gastos_locales_lock = threading.Lock()
+
+def obtener_tabla_gastos_locales() -> TablaGastosLocales:
+    """Devuelve la tabla de tarifas, recargándola desde la DB cuando vence el TTL."""
+    global _tabla_gastos_locales
+    tabla = _tabla_gastos_locales
+    if tabla is not None and not tabla.vencida():
+        return tabla
+
+    with _tabla_gastos_locales_lock:
+        if _tabla_gastos_locales is None or _tabla_gastos_locales.vencida():
+            filas: List[Dict[str, Any]] = []
+            while True:
+                pagina = supabase.table("gastos_locales_maritimos").select("*").order("id") \
+                    .range(len(filas), len(filas) + GASTOS_LOCALES_PAGINA).execute().data or []
+                filas.extend(pagina)
+                if len(pagina) < GASTOS_LOCALES_PAGINA:
+                    break
+            _tabla_gastos_locales = TablaGastosLocales(filas)
+            logger.info("Tabla de gastos locales cargada: %s filas", len(filas))
+        return _tabla_gastos_locales
+
+# -----------------------
+# Arranque: precalentamiento y readiness
+# -----------------------
+# Al arrancar un worker se abre la conexión a Supabase (cliente PostgREST, TLS, keep-alive),
+# se cargan catálogos y tarifas y se piden las tasas de cambio, para que el primer request
+# real no pague todo eso. /health/ready da 503 hasta que terminan los pasos obligatorios;
+# el balanceador solo debe mandar tráfico a workers listos. /health/live no toca la DB.
+WARMUP_CONEXIONES = int(os.getenv("WARMUP_CONEXIONES", "4"))
+WARMUP_REINTENTO_S = float(os.getenv("WARMUP_REINTENTO_S", "5"))
+
+estado_arranque: Dict[str, Any] = {"listo": False, "inicio": time.time(), "listo_en_s": None, "intentos": 0, "pasos": {}}
+
+async def _calentar_conexiones() -> Dict[str, Any]:
+    # Consultas en paralelo: dejan varias conexiones abiertas en el pool del cliente
+    def consulta():
+        return supabase.table("cotizaciones").select("id").limit(1).execute()
+    await asyncio.gather(*(asyncio.to_thread(consulta) for _ in range(WARMUP_CONEXIONES)))
+    return {"conexiones": WARMUP_CONEXIONES}
+
+def _cargar_catalogos() -> Dict[str, Any]:
+    lineas = cache_precomprimido.obtener(
+        "lineas-maritimas", lambda: json_bytes(cargar_lineas_maritimas()), ttl=CATALOGOS_TTL
+    )
+    aerolineas = cache_precomprimido.obtener("aerolineas", lambda: json_bytes(cargar_aerolineas()), ttl=CATALOGOS_TTL)
+    indice = obtener_indice_puertos()
+    return {
+        "lineas_maritimas_bytes": len(lineas.cuerpos["identity"]),
+        "aerolineas_bytes": len(aerolineas.cuerpos["identity"]),
+        "puertos": len(indice.registros),
+    }
+
+def _cargar_tarifas() -> Dict[str, Any]:
+    return {"filas": len(obtener_tabla_gastos_locales().filas)}
+
+async def _paso_arranque(nombre: str, paso: Callable[[], Any], obligatorio: bool = True) -> bool:
+    """Ejecuta un paso del precalentamiento y deja el resultado en estado_arranque."""
+    inicio = time.perf_counter()
+    try:
+        resultado = await paso() if asyncio.iscoroutinefunction(paso) else await asyncio.to_thread(paso)
+        estado_arranque["pasos"][nombre] = {"ok": True, "ms": round((time.perf_counter() - inicio) * 1000, 1), "detalle": resultado}
+        return True
+    except Exception as e:
+        logger.warning("⚠️ Precalentamiento: falló '%s': %s", nombre, e)
+        estado_arranque["pasos"][nombre] = {
+            "ok": False, "ms": round((time.perf_counter() - inicio) * 1000, 1),
+            "error": str(e), "obligatorio": obligatorio,
+        }
+        return not obligatorio
+
+async def _primar_tasas_cambio() -> Dict[str, Any]:
+    tasas = await obtener_tasas_cambio_cacheadas()
+    return {"fuente": tasas["fuente"]}
+
+async def precalentar():
+    """Pasos obligatorios hasta que salgan todos bien (reintentando); las tasas tienen fallback y no bloquean."""
+    if supabase is None:
+        estado_arranque.update(listo=True, listo_en_s=0.0, pasos={"supabase": {"ok": True, "detalle": "no configurado"}})
+        return
+    while True:
+        estado_arranque["intentos"] += 1
+        # Primero la conexión: el resto la reutiliza
+        ok = await _paso_arranque("conexiones", _calentar_conexiones)
+        if ok:
+            resultados = await asyncio.gather(
+                _paso_arranque("catalogos", _cargar_catalogos),
+                _paso_arranque("tarifas", _cargar_tarifas),
+                _paso_arranque("tasas_cambio", _primar_tasas_cambio, obligatorio=False),
+            )
+            ok = all(resultados)
+        if ok:
+            estado_arranque["listo"] = True
+            estado_arranque["listo_en_s"] = round(time.time() - estado_arranque["inicio"], 2)
+            logger.info("🔥 Worker listo en %ss (%s)", estado_arranque["listo_en_s"],
+                        ", ".join(f"{n} {p.get('ms')}ms" for n, p in estado_arranque["pasos"].items()))
+            return
+        await asyncio.sleep(WARMUP_REINTENTO_S)
+
+@app.get("/health/live")
+def health_live():
+    """Liveness: el proceso responde. No consulta la DB."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def health_ready():
+    """Readiness: 200 cuando el precalentamiento terminó, 503 mientras tanto."""
+    cuerpo = {
+        "status": "ready" if estado_arranque["listo"] else "warming_up",
+        "intentos": estado_arranque["intentos"],
+        "listo_en_s": estado_arranque["listo_en_s"],
+        "pasos": estado_arranque["pasos"],
+    }
+    return JSONResponse(status_code=200 if estado_arranque["listo"] else 503, content=cuerpo)
+
 # -----------------------
 # Endpoints CORREGIDOS
 # -----------------------
@@ -1378,24 +2553,14 @@ async def startup_event():
 @app.get("/gastos_locales_maritimos_combinado/{tipo_operacion}/{linea_maritima}/{equipo}")
 async def get_gastos_locales_maritimos_combinado(tipo_operacion: str, linea_maritima: str, equipo: str):
     try:
+        tarifas = obtener_tabla_gastos_locales()
         # Costos de la línea real (ej: COSCO)
-        costos_resp = supabase.table("gastos_locales_maritimos") \
-            .select("*") \
-            .eq("tipo_operacion", tipo_operacion) \
-            .eq("linea_maritima", linea_maritima) \
-            .eq("equipo", equipo) \
-            .execute()
-        
+        costos_filas = tarifas.buscar(tipo_operacion, linea_maritima, equipo)
         # Venta (línea GANBATTE)
-        venta_resp = supabase.table("gastos_locales_maritimos") \
-            .select("*") \
-            .eq("tipo_operacion", tipo_operacion) \
-            .eq("linea_maritima", "GANBATTE") \
-            .eq("equipo", equipo) \
-            .execute()
-        
-        costos = costos_resp.data[0] if costos_resp.data else None
-        venta = venta_resp.data[0] if venta_resp.data else None
+        venta_filas = tarifas.buscar(tipo_operacion, "GANBATTE", equipo)
+
+        costos = costos_filas[0] if costos_filas else None
+        venta = venta_filas[0] if venta_filas else None
 
         if not costos:
             return JSONResponse(status_code=404, content={"message": "No se encontraron costos para la línea solicitada."})
@@ -1427,7 +2592,7 @@ async def crear_cliente(cliente: ClienteCreate):
                 raise HTTPException(status_code=400, detail="Ya existe un cliente con este email")
 
         # Preparar datos para inserción
-        cliente_data = cliente.dict()
+        cliente_data = cliente.model_dump()
         cliente_data.update({
             "id": str(uuid4()),
             "fecha_creacion": datetime.now().isoformat(),
@@ -1440,7 +2605,7 @@ async def crear_cliente(cliente: ClienteCreate):
         if not response.data:
             raise HTTPException(status_code=500, detail="Error al crear cliente")
 
-        logger.info(f"Cliente creado: {cliente_data['nombre']}")
+        logger.info("Cliente creado: %s", cliente_data['nombre'])
         return response.data[0]
 
     except HTTPException:
@@ -1477,6 +2642,50 @@ async def listar_clientes(activo: Optional[bool] = None, search: Optional[str] =
         logger.exception("Error listando clientes: %s", e)
         raise HTTPException(status_code=500, detail=f"Error al obtener clientes: {str(e)}")
 
+def formatear_resumen_cliente(fila: Optional[Dict[str, Any]], cliente_id: str) -> Dict[str, Any]:
+    """Convierte una fila de clientes_resumen en la respuesta del dashboard (con tasas calculadas)."""
+    fila = fila or {}
+    por_estado = fila.get("por_estado") or {}
+    total = fila.get("total_cotizaciones") or 0
+    aceptadas = por_estado.get("aceptada", 0)
+    cerradas = aceptadas + por_estado.get("rechazada", 0) + por_estado.get("vencida", 0)
+    return {
+        "cliente_id": cliente_id,
+        "nombre": (fila.get("clientes") or {}).get("nombre"),
+        "total_cotizaciones": total,
+        "por_estado": {estado: por_estado.get(estado, 0) for estado in ESTADOS_COTIZACION},
+        "tasa_aceptacion": round(aceptadas / total * 100, 1) if total else 0.0,
+        "tasa_exito_cerradas": round(aceptadas / cerradas * 100, 1) if cerradas else 0.0,
+        "valor_comercial_total": float(fila.get("valor_comercial_total") or 0),
+        "valor_comercial_aceptado": float(fila.get("valor_comercial_aceptado") or 0),
+        "margen_aceptado": float(fila.get("margen_aceptado") or 0),
+        "ultima_actividad": fila.get("ultima_actividad")
+    }
+
+@app.get("/clientes/resumen")
+async def listar_resumen_clientes(limit: int = 50, offset: int = 0):
+    """Resumen de todos los clientes para el dashboard, ordenado por última actividad."""
+    try:
+        if supabase is None:
+            raise HTTPException(status_code=503, detail="Base de datos no disponible")
+
+        limit = max(1, min(limit, 500))
+        offset = max(0, offset)
+        # Un solo parámetro order (postgrest-py agrega uno por llamada); clientes sin actividad al final
+        response = supabase.table("clientes_resumen") \
+            .select("*, clientes(nombre)") \
+            .order("ultima_actividad.desc.nullslast,cliente_id") \
+            .range(offset, offset + limit) \
+            .execute()
+
+        return [formatear_resumen_cliente(fila, fila["cliente_id"]) for fila in (response.data or [])]
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error listando resumen de clientes: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error al obtener resumen de clientes: {str(e)}")
+
 @app.get("/clientes/{cliente_id}")
 async def obtener_cliente(cliente_id: str):
     """Obtener un cliente específico por ID"""
@@ -1510,7 +2719,7 @@ async def actualizar_cliente(cliente_id: str, cliente_update: ClienteUpdate):
             raise HTTPException(status_code=404, detail="Cliente no encontrado")
 
         # Preparar datos para actualización
-        update_data = cliente_update.dict(exclude_unset=True)
+        update_data = cliente_update.model_dump(exclude_unset=True)
         update_data["fecha_actualizacion"] = datetime.now().isoformat()
 
         # Actualizar en la base de datos
@@ -1519,7 +2728,7 @@ async def actualizar_cliente(cliente_id: str, cliente_update: ClienteUpdate):
         if not response.data:
             raise HTTPException(status_code=500, detail="Error al actualizar cliente")
 
-        logger.info(f"Cliente actualizado: {cliente_id}")
+        logger.info("Cliente actualizado: %s", cliente_id)
         return response.data[0]
 
     except HTTPException:
@@ -1549,7 +2758,7 @@ async def desactivar_cliente(cliente_id: str):
         if not response.data:
             raise HTTPException(status_code=500, detail="Error al desactivar cliente")
 
-        logger.info(f"Cliente desactivado: {cliente_id}")
+        logger.info("Cliente desactivado: %s", cliente_id)
         return {"mensaje": "Cliente desactivado exitosamente"}
 
     except HTTPException:
@@ -1559,64 +2768,37 @@ async def desactivar_cliente(cliente_id: str):
         raise HTTPException(status_code=500, detail=f"Error desactivando cliente: {str(e)}")
 
 @app.get("/clientes/{cliente_id}/cotizaciones")
-async def obtener_cotizaciones_cliente(cliente_id: str):
-    """Obtener todas las cotizaciones de un cliente específico"""
+async def obtener_cotizaciones_cliente(cliente_id: str, limit: int = 50, offset: int = 0):
+    """
+    Obtener las cotizaciones de un cliente (paginadas, más recientes primero).
+    Una sola consulta: el cliente con sus cotizaciones embebidas vía cotizaciones.cliente_id.
+    """
     try:
         if supabase is None:
             raise HTTPException(status_code=503, detail="Base de datos no disponible")
 
-        # Verificar que el cliente existe
-        cliente = supabase.table("clientes").select("*").eq("id", cliente_id).execute()
-        if not cliente.data:
+        limit = max(1, min(limit, 500))
+        offset = max(0, offset)
+
+        query = supabase.table("clientes") \
+            .select("id, nombre, cotizaciones(*)") \
+            .eq("id", cliente_id) \
+            .order("fecha_creacion", desc=True, foreign_table="cotizaciones") \
+            .limit(limit, foreign_table="cotizaciones")
+        if offset:
+            # postgrest-py no expone offset sobre tablas embebidas; PostgREST lo acepta como parámetro
+            query.params = query.params.add("cotizaciones.offset", offset)
+
+        response = query.execute()
+        if not response.data:
             raise HTTPException(status_code=404, detail="Cliente no encontrado")
 
-        # Obtener cotizaciones del cliente (buscando por nombre del cliente)
-        cliente_nombre = cliente.data[0]["nombre"]
-        response = supabase.table("cotizaciones").select("*").eq("cliente", cliente_nombre).order("fecha_creacion", desc=True).execute()
-        
-        # Procesar cotizaciones para incluir información de estado
         cotizaciones_procesadas = []
-        for cot in (response.data or []):
+        for cot in (response.data[0].get("cotizaciones") or []):
             try:
-                cot_data = cot.copy()
-                
-                # Usar codigo legible si existe
-                if cot_data.get('codigo_legible'):
-                    cot_data['codigo'] = cot_data['codigo_legible']
-                else:
-                    # fallback retroactivo
-                    tipo_op = cot_data.get('tipo_operacion', 'XX')
-                    prefijo = {
-                        'IA': 'GAN-IA', 'IM': 'GAN-IM', 'EA': 'GAN-EA',
-                        'EM': 'GAN-EM', 'IT': 'GAN-IT', 'ET': 'GAN-ET','MC': 'GAN-MC', 'CO': 'GAN-CO'
-                    }.get(tipo_op, 'GAN-XX')
-                    fecha = cot_data.get('fecha_creacion', datetime.now())
-                    if isinstance(fecha, str):
-                        try:
-                            fecha = datetime.fromisoformat(fecha.replace('Z', '+00:00'))
-                        except Exception:
-                            fecha = datetime.now()
-                    año = fecha.strftime("%y")
-                    mes = fecha.strftime("%m")
-                    cot_data['codigo'] = f"{prefijo}-{año}/{mes}/R01"
-
-                # Calcular estado
-                estado_actual_db = cot_data.get('estado')
-                estado_info = calcular_estado_y_validez(
-                    cot_data.get('fecha_validez'), 
-                    cot_data.get('validez_dias', 30),
-                    estado_actual_db
-                )
-                
-                cot_data['estado_actual'] = estado_info['estado']
-                cot_data['color'] = estado_info['color']
-                cot_data['dias_restantes'] = estado_info['dias_restantes']
-                cot_data['label_estado'] = ESTADOS_COTIZACION.get(estado_info['estado'], {'label': '🔵 ENVIADA'})['label']
-                
-                cotizaciones_procesadas.append(cot_data)
-                
+                cotizaciones_procesadas.append(procesar_cotizacion_listado(cot))
             except Exception as e:
-                logger.error(f"Error procesando cotización {cot.get('id')}: {e}")
+                logger.error("Error procesando cotización %s: %s", cot.get('id'), e)
                 continue
 
         return cotizaciones_procesadas
@@ -1627,6 +2809,39 @@ async def obtener_cotizaciones_cliente(cliente_id: str):
         logger.exception("Error obteniendo cotizaciones del cliente: %s", e)
         raise HTTPException(status_code=500, detail=f"Error al obtener cotizaciones del cliente: {str(e)}")
 
+@app.get("/clientes/{cliente_id}/resumen")
+async def obtener_resumen_cliente(cliente_id: str):
+    """
+    Conteos por estado, tasas, valor comercial, margen aceptado y última actividad de un cliente.
+    Lee la fila precalculada de clientes_resumen (mantenida por triggers, ver migrations/002).
+    """
+    try:
+        if supabase is None:
+            raise HTTPException(status_code=503, detail="Base de datos no disponible")
+
+        response = supabase.table("clientes") \
+            .select("id, nombre, clientes_resumen(*)") \
+            .eq("id", cliente_id) \
+            .execute()
+        if not response.data:
+            raise HTTPException(status_code=404, detail="Cliente no encontrado")
+
+        cliente = response.data[0]
+        resumen = cliente.get("clientes_resumen")
+        # Relación uno a uno: según la versión de PostgREST llega como objeto o como lista
+        if isinstance(resumen, list):
+            resumen = resumen[0] if resumen else None
+
+        respuesta = formatear_resumen_cliente(resumen, cliente_id)
+        respuesta["nombre"] = cliente.get("nombre")
+        return respuesta
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error obteniendo resumen del cliente: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error al obtener resumen del cliente: {str(e)}")
+
 # --- FUNCIÓN DE UTILIDAD ---
 # Asegúrese de definir esta función antes del endpoint get_costos_fcl_locales
 def map_to_concepts(data: Dict[str, Any], is_costo: bool, tipo_operacion: str) -> List[Dict[str, Any]]:
@@ -1688,36 +2903,28 @@ def get_costos_maritimos_fcl_locales(tipo_operacion: str, equipo: str, linea_mar
     equipo = equipo.upper()
     linea_maritima = linea_maritima.upper()
 
+    tarifas = obtener_tabla_gastos_locales()
+
     # COSTOS base
-    response_costos = supabase.table("gastos_locales_maritimos").select("*") \
-        .eq("tipo_operacion", tipo_operacion) \
-        .eq("equipo", equipo) \
-        .eq("linea_maritima", linea_maritima) \
-        .execute()
-    costos_base = response_costos.data or []
+    costos_base = tarifas.buscar(tipo_operacion, linea_maritima, equipo)
 
     # VENTAS base (GANBATTE)
-    response_ventas = supabase.table("gastos_locales_maritimos").select("*") \
-        .eq("tipo_operacion", tipo_operacion) \
-        .eq("equipo", equipo) \
-        .eq("linea_maritima", "GANBATTE") \
-        .execute()
-    ventas_base = response_ventas.data or []
+    ventas_base = tarifas.buscar(tipo_operacion, "GANBATTE", equipo)
 
     return {"costos_base": costos_base, "ventas_base": ventas_base}
 
-@app.post("/costos_personalizados/guardar")
-async def guardar_costos_personalizados(solicitud: dict):
+@app.post("/costos_personalizados/guardar", response_model=RespuestaGuardarCostos)
+async def guardar_costos_personalizados(solicitud: SolicitudGuardarCostos):
     """Guarda o actualiza costos personalizados para una cotización."""
     if supabase is None:
         raise HTTPException(status_code=503, detail="Base de datos no disponible.")
 
     try:
-        codigo_cotizacion = solicitud.get("codigo_cotizacion")
-        costos = solicitud.get("costos", [])
+        codigo_cotizacion = solicitud.codigo_cotizacion
+        costos = solicitud.costos
         
-        print(f"💾 [GUARDAR_COSTOS] INICIANDO - Código: {codigo_cotizacion}")
-        print(f"📦 [GUARDAR_COSTOS] Costos a guardar: {len(costos)}")
+        logger_costos.debug("💾 [GUARDAR_COSTOS] INICIANDO - Código: %s", codigo_cotizacion)
+        logger_costos.debug("📦 [GUARDAR_COSTOS] Costos a guardar: %s", len(costos))
         
         if not codigo_cotizacion:
             raise HTTPException(status_code=400, detail="Código de cotización requerido")
@@ -1726,24 +2933,24 @@ async def guardar_costos_personalizados(solicitud: dict):
             raise HTTPException(status_code=400, detail="Lista de costos vacía")
 
         # 1. VERIFICAR CONEXIÓN A LA BD
-        print("🔍 [GUARDAR_COSTOS] Verificando conexión a Supabase...")
+        logger_costos.debug("🔍 [GUARDAR_COSTOS] Verificando conexión a Supabase...")
         try:
             test_response = supabase.table("costos_cotizacion").select("count", count="exact").limit(1).execute()
-            print(f"✅ [GUARDAR_COSTOS] Conexión OK. Tabla existe.")
+            logger_costos.debug("✅ [GUARDAR_COSTOS] Conexión OK. Tabla existe.")
         except Exception as e:
-            print(f"❌ [GUARDAR_COSTOS] Error conectando a BD: {e}")
+            logger_costos.error("❌ [GUARDAR_COSTOS] Error conectando a BD: %s", e)
             raise
 
         # 2. ELIMINAR COSTOS EXISTENTES
-        print("🗑️ [GUARDAR_COSTOS] Eliminando costos existentes...")
+        logger_costos.debug("🗑️ [GUARDAR_COSTOS] Eliminando costos existentes...")
         try:
             delete_response = supabase.table("costos_cotizacion").delete().eq(
                 "codigo_cotizacion", codigo_cotizacion
             ).execute()
             deleted_count = len(delete_response.data) if delete_response.data else 0
-            print(f"✅ [GUARDAR_COSTOS] Costos eliminados: {deleted_count}")
+            logger_costos.debug("✅ [GUARDAR_COSTOS] Costos eliminados: %s", deleted_count)
         except Exception as e:
-            print(f"❌ [GUARDAR_COSTOS] Error eliminando costos: {e}")
+            logger_costos.error("❌ [GUARDAR_COSTOS] Error eliminando costos: %s", e)
             # Continuar de todos modos
 
         # 3. PREPARAR DATOS PARA INSERTAR
@@ -1751,67 +2958,69 @@ async def guardar_costos_personalizados(solicitud: dict):
         for i, costo in enumerate(costos):
             costo_data = {
                 "codigo_cotizacion": codigo_cotizacion,
-                "concepto": costo.get("concepto", f"Concepto {i+1}"),
-                "costo": float(costo.get("costo", 0)),
-                "venta": float(costo.get("venta", 0)),
-                "es_predefinido": bool(costo.get("es_predefinido", False)),
-                "tipo": costo.get("tipo", "Otro"),
-                "detalles": costo.get("detalles", {}),
+                "concepto": costo.concepto or f"Concepto {i+1}",
+                "costo": costo.costo,
+                "venta": costo.venta,
+                "es_predefinido": costo.es_predefinido,
+                "tipo": costo.tipo or "Otro",
+                "detalles": costo.detalles or {},
                 "fecha_creacion": datetime.now().isoformat()
             }
             costos_con_fecha.append(costo_data)
 
         # 4. INSERTAR NUEVOS COSTOS
-        print(f"💾 [GUARDAR_COSTOS] Insertando {len(costos_con_fecha)} costos...")
+        logger_costos.debug("💾 [GUARDAR_COSTOS] Insertando %s costos...", len(costos_con_fecha))
         try:
             insert_response = supabase.table("costos_cotizacion").insert(costos_con_fecha).execute()
             
             if hasattr(insert_response, 'data') and insert_response.data:
                 inserted_count = len(insert_response.data)
-                print(f"✅ [GUARDAR_COSTOS] INSERT EXITOSO: {inserted_count} costos insertados")
+                logger_costos.info("✅ [GUARDAR_COSTOS] INSERT EXITOSO: %s costos insertados", inserted_count)
                 
                 # Mostrar los IDs generados
-                for i, costo in enumerate(insert_response.data):
-                    print(f"   📝 [{i+1}] ID: {costo.get('id')} - {costo.get('concepto')}")
+                if logger_costos.isEnabledFor(logging.DEBUG):
+                    for i, costo in enumerate(insert_response.data):
+                        logger_costos.debug("   📝 [%s] ID: %s - %s", i + 1, costo.get('id'), costo.get('concepto'))
             else:
-                print(f"❌ [GUARDAR_COSTOS] INSERT FALLIDO. Respuesta: {insert_response}")
+                logger_costos.error("❌ [GUARDAR_COSTOS] INSERT FALLIDO para %s", codigo_cotizacion)
                 return {"mensaje": "No se pudieron insertar los costos", "count": 0}
                 
         except Exception as e:
-            print(f"❌ [GUARDAR_COSTOS] Error en INSERT: {e}")
+            logger_costos.error("❌ [GUARDAR_COSTOS] Error en INSERT: %s", e)
             raise
 
         # 5. VERIFICACIÓN INMEDIATA
-        print("🔍 [GUARDAR_COSTOS] Verificación INMEDIATA en BD...")
+        logger_costos.debug("🔍 [GUARDAR_COSTOS] Verificación INMEDIATA en BD...")
         try:
             verify_response = supabase.table("costos_cotizacion").select("*").eq(
                 "codigo_cotizacion", codigo_cotizacion
             ).execute()
             
             verified_count = len(verify_response.data) if verify_response.data else 0
-            print(f"📊 [GUARDAR_COSTOS] Verificación: {verified_count} costos en BD")
+            logger_costos.debug("📊 [GUARDAR_COSTOS] Verificación: %s costos en BD", verified_count)
             
             if verified_count > 0:
-                for i, costo in enumerate(verify_response.data):
-                    print(f"   ✅ [{i+1}] {costo.get('concepto')} - ID: {costo.get('id')}")
+                if logger_costos.isEnabledFor(logging.DEBUG):
+                    for i, costo in enumerate(verify_response.data):
+                        logger_costos.debug("   ✅ [%s] %s - ID: %s", i + 1, costo.get('concepto'), costo.get('id'))
             else:
-                print("❌ [GUARDAR_COSTOS] VERIFICACIÓN FALLIDA: No hay costos en BD")
+                logger_costos.warning("❌ [GUARDAR_COSTOS] VERIFICACIÓN FALLIDA: No hay costos en BD")
                 
         except Exception as e:
-            print(f"❌ [GUARDAR_COSTOS] Error en verificación: {e}")
+            logger_costos.error("❌ [GUARDAR_COSTOS] Error en verificación: %s", e)
 
         # 6. VERIFICACIÓN FINAL CON COUNT
-        print("🔍 [GUARDAR_COSTOS] Verificación FINAL con COUNT...")
+        logger_costos.debug("🔍 [GUARDAR_COSTOS] Verificación FINAL con COUNT...")
         try:
             count_response = supabase.table("costos_cotizacion").select("id", count="exact").eq(
                 "codigo_cotizacion", codigo_cotizacion
             ).execute()
             
             final_count = count_response.count if hasattr(count_response, 'count') else 0
-            print(f"🎯 [GUARDAR_COSTOS] COUNT FINAL: {final_count} costos")
+            logger_costos.debug("🎯 [GUARDAR_COSTOS] COUNT FINAL: %s costos", final_count)
             
         except Exception as e:
-            print(f"❌ [GUARDAR_COSTOS] Error en COUNT: {e}")
+            logger_costos.error("❌ [GUARDAR_COSTOS] Error en COUNT: %s", e)
             final_count = 0
 
         return {
@@ -1823,9 +3032,7 @@ async def guardar_costos_personalizados(solicitud: dict):
         }
         
     except Exception as e:
-        print(f"❌ [GUARDAR_COSTOS] ERROR GENERAL: {e}")
-        import traceback
-        print(f"🔍 [GUARDAR_COSTOS] Stack trace: {traceback.format_exc()}")
+        logger_costos.exception("❌ [GUARDAR_COSTOS] ERROR GENERAL: %s", e)
         raise HTTPException(status_code=500, detail=f"Error al guardar costos: {str(e)}")
 
 @app.get("/costos_personalizados/{codigo_cotizacion:path}") # <--- ¡CAMBIO AQUÍ!
@@ -1843,22 +3050,22 @@ async def get_costos_personalizados(codigo_cotizacion: str):
         if '%2F' in codigo_decodificado:
             codigo_decodificado = unquote(codigo_decodificado)
             
-        print(f"🔍 [COSTOS_PERSONALIZADOS] Código recibido: '{codigo_cotizacion}'")
-        print(f"🔍 [COSTOS_PERSONALIZADOS] Código decodificado: '{codigo_decodificado}'")
+        logger_costos.debug("🔍 [COSTOS_PERSONALIZADOS] Código recibido: '%s'", codigo_cotizacion)
+        logger_costos.debug("🔍 [COSTOS_PERSONALIZADOS] Código decodificado: '%s'", codigo_decodificado)
         
         # Buscar en la base de datos con el código decodificado
         response = supabase.table("costos_cotizacion").select("*").eq(
             "codigo_cotizacion", codigo_decodificado
         ).order("fecha_creacion", desc=False).execute()
 
-        print(f"📊 [COSTOS_PERSONALIZADOS] Resultados de la consulta: {len(response.data)}")
+        logger_costos.debug("📊 [COSTOS_PERSONALIZADOS] Resultados de la consulta: %s", len(response.data))
         
         if not response.data:
-            print(f"❌ [COSTOS_PERSONALIZADOS] No se encontraron costos para: {codigo_decodificado}")
+            logger_costos.warning("❌ [COSTOS_PERSONALIZADOS] No se encontraron costos para: %s", codigo_decodificado)
             # En lugar de 404, devolver array vacío
             return []
         
-        print(f"✅ [COSTOS_PERSONALIZADOS] Costos encontrados: {len(response.data)}")
+        logger_costos.debug("✅ [COSTOS_PERSONALIZADOS] Costos encontrados: %s", len(response.data))
         
         # Formatear los datos para el frontend
         costos_formateados = [
@@ -1873,7 +3080,7 @@ async def get_costos_personalizados(codigo_cotizacion: str):
         return costos_formateados
         
     except Exception as e:
-        print(f"❌ [COSTOS_PERSONALIZADOS] Error: {e}")
+        logger_costos.error("❌ [COSTOS_PERSONALIZADOS] Error: %s", e)
         # En caso de error, devolver array vacío
         return []
     
@@ -1881,8 +3088,33 @@ async def get_costos_personalizados(codigo_cotizacion: str):
 # Endpoints para Costos (CORREGIDOS - solo GET)
 # -----------------------
 
+# Las tasas se guardan en memoria: la API externa tarda cientos de ms y el frontend las pide
+# en cada cotización. Un fallback (API caída) se guarda poco tiempo para reintentar pronto.
+TASAS_CAMBIO_TTL = int(os.getenv("TASAS_CAMBIO_TTL", "1800"))  # segundos
+TASAS_CAMBIO_TTL_FALLBACK = 60
+_tasas_cambio: Optional[Dict[str, Any]] = None
+_tasas_cambio_vence = 0.0
+_tasas_cambio_lock = asyncio.Lock()
+
+async def obtener_tasas_cambio_cacheadas() -> Dict[str, Any]:
+    global _tasas_cambio, _tasas_cambio_vence
+    if _tasas_cambio is not None and time.monotonic() < _tasas_cambio_vence:
+        return _tasas_cambio
+    async with _tasas_cambio_lock:
+        if _tasas_cambio is None or time.monotonic() >= _tasas_cambio_vence:
+            tasas = await consultar_tasas_cambio()
+            ttl = TASAS_CAMBIO_TTL if tasas["fuente"] == "Frankfurter API" else TASAS_CAMBIO_TTL_FALLBACK
+            _tasas_cambio, _tasas_cambio_vence = tasas, time.monotonic() + ttl
+        return _tasas_cambio
+
 @app.get("/tasas_cambio")
 async def obtener_tasas_cambio():
+    """
+    Obtener tasas de cambio actualizadas (cacheadas TASAS_CAMBIO_TTL segundos)
+    """
+    return await obtener_tasas_cambio_cacheadas()
+
+async def consultar_tasas_cambio() -> Dict[str, Any]:
     """
     Obtener tasas de cambio actualizadas desde una API externa
     """
@@ -1946,7 +3178,7 @@ async def get_costos_predefinidos(
 ):
     """Obtener costos predefinidos según tipo de operación e incoterm (GET)"""
     try:
-        logger.info(f"📦 Solicitando costos predefinidos: {tipo_operacion}, {incoterm}, {modo_transporte}")
+        logger.info("📦 Solicitando costos predefinidos: %s, %s, %s", tipo_operacion, incoterm, modo_transporte)
         
         # Datos de ejemplo - reemplaza con tu lógica real
         conceptos_ejemplo = []
@@ -2015,7 +3247,7 @@ async def get_costos_predefinidos(
                 }
             ]
         
-        logger.info(f"✅ Retornando {len(conceptos_ejemplo)} conceptos predefinidos")
+        logger.info("✅ Retornando %s conceptos predefinidos", len(conceptos_ejemplo))
         return conceptos_ejemplo
         
     except Exception as e:
@@ -2026,13 +3258,13 @@ async def get_costos_predefinidos(
 async def get_costos_ganbatte(tipo_operacion: str, equipo: str):
     """Obtener costos de Ganbatte como referencia para Marítima FCL (GET)"""
     try:
-        logger.info(f"📦 Solicitando costos Ganbatte: {tipo_operacion}, {equipo}")
+        logger.info("📦 Solicitando costos Ganbatte: %s, %s", tipo_operacion, equipo)
         
         # Mapear tipos de operación a los valores de la BD
         
         tipo_op_bd = op_map.get(tipo_operacion)
         if not tipo_op_bd:
-            logger.warning(f"Tipo de operación no válido para costos marítimos: {tipo_operacion}")
+            logger.warning("Tipo de operación no válido para costos marítimos: %s", tipo_operacion)
             return {
                 "thc": 0, "toll": 0, "gate": 0, "delivery_order": 0, "ccf": 0,
                 "handling": 0, "logistic_fee": 0, "bl_fee": 0, "ingreso_sim": 0,
@@ -2048,16 +3280,11 @@ async def get_costos_ganbatte(tipo_operacion: str, equipo: str):
                 "cert_flete": 40, "cert_fob": 35, "total_locales": 1150
             }
 
-        # Consultar costos de Ganbatte en la BD
-        response = supabase.table("gastos_locales_maritimos")\
-            .select("*")\
-            .eq("linea_maritima", "GANBATTE")\
-            .eq("tipo_operacion", tipo_op_bd)\
-            .eq("equipo", equipo)\
-            .execute()
+        # Costos de Ganbatte (tabla de tarifas en memoria)
+        filas = obtener_tabla_gastos_locales().buscar(tipo_op_bd, "GANBATTE", equipo)
 
-        if not response.data:
-            logger.warning(f"No se encontraron costos Ganbatte para {tipo_op_bd}/{equipo}")
+        if not filas:
+            logger.warning("No se encontraron costos Ganbatte para %s/%s", tipo_op_bd, equipo)
             return {
                 "thc": 0, "toll": 0, "gate": 0, "delivery_order": 0, "ccf": 0,
                 "handling": 0, "logistic_fee": 0, "bl_fee": 0, "ingreso_sim": 0,
@@ -2065,8 +3292,8 @@ async def get_costos_ganbatte(tipo_operacion: str, equipo: str):
             }
 
         # Retornar el primer resultado (debería ser único)
-        costo_ganbatte = response.data[0]
-        logger.info(f"✅ Costos Ganbatte encontrados: {len(costo_ganbatte)} campos")
+        costo_ganbatte = filas[0]
+        logger.info("✅ Costos Ganbatte encontrados: %s campos", len(costo_ganbatte))
         
         return {
             "thc": costo_ganbatte.get("thc", 0),
@@ -2089,6 +3316,228 @@ async def get_costos_ganbatte(tipo_operacion: str, equipo: str):
     
 # Agregar estos endpoints a tu FastAPI
 
+# -----------------------
+# IA: motor de reglas de operaciones
+# -----------------------
+# Las reglas de alertas, tareas e incoterms se declaran como datos (REGLAS_OPERACION) y se
+# compilan una sola vez, al importar el módulo, a funciones sobre un ContextoOperacion: los
+# campos ya completados desde la cotización origen y las fechas ya parseadas. Cada operación
+# se evalúa en una pasada y el mismo motor sirve para evaluar la cartera completa.
+
+# Campos que analiza /ia/datos-faltantes. "cotizacion": se completa desde la cotización origen.
+CAMPOS_CRITICOS_OPERACION = {
+    'etd': {'nombre': 'ETD (Estimated Time of Departure)', 'tipo': 'date', 'critico': True},
+    'eta': {'nombre': 'ETA (Estimated Time of Arrival)', 'tipo': 'date', 'critico': True},
+    'fecha_carga': {'nombre': 'Fecha efectiva de carga', 'tipo': 'date', 'critico': True},
+    'fecha_descarga': {'nombre': 'Fecha efectiva de descarga', 'tipo': 'date'},
+    'equipo': {'nombre': 'Equipo/Contenedor', 'tipo': 'text', 'cotizacion': True},
+    'origen': {'nombre': 'Origen', 'tipo': 'text', 'cotizacion': True, 'critico': True},
+    'destino': {'nombre': 'Destino', 'tipo': 'text', 'cotizacion': True, 'critico': True},
+    'volumen_m3': {'nombre': 'Volumen (m³)', 'tipo': 'number', 'cotizacion': True},
+    'peso_total_kg': {'nombre': 'Peso total (kg)', 'tipo': 'number', 'cotizacion': True},
+    'incoterm_origen': {'nombre': 'Incoterm Origen', 'tipo': 'text', 'cotizacion': True},
+    'incoterm_destino': {'nombre': 'Incoterm Destino', 'tipo': 'text', 'cotizacion': True},
+}
+
+# Campos que usan las reglas sin ser parte del análisis de completitud
+CAMPOS_CONTEXTO_OPERACION = {
+    'modo_transporte': {'tipo': 'text', 'cotizacion': True},
+    'pickup_address': {'tipo': 'text', 'cotizacion': True},
+    'delivery_address': {'tipo': 'text', 'cotizacion': True},
+}
+
+CAMPOS_OPERACION = {**CAMPOS_CRITICOS_OPERACION, **CAMPOS_CONTEXTO_OPERACION}
+
+# Columnas de cotizaciones que hacen falta para evaluar (para no traer la fila entera en lote)
+COLUMNAS_COTIZACION_REGLAS = ",".join(
+    ["codigo_legible", "codigo_operacion"] + [c for c, info in CAMPOS_OPERACION.items() if info.get('cotizacion')]
+)
+
+# Incoterms que solo aplican a transporte marítimo / fluvial
+INCOTERMS_MARITIMOS = ["FAS", "FOB", "CFR", "CIF"]
+
+# tipo "faltante": dispara si falta alguno de "campos".
+# tipo "proximidad": dispara si la fecha "campo" está a "dias" días o menos (incluye vencidas).
+# tipo "incoterm": para los incoterms listados (origen o destino), exige un modo de transporte
+#   ("modos"), un campo cargado ("requiere"), o que coincida con la cotización ("igual_cotizacion").
+# "alerta" es el id con el que se muestra en /ia/alertas-proactivas; "tarea" la agrega a las tareas.
+REGLAS_OPERACION: List[Dict[str, Any]] = [
+    {"id": "fechas_criticas", "tipo": "faltante", "campos": ["etd", "eta"], "nivel": "critico", "alerta": 1,
+     "titulo": "Fechas críticas faltantes", "mensaje": "Complete ETD y ETA para habilitar seguimiento automático",
+     "accion": "Completar Fechas"},
+    {"id": "etd_proximo", "tipo": "proximidad", "campo": "etd", "dias": 2, "nivel": "advertencia", "alerta": 2,
+     "titulo": "ETD próximo", "mensaje": "ETD en {dias} día(s). Confirme documentación",
+     "accion": "Verificar Documentación"},
+    {"id": "incoterm_maritimo", "tipo": "incoterm", "incoterms": INCOTERMS_MARITIMOS,
+     "modos": ["Maritima FCL", "Maritima LCL"], "nivel": "advertencia", "alerta": 3,
+     "titulo": "Incoterm solo marítimo", "mensaje": "{incoterm} es un incoterm marítimo y la operación es {modo_transporte}",
+     "accion": "Revisar Incoterm"},
+    {"id": "exw_sin_retiro", "tipo": "incoterm", "incoterms": ["EXW"], "requiere": "pickup_address",
+     "nivel": "advertencia", "alerta": 4,
+     "titulo": "EXW sin dirección de retiro", "mensaje": "Con {incoterm} el retiro es en origen: cargue la dirección de pickup",
+     "accion": "Completar Pickup"},
+    {"id": "entrega_sin_direccion", "tipo": "incoterm", "incoterms": ["DAP", "DPU", "DDP"], "requiere": "delivery_address",
+     "nivel": "advertencia", "alerta": 5,
+     "titulo": "Entrega sin dirección", "mensaje": "Con {incoterm} la entrega es en destino: cargue la dirección de entrega",
+     "accion": "Completar Entrega"},
+    {"id": "incoterm_distinto_cotizacion", "tipo": "incoterm", "igual_cotizacion": True,
+     "nivel": "advertencia", "alerta": 6,
+     "titulo": "Incoterm distinto al cotizado", "mensaje": "La operación tiene {incoterm} y la cotización {incoterm_cotizacion}",
+     "accion": "Revisar Incoterm"},
+    {"id": "carga_sin_registrar", "tipo": "faltante", "campos": ["fecha_carga"], "nivel": "info",
+     "tarea": "Registrar fecha efectiva de carga"},
+    {"id": "descarga_sin_registrar", "tipo": "faltante", "campos": ["fecha_descarga"], "nivel": "info",
+     "tarea": "Registrar fecha efectiva de descarga"},
+    {"id": "etd_sin_confirmar", "tipo": "faltante", "campos": ["etd"], "nivel": "info",
+     "tarea": "Confirmar ETD con transportista"},
+    {"id": "eta_pendiente", "tipo": "faltante", "campos": ["eta"], "nivel": "info",
+     "tarea": "Estimación de ETA pendiente"},
+]
+
+PESO_NIVEL_REGLA = {"critico": 3, "advertencia": 1, "info": 0}
+ORDEN_RIESGO = {"Alto": 0, "Medio": 1, "Bajo": 2}
+
+def parsear_fecha_operacion(valor: Any) -> Optional[datetime]:
+    """Fecha ISO ("2025-01-31" o con hora y zona) como datetime sin zona; None si no se puede leer."""
+    if not valor:
+        return None
+    try:
+        return datetime.fromisoformat(str(valor).replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+class ContextoOperacion:
+    """Campos de una operación resueltos una vez: valor, de dónde salió y las fechas parseadas."""
+    __slots__ = ("valores", "fuentes", "fechas", "datos", "cotizacion", "ahora")
+
+    def __init__(self, datos: Dict[str, Any], cotizacion: Dict[str, Any], ahora: datetime):
+        self.datos = datos
+        self.cotizacion = cotizacion
+        self.ahora = ahora
+        self.valores: Dict[str, Any] = {}
+        self.fuentes: Dict[str, Optional[str]] = {}
+        self.fechas: Dict[str, Optional[datetime]] = {}
+        for campo, info in CAMPOS_OPERACION.items():
+            valor, fuente = datos.get(campo), "operacion"
+            if not valor and info.get('cotizacion'):
+                valor, fuente = cotizacion.get(campo), "cotizacion"
+            self.valores[campo] = valor
+            self.fuentes[campo] = fuente if valor else None
+            if info['tipo'] == 'date':
+                self.fechas[campo] = parsear_fecha_operacion(valor)
+
+def _hallazgo(regla: Dict[str, Any], **valores) -> Dict[str, Any]:
+    return {
+        "regla": regla["id"],
+        "tipo": regla["tipo"],
+        "nivel": regla["nivel"],
+        "titulo": regla.get("titulo"),
+        "mensaje": regla["mensaje"].format(**valores) if regla.get("mensaje") else None,
+        "accion": regla.get("accion"),
+        "alerta": regla.get("alerta"),
+        "tarea": regla.get("tarea"),
+    }
+
+def _compilar_faltante(regla: Dict[str, Any]) -> Callable[[ContextoOperacion], Optional[Dict[str, Any]]]:
+    campos = tuple(regla["campos"])
+    def evaluar(contexto: ContextoOperacion):
+        for campo in campos:
+            if not contexto.valores[campo]:
+                return _hallazgo(regla, campo=campo)
+        return None
+    return evaluar
+
+def _compilar_proximidad(regla: Dict[str, Any]) -> Callable[[ContextoOperacion], Optional[Dict[str, Any]]]:
+    campo, limite = regla["campo"], regla["dias"]
+    def evaluar(contexto: ContextoOperacion):
+        fecha = contexto.fechas.get(campo)
+        if fecha is None:
+            return None
+        dias = (fecha - contexto.ahora).days
+        return _hallazgo(regla, dias=dias) if dias <= limite else None
+    return evaluar
+
+def _compilar_incoterm(regla: Dict[str, Any]) -> Callable[[ContextoOperacion], Optional[Dict[str, Any]]]:
+    incoterms = frozenset(regla.get("incoterms") or INCOTERMS)
+    modos = frozenset(regla.get("modos") or ())
+    requiere = regla.get("requiere")
+    igual_cotizacion = regla.get("igual_cotizacion", False)
+    def evaluar(contexto: ContextoOperacion):
+        for campo in ("incoterm_origen", "incoterm_destino"):
+            incoterm = contexto.valores[campo]
+            if incoterm not in incoterms:
+                continue
+            if modos and contexto.valores["modo_transporte"] and contexto.valores["modo_transporte"] not in modos:
+                return _hallazgo(regla, incoterm=incoterm, modo_transporte=contexto.valores["modo_transporte"])
+            if requiere and not contexto.valores[requiere]:
+                return _hallazgo(regla, incoterm=incoterm)
+            if igual_cotizacion:
+                cotizado = contexto.cotizacion.get(campo)
+                if contexto.fuentes[campo] == "operacion" and cotizado and cotizado != incoterm:
+                    return _hallazgo(regla, incoterm=incoterm, incoterm_cotizacion=cotizado)
+        return None
+    return evaluar
+
+COMPILADORES_REGLAS = {
+    "faltante": _compilar_faltante,
+    "proximidad": _compilar_proximidad,
+    "incoterm": _compilar_incoterm,
+}
+
+class MotorReglas:
+    def __init__(self, definiciones: List[Dict[str, Any]]):
+        self.reglas = []
+        for regla in definiciones:
+            if regla["tipo"] not in COMPILADORES_REGLAS:
+                raise ValueError(f"Regla {regla['id']}: tipo desconocido {regla['tipo']!r}")
+            if regla["nivel"] not in PESO_NIVEL_REGLA:
+                raise ValueError(f"Regla {regla['id']}: nivel desconocido {regla['nivel']!r}")
+            desconocidos = {regla.get("campo"), regla.get("requiere"), *regla.get("campos", ())} - {None, *CAMPOS_OPERACION}
+            if desconocidos:
+                raise ValueError(f"Regla {regla['id']}: campos desconocidos {sorted(desconocidos)}")
+            self.reglas.append(COMPILADORES_REGLAS[regla["tipo"]](regla))
+
+    def evaluar(self, datos: Optional[Dict[str, Any]], cotizacion: Optional[Dict[str, Any]] = None,
+                ahora: Optional[datetime] = None) -> Dict[str, Any]:
+        """Todas las reglas sobre una operación: hallazgos, puntaje y riesgo (Alto/Medio/Bajo)."""
+        contexto = ContextoOperacion(datos or {}, cotizacion or {}, ahora or datetime.now())
+        hallazgos = []
+        for regla in self.reglas:
+            hallazgo = regla(contexto)
+            if hallazgo is not None:
+                hallazgos.append(hallazgo)
+        puntaje = sum(PESO_NIVEL_REGLA[h["nivel"]] for h in hallazgos)
+        riesgo = "Alto" if puntaje >= 3 else "Medio" if puntaje >= 1 else "Bajo"
+        return {"contexto": contexto, "hallazgos": hallazgos, "puntaje": puntaje, "riesgo": riesgo}
+
+motor_reglas = MotorReglas(REGLAS_OPERACION)
+
+def leer_cotizacion_origen(operacion: Dict[str, Any]) -> Dict[str, Any]:
+    """Fila de la cotización que originó la operación ({} si no tiene o no existe)."""
+    cotizacion_origen = operacion.get("cotizacion_origen")
+    if not cotizacion_origen:
+        return {}
+    cot_resp = supabase.table("cotizaciones").select("*").eq("codigo_legible", cotizacion_origen).limit(1).execute()
+    if not cot_resp.data:
+        logger.warning("⚠️ Cotización origen no encontrada: %s", cotizacion_origen)
+        return {}
+    return cot_resp.data[0]
+
+def generar_alertas_proactivas(evaluacion: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Alertas de /ia/alertas-proactivas a partir de la evaluación de reglas."""
+    ahora = datetime.now().isoformat()
+    return [
+        {
+            "id": h["alerta"],
+            "titulo": h["titulo"],
+            "mensaje": h["mensaje"],
+            "nivel": h["nivel"],
+            "timestamp": ahora,
+            "accion": h["accion"],
+        }
+        for h in evaluacion["hallazgos"] if h["alerta"] is not None
+    ]
+
 @app.get("/ia/alertas-proactivas/{codigo_operacion:path}")
 async def obtener_alertas_proactivas(codigo_operacion: str):
     """Genera alertas proactivas basadas en el estado de la operación"""
@@ -2099,55 +3548,655 @@ async def obtener_alertas_proactivas(codigo_operacion: str):
             return {"alertas": []}
         
         operacion = op_resp.data[0]
-        datos = operacion.get("datos_cotizacion", {})
-        
-        alertas = []
-        
-        # Alertas por datos faltantes críticos
-        if not datos.get('etd') or not datos.get('eta'):
-            alertas.append({
-                "id": 1,
-                "titulo": "Fechas críticas faltantes",
-                "mensaje": "Complete ETD y ETA para habilitar seguimiento automático",
-                "nivel": "critico",
-                "timestamp": datetime.now().isoformat(),
-                "accion": "Completar Fechas"
-            })
-        
-        # Alertas por proximidad de ETD
-        if datos.get('etd'):
-            etd = datetime.fromisoformat(datos['etd'].replace('Z', '+00:00'))
-            dias_hasta_etd = (etd - datetime.now()).days
-            if dias_hasta_etd <= 2:
-                alertas.append({
-                    "id": 2,
-                    "titulo": "ETD próximo",
-                    "mensaje": f"ETD en {dias_hasta_etd} día(s). Confirme documentación",
-                    "nivel": "advertencia",
-                    "timestamp": datetime.now().isoformat(),
-                    "accion": "Verificar Documentación"
-                })
-        
-        return {"alertas": alertas}
+        evaluacion = motor_reglas.evaluar(operacion.get("datos_cotizacion"), leer_cotizacion_origen(operacion))
+        return {"alertas": generar_alertas_proactivas(evaluacion)}
         
     except Exception as e:
-        logger.exception(f"Error generando alertas: {e}")
+        logger.exception("Error generando alertas: %s", e)
         return {"alertas": []}
 
+CARTERA_PAGINA = 1000
+CARTERA_LOTE_COTIZACIONES = 200
+
+def cargar_operaciones_abiertas() -> List[Dict[str, Any]]:
+    operaciones: List[Dict[str, Any]] = []
+    while True:
+        query = supabase.table("operaciones") \
+            .select("codigo_operacion,cliente,estado,cotizacion_origen,datos_cotizacion,fecha_actualizacion")
+        # Las operaciones cerradas (ESTADOS_OPERACION) no entran en la cartera. Sin estados de cierre no se
+        # filtra: not.in.() vacío no es válido y además descartaría las operaciones con estado NULL.
+        if ESTADOS_OPERACION_CERRADOS:
+            query = query.not_.in_("estado", ESTADOS_OPERACION_CERRADOS)
+        pagina = query.order("codigo_operacion") \
+            .range(len(operaciones), len(operaciones) + CARTERA_PAGINA) \
+            .execute().data or []
+        operaciones.extend(pagina)
+        if len(pagina) < CARTERA_PAGINA:
+            return operaciones
+
+def cargar_cotizaciones_origen(codigos: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Cotizaciones origen por codigo_legible, en lotes de IN (solo las columnas que usan las reglas)."""
+    codigos = sorted(set(filter(None, codigos)))
+    cotizaciones: Dict[str, Dict[str, Any]] = {}
+    for inicio in range(0, len(codigos), CARTERA_LOTE_COTIZACIONES):
+        lote = codigos[inicio:inicio + CARTERA_LOTE_COTIZACIONES]
+        for fila in supabase.table("cotizaciones").select(COLUMNAS_COTIZACION_REGLAS).in_("codigo_legible", lote).execute().data or []:
+            cotizaciones[fila["codigo_legible"]] = fila
+    return cotizaciones
+
+def evaluar_operacion_cartera(operacion: Dict[str, Any], cotizacion: Optional[Dict[str, Any]], ahora: datetime) -> Dict[str, Any]:
+    """Resultado de las reglas para una operación, sin el contexto (apto para JSON)."""
+    evaluacion = motor_reglas.evaluar(operacion.get("datos_cotizacion"), cotizacion, ahora)
+    return {
+        "codigo_operacion": operacion["codigo_operacion"],
+        "cliente": operacion.get("cliente"),
+        "estado": operacion.get("estado"),
+        "riesgo": evaluacion["riesgo"],
+        "puntaje": evaluacion["puntaje"],
+        "hallazgos": [h for h in evaluacion["hallazgos"] if h["nivel"] != "info"],
+        "tareas": [h["tarea"] for h in evaluacion["hallazgos"] if h["tarea"]],
+    }
+
+def evaluar_cartera(ahora: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Evalúa las reglas sobre todas las operaciones abiertas (2 + N/200 consultas en total)."""
+    operaciones = cargar_operaciones_abiertas()
+    cotizaciones = cargar_cotizaciones_origen([op.get("cotizacion_origen") for op in operaciones])
+    ahora = ahora or datetime.now()
+    return [
+        evaluar_operacion_cartera(operacion, cotizaciones.get(operacion.get("cotizacion_origen")), ahora)
+        for operacion in operaciones
+    ]
+
+@app.get("/ia/riesgo-cartera", response_class=RespuestaJSONRapida)
+def obtener_riesgo_cartera(riesgo: Optional[str] = None, limit: int = 100):
+    """
+    Vista de riesgo de todas las operaciones abiertas: resumen por nivel de riesgo y por regla,
+    y las operaciones más riesgosas primero (filtrables por riesgo=Alto|Medio|Bajo).
+    """
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Base de datos no disponible")
+    try:
+        cartera = evaluar_cartera()
+        por_riesgo = collections.Counter(op["riesgo"] for op in cartera)
+        por_regla = collections.Counter(h["regla"] for op in cartera for h in op["hallazgos"])
+
+        operaciones = [op for op in cartera if not riesgo or op["riesgo"] == riesgo]
+        operaciones.sort(key=lambda op: (-op["puntaje"], op["codigo_operacion"]))
+        limit = max(1, min(limit, 1000))
+
+        return RespuestaJSONRapida({
+            "total_operaciones": len(cartera),
+            "por_riesgo": {nivel: por_riesgo.get(nivel, 0) for nivel in ORDEN_RIESGO},
+            "por_regla": dict(por_regla.most_common()),
+            "operaciones": operaciones[:limit],
+        })
+    except Exception as e:
+        logger.exception("Error evaluando riesgo de cartera: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error evaluando cartera: {str(e)}")
+
+# -----------------------
+# Alertas: barrido periódico de la cartera
+# -----------------------
+# Un worker por host evalúa todas las operaciones abiertas cada ALERTAS_INTERVALO_S y guarda
+# el resultado en alertas_operaciones (migrations/004). El worker que toma el lock de archivo
+# lo conserva mientras vive; los demás reintentan en cada intervalo y toman la posta si muere.
+# Ese mismo worker líder es el único que corre la ingesta de tracking. Además, cada cambio de una operación la reevalúa al momento. GET /alertas solo lee la tabla.
+# ALERTAS_INTERVALO_S=0 desactiva el barrido (la reevaluación por cambio sigue activa).
+ALERTAS_INTERVALO_S = int(os.getenv("ALERTAS_INTERVALO_S", "300"))
+ALERTAS_LOCK_ARCHIVO = os.path.join(tempfile.gettempdir(), "ganbatte_alertas.lock")
+ALERTAS_LOTE = 500
+SEVERIDAD_NIVEL = {"critico": 3, "advertencia": 2}
+
+estado_barrido_alertas: Dict[str, Any] = {"lider": False, "ultimo": None, "duracion_s": None, "operaciones": 0,
+                                          "con_alertas": 0, "escritas": 0, "borradas": 0, "error": None}
+_alertas_lock_archivo = None
+
+def tomar_lock_alertas() -> bool:
+    """Lock exclusivo no bloqueante, retenido por el proceso (se libera solo si el proceso muere)."""
+    global _alertas_lock_archivo
+    if _alertas_lock_archivo is not None:
+        return True
+    if fcntl is None:  # Windows: un solo worker en desarrollo
+        _alertas_lock_archivo = True
+        return True
+    archivo = open(ALERTAS_LOCK_ARCHIVO, "a+")
+    try:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        archivo.close()
+        return False
+    archivo.seek(0)
+    archivo.truncate()
+    archivo.write(str(os.getpid()))
+    archivo.flush()
+    _alertas_lock_archivo = archivo
+    return True
+
+def fila_alerta_operacion(resultado: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Fila de alertas_operaciones para una operación evaluada; None si no tiene alertas."""
+    hallazgos = resultado["hallazgos"]
+    if not hallazgos:
+        return None
+    contenido = json_bytes({"hallazgos": hallazgos, "tareas": resultado["tareas"], "riesgo": resultado["riesgo"],
+                            "cliente": resultado["cliente"], "estado": resultado["estado"]})
+    return {
+        "codigo_operacion": resultado["codigo_operacion"],
+        "cliente": resultado["cliente"],
+        "estado": resultado["estado"],
+        "riesgo": resultado["riesgo"],
+        "severidad": max(SEVERIDAD_NIVEL.get(h["nivel"], 0) for h in hallazgos),
+        "puntaje": resultado["puntaje"],
+        "hallazgos": hallazgos,
+        "tareas": resultado["tareas"],
+        "huella": hashlib.blake2b(contenido, digest_size=16).hexdigest(),
+        "evaluado_en": datetime.now().isoformat(),
+    }
+
+def barrer_alertas() -> Dict[str, Any]:
+    """Evalúa la cartera y sincroniza alertas_operaciones: escribe solo lo que cambió y borra lo resuelto."""
+    inicio = time.perf_counter()
+    cartera = evaluar_cartera()
+    filas = [f for f in map(fila_alerta_operacion, cartera) if f is not None]
+
+    existentes: Dict[str, str] = {}
+    while True:
+        pagina = supabase.table("alertas_operaciones").select("codigo_operacion,huella") \
+            .order("codigo_operacion").range(len(existentes), len(existentes) + CARTERA_PAGINA).execute().data or []
+        existentes.update((f["codigo_operacion"], f["huella"]) for f in pagina)
+        if len(pagina) < CARTERA_PAGINA:
+            break
+
+    cambiadas = [f for f in filas if existentes.get(f["codigo_operacion"]) != f["huella"]]
+    for i in range(0, len(cambiadas), ALERTAS_LOTE):
+        supabase.table("alertas_operaciones").upsert(cambiadas[i:i + ALERTAS_LOTE], on_conflict="codigo_operacion").execute()
+
+    vigentes = {f["codigo_operacion"] for f in filas}
+    resueltas = sorted(set(existentes) - vigentes)
+    for i in range(0, len(resueltas), CARTERA_LOTE_COTIZACIONES):
+        supabase.table("alertas_operaciones").delete().in_("codigo_operacion", resueltas[i:i + CARTERA_LOTE_COTIZACIONES]).execute()
+
+    resumen = {
+        "ultimo": datetime.now().isoformat(),
+        "duracion_s": round(time.perf_counter() - inicio, 3),
+        "operaciones": len(cartera),
+        "con_alertas": len(filas),
+        "escritas": len(cambiadas),
+        "borradas": len(resueltas),
+        "error": None,
+    }
+    estado_barrido_alertas.update(resumen)
+    return resumen
+
+def reevaluar_alertas_operacion(codigo_operacion: str):
+    """Reevalúa una operación que acaba de cambiar y actualiza (o borra) su fila de alertas."""
+    reevaluar_alertas_operaciones([codigo_operacion])
+
+def reevaluar_alertas_operaciones(codigos: List[str]):
+    """Igual que reevaluar_alertas_operacion para varias operaciones, con lecturas y escrituras por lote."""
+    if supabase is None:
+        return
+    try:
+        ahora = datetime.now()
+        for i in range(0, len(codigos), CARTERA_LOTE_COTIZACIONES):
+            lote = codigos[i:i + CARTERA_LOTE_COTIZACIONES]
+            operaciones = supabase.table("operaciones") \
+                .select("codigo_operacion,cliente,estado,cotizacion_origen,datos_cotizacion") \
+                .in_("codigo_operacion", lote).execute().data or []
+            abiertas = [op for op in operaciones if op.get("estado") not in ESTADOS_OPERACION_CERRADOS]
+            cotizaciones = cargar_cotizaciones_origen([op.get("cotizacion_origen") for op in abiertas])
+
+            filas = [
+                fila for fila in (
+                    fila_alerta_operacion(evaluar_operacion_cartera(op, cotizaciones.get(op.get("cotizacion_origen")), ahora))
+                    for op in abiertas
+                ) if fila is not None
+            ]
+            if filas:
+                supabase.table("alertas_operaciones").upsert(filas, on_conflict="codigo_operacion").execute()
+            resueltas = sorted(set(lote) - {f["codigo_operacion"] for f in filas})
+            if resueltas:
+                supabase.table("alertas_operaciones").delete().in_("codigo_operacion", resueltas).execute()
+    except Exception as e:
+        logger.warning("⚠️ No se pudieron reevaluar las alertas de %s operaciones: %s", len(codigos), e)
+
+async def barrido_alertas_loop():
+    await asyncio.sleep(random.uniform(0, 5))  # que los workers no compitan todos juntos al arrancar
+    while True:
+        try:
+            if tomar_lock_alertas():
+                if not estado_barrido_alertas["lider"]:
+                    logger.info("🚨 Este worker (pid %s) ejecuta el barrido de alertas cada %ss", os.getpid(), ALERTAS_INTERVALO_S)
+                estado_barrido_alertas["lider"] = True
+                resumen = await asyncio.to_thread(barrer_alertas)
+                logger.info("🚨 Barrido de alertas: %s operaciones, %s con alertas, %s escritas, %s borradas (%ss)",
+                            resumen["operaciones"], resumen["con_alertas"], resumen["escritas"],
+                            resumen["borradas"], resumen["duracion_s"])
+        except Exception as e:
+            estado_barrido_alertas["error"] = str(e)
+            logger.exception("Error en el barrido de alertas: %s", e)
+        await asyncio.sleep(ALERTAS_INTERVALO_S)
+
+@app.get("/alertas", response_class=RespuestaJSONRapida)
+def listar_alertas(
+    limit: int = 50,
+    offset: int = 0,
+    riesgo: Optional[str] = None,
+    severidad_minima: int = 0,
+    cliente: Optional[str] = None,
+):
+    """
+    Feed de alertas precalculadas de la cartera, más severas primero (ver migrations/004).
+    severidad: 3 = crítico, 2 = advertencia.
+    """
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Base de datos no disponible")
+    try:
+        limit = max(1, min(limit, 200))
+        offset = max(0, offset)
+        query = supabase.table("alertas_operaciones").select("*", count="exact")
+        if riesgo:
+            query = query.eq("riesgo", riesgo)
+        if severidad_minima:
+            query = query.gte("severidad", severidad_minima)
+        if cliente:
+            query = query.eq("cliente", cliente)
+        # Un solo parámetro order: postgrest-py 0.11 repite "order" en cada .order() y PostgREST usa uno solo
+        response = query.order("severidad.desc,puntaje.desc,codigo_operacion") \
+            .range(offset, offset + limit).execute()
+
+        total = response.count or 0
+        return RespuestaJSONRapida({
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "siguiente_offset": offset + limit if offset + limit < total else None,
+            "alertas": response.data or [],
+        })
+    except Exception as e:
+        logger.exception("Error listando alertas: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error al listar alertas: {str(e)}")
+
+
+# -----------------------
+# Estadísticas de operación
+# -----------------------
+# Progreso = tareas del checklist completadas + subcarpetas obligatorias con documentos + hitos
+# de tracking cumplidos, sobre el total de los tres. Tareas e hitos los mantiene Postgres en
+# operacion_estadisticas (triggers, ver migrations/005); los documentos salen de IndiceCarpetas,
+# que solo vuelve a listar una subcarpeta cuando cambió el mtime del directorio.
+SUBCARPETAS_OPERACION = ['Cotizaciones', 'Documentos', 'BLs', 'Facturas', 'Otros']
+# Subcarpetas donde se espera al menos un documento en toda operación
+SUBCARPETAS_CON_DOCUMENTOS = ('Documentos', 'BLs', 'Facturas')
+# Hitos de tracking (campos de datos_cotizacion), en orden; mismo criterio que hitos_operacion() en SQL
+HITOS_OPERACION = ('etd', 'fecha_carga', 'eta', 'fecha_descarga')
+# Un directorio modificado hace menos que esto puede recibir más archivos con el mismo mtime
+# (resolución del sistema de archivos): su conteo no se guarda.
+CARPETAS_MTIME_MARGEN_NS = 2_000_000_000
+
+def hitos_operacion(datos: Optional[Dict[str, Any]]) -> Dict[str, bool]:
+    datos = datos or {}
+    return {hito: bool(datos.get(hito)) for hito in HITOS_OPERACION}
+
+class IndiceCarpetas:
+    """Cantidad de archivos por subcarpeta de operación, recontada solo si cambió el mtime del directorio."""
+
+    def __init__(self, maximo: int = 20000):
+        self.maximo = maximo
+        self.lock = threading.Lock()
+        self._conteos: "collections.OrderedDict[str, tuple]" = collections.OrderedDict()
+
+    def _contar_subcarpeta(self, ruta: str) -> int:
+        try:
+            info = os.stat(ruta)
+        except FileNotFoundError:
+            with self.lock:
+                self._conteos.pop(ruta, None)
+            return 0
+        with self.lock:
+            guardado = self._conteos.get(ruta)
+            if guardado is not None and guardado[0] == info.st_mtime_ns:
+                self._conteos.move_to_end(ruta)
+                return guardado[1]
+
+        with os.scandir(ruta) as entradas:
+            cantidad = sum(1 for entrada in entradas if entrada.is_file())
+        if time.time_ns() - info.st_mtime_ns > CARPETAS_MTIME_MARGEN_NS:
+            with self.lock:
+                self._conteos[ruta] = (info.st_mtime_ns, cantidad)
+                self._conteos.move_to_end(ruta)
+                while len(self._conteos) > self.maximo:
+                    self._conteos.popitem(last=False)
+        return cantidad
+
+    def contar(self, ruta_base: str) -> Dict[str, int]:
+        return {nombre: self._contar_subcarpeta(os.path.join(ruta_base, nombre)) for nombre in SUBCARPETAS_OPERACION}
+
+indice_carpetas = IndiceCarpetas()
+
+CARPETAS_OPERACION_TTL = int(os.getenv("CARPETAS_OPERACION_TTL", "300"))
+CARPETAS_OPERACION_MAXIMO = 5000
+
+# codigo_operacion -> (carpeta, momento de la consulta), LRU; solo se guardan los mapeos encontrados.
+# Los PUT/DELETE de cotizaciones invalidan la entrada en este worker; el TTL acota cuánto
+# puede sobrevivir un mapeo viejo en los demás.
+_carpetas_operacion: "collections.OrderedDict[str, Tuple[str, float]]" = collections.OrderedDict()
+_carpetas_operacion_lock = threading.Lock()
+
+def carpeta_operacion(codigo_operacion: str) -> str:
+    with _carpetas_operacion_lock:
+        guardada = _carpetas_operacion.get(codigo_operacion)
+        if guardada is not None and time.monotonic() - guardada[1] < CARPETAS_OPERACION_TTL:
+            _carpetas_operacion.move_to_end(codigo_operacion)
+            return guardada[0]
+
+    consultada = time.monotonic()
+    carpeta = buscar_carpeta_operacion(codigo_operacion)
+    with _carpetas_operacion_lock:
+        if carpeta == codigo_operacion:
+            _carpetas_operacion.pop(codigo_operacion, None)
+        else:
+            _carpetas_operacion[codigo_operacion] = (carpeta, consultada)
+            _carpetas_operacion.move_to_end(codigo_operacion)
+            while len(_carpetas_operacion) > CARPETAS_OPERACION_MAXIMO:
+                _carpetas_operacion.popitem(last=False)
+    return carpeta
+
+def olvidar_carpeta_operacion(*codigos_operacion: Optional[str]) -> None:
+    """Descarta los mapeos cacheados (cuando cambia qué cotización corresponde a una operación)."""
+    with _carpetas_operacion_lock:
+        for codigo in codigos_operacion:
+            if codigo:
+                _carpetas_operacion.pop(codigo, None)
+
+def calcular_estadisticas_operacion(
+    tareas_total: int,
+    tareas_completadas: int,
+    documentos_por_carpeta: Dict[str, int],
+    hitos: Dict[str, bool],
+) -> Dict[str, Any]:
+    carpetas_con_documentos = sum(1 for nombre in SUBCARPETAS_CON_DOCUMENTOS if documentos_por_carpeta.get(nombre))
+    hitos_cumplidos = sum(1 for hito in HITOS_OPERACION if hitos.get(hito))
+    total = tareas_total + len(SUBCARPETAS_CON_DOCUMENTOS) + len(HITOS_OPERACION)
+    return {
+        "progreso": round((tareas_completadas + carpetas_con_documentos + hitos_cumplidos) / total * 100),
+        "tareasPendientes": tareas_total - tareas_completadas,
+        "documentosFaltantes": len(SUBCARPETAS_CON_DOCUMENTOS) - carpetas_con_documentos,
+        "tareasCompletadas": tareas_completadas,
+        "tareasTotales": tareas_total,
+        "documentosPorCarpeta": documentos_por_carpeta,
+        "hitos": {hito: bool(hitos.get(hito)) for hito in HITOS_OPERACION},
+        "hitosCumplidos": hitos_cumplidos,
+    }
+
 @app.get("/operaciones/{codigo_operacion:path}/estadisticas")
-async def obtener_estadisticas_operacion(codigo_operacion: str):
-    """Calcula estadísticas de la operación"""
+def obtener_estadisticas_operacion(codigo_operacion: str):
+    """Estadísticas de la operación: una fila de operacion_estadisticas + el índice de carpetas"""
     try:
-        # Lógica para calcular progreso, tareas pendientes, etc.
-        return {
-            "progreso": 65,
-            "tareasPendientes": 2,
-            "documentosFaltantes": 1
-        }
+        response = supabase.table("operacion_estadisticas").select("*").eq("codigo_operacion", codigo_operacion).limit(1).execute()
+        fila = response.data[0] if response.data else {}
+        documentos = indice_carpetas.contar(get_ruta_operacion(carpeta_operacion(codigo_operacion)))
+        return calcular_estadisticas_operacion(
+            fila.get("tareas_total") or 0, fila.get("tareas_completadas") or 0, documentos, fila.get("hitos") or {}
+        )
     except Exception as e:
-        logger.exception(f"Error obteniendo estadísticas: {e}")
+        logger.exception("Error obteniendo estadísticas: %s", e)
         return {"progreso": 0, "tareasPendientes": 0, "documentosFaltantes": 0}
 
+# -----------------------
+# Ingesta de eventos de tracking de navieras
+# -----------------------
+# Las navieras (o el proceso que traduce su EDI/API) dejan archivos de eventos en
+# TRACKING_ENTRADA_DIR. Cada TRACKING_INGESTA_INTERVALO_S se leen fila por fila y los cambios
+# se aplican a datos_cotizacion con aplicar_tracking_lote (una RPC cada TRACKING_LOTE_RPC operaciones).
+# Formatos: .csv con encabezado y .jsonl/.ndjson (un objeto por línea). Cada evento identifica la
+# operación por codigo_operacion, referencia o contenedor y trae las fechas como columnas
+# (etd, eta, fecha_carga, fecha_descarga) o como evento + fecha (ETD, ETA, CARGA, DESCARGA...).
+# fecha_evento (opcional) desempata eventos del mismo dato: gana el más reciente.
+# Solo corre en el worker que tiene el lock de tomar_lock_alertas(): el índice de la cartera
+# se carga una vez por host y no en cada worker de uvicorn.
+# Un archivo se toma moviéndolo a procesando/ (rename atómico, por si hay varios hosts) y
+# termina en procesados/ o errores/; los eventos sin operación quedan en
+# errores/<archivo>.sin_coincidencia.jsonl. TRACKING_INGESTA_INTERVALO_S=0 desactiva la ingesta.
+TRACKING_ENTRADA_DIR = os.getenv("TRACKING_ENTRADA_DIR", os.path.join(BASE_DIR, "_tracking_entrada"))
+TRACKING_INGESTA_INTERVALO_S = int(os.getenv("TRACKING_INGESTA_INTERVALO_S", "10"))
+TRACKING_ARCHIVO_QUIETO_S = 2      # no tomar archivos que se siguen escribiendo
+TRACKING_EVENTOS_POR_LOTE = 5000   # eventos acumulados antes de aplicar (acota la memoria por archivo)
+TRACKING_INDICE_TTL = 300
+TRACKING_INDICE_REINTENTO_S = 30   # con claves desconocidas, recargar el índice como mucho cada 30 s
+EXTENSIONES_TRACKING = (".csv", ".jsonl", ".ndjson")
+EVENTOS_TRACKING = {
+    "ETD": "etd", "SALIDA": "etd", "DEPARTURE": "etd",
+    "ETA": "eta", "LLEGADA": "eta", "ARRIVAL": "eta",
+    "CARGA": "fecha_carga", "LOADED": "fecha_carga",
+    "DESCARGA": "fecha_descarga", "DISCHARGED": "fecha_descarga",
+}
+
+def normalizar_clave_tracking(valor: Any) -> str:
+    """Referencias y contenedores se comparan sin espacios, guiones ni mayúsculas/minúsculas."""
+    return re.sub(r"[\s\-.]", "", str(valor or "")).upper()
+
+def contenedores_operacion(datos: Dict[str, Any]) -> List[str]:
+    """Números de contenedor cargados en la operación (lista o texto separado por comas)."""
+    contenedores = datos.get("contenedores") or []
+    if isinstance(contenedores, str):
+        contenedores = contenedores.split(",")
+    return [c for c in contenedores if isinstance(c, str) and c.strip()]
+
+class IndiceTracking:
+    """
+    Claves de búsqueda (código, referencia, contenedores) -> operación abierta, más los datos de
+    tracking vigentes de cada una para descartar eventos que no cambian nada.
+    Una clave compartida por varias operaciones queda ambigua y no resuelve ninguna.
+    """
+
+    def __init__(self):
+        self._claves: Dict[str, Optional[str]] = {}
+        self._tracking: Dict[str, Dict[str, Any]] = {}
+        self._cargado = float("-inf")
+        self._lock = threading.Lock()
+
+    def _cargar(self):
+        claves: Dict[str, Optional[str]] = {}
+        tracking: Dict[str, Dict[str, Any]] = {}
+        for operacion in cargar_operaciones_abiertas():
+            codigo = operacion["codigo_operacion"]
+            datos = operacion.get("datos_cotizacion") or {}
+            tracking[codigo] = {campo: datos.get(campo) for campo in HITOS_OPERACION}
+            for valor in {codigo, datos.get("referencia"), *contenedores_operacion(datos)}:
+                clave = normalizar_clave_tracking(valor)
+                if clave:
+                    claves[clave] = codigo if claves.get(clave, codigo) == codigo else None
+        self._claves, self._tracking, self._cargado = claves, tracking, time.monotonic()
+        logger.info("🚢 Índice de tracking: %s operaciones abiertas, %s claves", len(tracking), len(claves))
+
+    def _resolver(self, claves: List[str]) -> Optional[str]:
+        return next((self._claves[c] for c in claves if self._claves.get(c)), None)
+
+    def buscar(self, claves: List[str]) -> Optional[str]:
+        with self._lock:
+            edad = time.monotonic() - self._cargado
+            if edad > TRACKING_INDICE_TTL:
+                self._cargar()
+                return self._resolver(claves)
+            codigo = self._resolver(claves)
+            if codigo is None and edad > TRACKING_INDICE_REINTENTO_S:
+                self._cargar()  # puede ser una operación nueva
+                codigo = self._resolver(claves)
+            return codigo
+
+    def cambios(self, codigo: str, campos: Dict[str, str]) -> Dict[str, str]:
+        """Solo los campos cuyo valor difiere del vigente."""
+        with self._lock:
+            actuales = self._tracking.get(codigo, {})
+            return {campo: valor for campo, valor in campos.items() if actuales.get(campo) != valor}
+
+    def registrar(self, codigo: str, campos: Dict[str, str]):
+        with self._lock:
+            self._tracking.setdefault(codigo, {}).update(campos)
+
+indice_tracking = IndiceTracking()
+
+estado_ingesta_tracking: Dict[str, Any] = {"lider": False, "ultimo": None, "archivos": 0, "eventos": 0,
+                                           "operaciones_actualizadas": 0, "error": None}
+
+def leer_eventos_tracking(ruta: str):
+    """Eventos del archivo de a uno, sin cargarlo entero en memoria."""
+    with open(ruta, encoding="utf-8-sig", newline="") as f:
+        if ruta.lower().endswith(".csv"):
+            yield from csv.DictReader(f)
+            return
+        for numero, linea in enumerate(f, 1):
+            if linea.strip():
+                evento = json.loads(linea)
+                if not isinstance(evento, dict):
+                    raise ValueError(f"línea {numero}: se esperaba un objeto JSON")
+                yield evento
+
+def interpretar_evento_tracking(evento: Dict[str, Any]) -> Tuple[List[str], Dict[str, str], str]:
+    """(claves de búsqueda, campos de tracking con fecha ISO, fecha_evento) de un evento crudo."""
+    evento = {str(k).strip().lower(): v for k, v in evento.items() if k is not None}
+    crudos = {campo: evento.get(campo) for campo in HITOS_OPERACION}
+    campo_evento = EVENTOS_TRACKING.get(str(evento.get("evento") or "").strip().upper())
+    if campo_evento:
+        crudos[campo_evento] = evento.get("fecha")
+
+    campos: Dict[str, str] = {}
+    for campo, valor in crudos.items():
+        fecha = parsear_fecha_operacion(str(valor).strip() if valor else None)
+        if fecha is not None:
+            campos[campo] = fecha.date().isoformat()
+    claves = [normalizar_clave_tracking(evento.get(c)) for c in ("codigo_operacion", "referencia", "contenedor")]
+    return [c for c in claves if c], campos, str(evento.get("fecha_evento") or "")
+
+def procesar_archivo_tracking(ruta: str, ruta_sin_coincidencia: str) -> Dict[str, int]:
+    """Aplica los eventos de un archivo: por operación y campo queda el evento más reciente."""
+    resumen = collections.Counter()
+    pendientes: Dict[str, Dict[str, Tuple[str, str]]] = {}  # codigo -> campo -> (fecha_evento, valor)
+    sin_coincidencia = None
+
+    def aplicar():
+        cambios = {}
+        for codigo, campos in pendientes.items():
+            nuevos = indice_tracking.cambios(codigo, {campo: valor for campo, (_, valor) in campos.items()})
+            if nuevos:
+                cambios[codigo] = nuevos
+        pendientes.clear()
+        if not cambios:
+            return
+        resultados = aplicar_tracking_lote(cambios)
+        actualizadas = [codigo for codigo, r in resultados.items() if r["estado"] == "actualizada"]
+        for codigo in actualizadas:
+            indice_tracking.registrar(codigo, cambios[codigo])
+        resumen["operaciones_actualizadas"] += len(actualizadas)
+        resumen["campos_actualizados"] += sum(len(cambios[codigo]) for codigo in actualizadas)
+        resumen["no_encontradas"] += sum(1 for r in resultados.values() if r["estado"] == "no_encontrada")
+        if actualizadas:
+            reevaluar_alertas_operaciones(actualizadas)
+        fallidas = [r["detalle"] for r in resultados.values() if r["estado"] == "error"]
+        if fallidas:
+            # Que el archivo vuelva a la entrada: lo ya aplicado se descarta solo al reintentar
+            raise RuntimeError(f"{len(fallidas)} operaciones sin aplicar: {fallidas[0]}")
+
+    try:
+        for numero, evento in enumerate(leer_eventos_tracking(ruta), 1):
+            resumen["eventos"] += 1
+            claves, campos, fecha_evento = interpretar_evento_tracking(evento)
+            codigo = indice_tracking.buscar(claves) if campos else None
+            if not campos:
+                resumen["ignorados"] += 1
+            elif codigo is None:
+                resumen["sin_coincidencia"] += 1
+                if sin_coincidencia is None:
+                    sin_coincidencia = open(ruta_sin_coincidencia, "w", encoding="utf-8")
+                sin_coincidencia.write(json.dumps({"linea": numero, **evento}, ensure_ascii=False, default=str) + "\n")
+            else:
+                actuales = pendientes.setdefault(codigo, {})
+                for campo, valor in campos.items():
+                    if campo not in actuales or fecha_evento >= actuales[campo][0]:
+                        actuales[campo] = (fecha_evento, valor)
+            if numero % TRACKING_EVENTOS_POR_LOTE == 0:
+                aplicar()
+        aplicar()
+    finally:
+        if sin_coincidencia is not None:
+            sin_coincidencia.close()
+    return dict(resumen)
+
+def ingerir_tracking_pendiente() -> List[Dict[str, Any]]:
+    """Procesa los archivos de eventos que haya en TRACKING_ENTRADA_DIR; devuelve un resumen por archivo."""
+    carpetas = {nombre: os.path.join(TRACKING_ENTRADA_DIR, nombre) for nombre in ("procesando", "procesados", "errores")}
+    for carpeta in carpetas.values():
+        os.makedirs(carpeta, exist_ok=True)
+
+    procesados = []
+    ahora = time.time()
+    for entrada in sorted(os.scandir(TRACKING_ENTRADA_DIR), key=lambda e: e.name):
+        if not entrada.is_file() or not entrada.name.lower().endswith(EXTENSIONES_TRACKING):
+            continue
+        if ahora - entrada.stat().st_mtime < TRACKING_ARCHIVO_QUIETO_S:
+            continue
+        nombre = f"{datetime.now():%Y%m%dT%H%M%S}_{entrada.name}"
+        tomado = os.path.join(carpetas["procesando"], nombre)
+        try:
+            os.rename(entrada.path, tomado)
+        except FileNotFoundError:
+            continue  # lo tomó otro worker
+
+        inicio = time.perf_counter()
+        try:
+            resumen = procesar_archivo_tracking(tomado, os.path.join(carpetas["errores"], f"{nombre}.sin_coincidencia.jsonl"))
+        except (ValueError, csv.Error) as e:
+            logger.error("❌ Archivo de tracking ilegible %s: %s", entrada.name, e)
+            os.replace(tomado, os.path.join(carpetas["errores"], nombre))
+            continue
+        except Exception:
+            # Falla de la base: vuelve a la entrada y se reintenta (reaplicar eventos no cambia nada)
+            os.replace(tomado, entrada.path)
+            raise
+        os.replace(tomado, os.path.join(carpetas["procesados"], nombre))
+
+        resumen = {"archivo": entrada.name, "duracion_s": round(time.perf_counter() - inicio, 3), **resumen}
+        logger.info("🚢 Tracking %s: %s eventos, %s operaciones actualizadas, %s sin coincidencia (%ss)",
+                    entrada.name, resumen.get("eventos", 0), resumen.get("operaciones_actualizadas", 0),
+                    resumen.get("sin_coincidencia", 0), resumen["duracion_s"])
+        estado_ingesta_tracking["archivos"] += 1
+        estado_ingesta_tracking["eventos"] += resumen.get("eventos", 0)
+        estado_ingesta_tracking["operaciones_actualizadas"] += resumen.get("operaciones_actualizadas", 0)
+        procesados.append(resumen)
+    estado_ingesta_tracking["ultimo"] = datetime.now().isoformat()
+    return procesados
+
+async def ingesta_tracking_loop():
+    while True:
+        try:
+            if not tomar_lock_alertas():
+                await asyncio.sleep(TRACKING_INGESTA_INTERVALO_S)
+                continue
+            if not estado_ingesta_tracking["lider"]:
+                logger.info("🚢 Este worker (pid %s) ejecuta la ingesta de tracking cada %ss", os.getpid(), TRACKING_INGESTA_INTERVALO_S)
+            estado_ingesta_tracking["lider"] = True
+            await asyncio.to_thread(ingerir_tracking_pendiente)
+            estado_ingesta_tracking["error"] = None
+        except Exception as e:
+            estado_ingesta_tracking["error"] = str(e)
+            logger.exception("Error en la ingesta de tracking: %s", e)
+        await asyncio.sleep(TRACKING_INGESTA_INTERVALO_S)
+
+@app.get("/tracking/ingesta")
+def estado_ingesta():
+    """Estado de la ingesta de eventos de tracking de este worker y archivos en espera."""
+    try:
+        en_espera = sum(1 for e in os.scandir(TRACKING_ENTRADA_DIR)
+                        if e.is_file() and e.name.lower().endswith(EXTENSIONES_TRACKING))
+    except FileNotFoundError:
+        en_espera = 0
+    return {
+        "activa": supabase is not None and TRACKING_INGESTA_INTERVALO_S > 0,
+        "directorio": TRACKING_ENTRADA_DIR,
+        "en_espera": en_espera,
+        **estado_ingesta_tracking,
+    }
+
 @app.get("/costos-linea-maritima")
 async def get_costos_linea_maritima(
     tipo_operacion: str, 
@@ -2156,7 +4205,7 @@ async def get_costos_linea_maritima(
 ):
     """Obtener costos por línea marítima específica (GET)"""
     try:
-        logger.info(f"📦 Solicitando costos línea: {tipo_operacion}, {linea_maritima}, {equipo}")
+        logger.info("📦 Solicitando costos línea: %s, %s, %s", tipo_operacion, linea_maritima, equipo)
         
         tipo_op_bd = op_map.get(tipo_operacion)
         if not tipo_op_bd:
@@ -2166,20 +4215,15 @@ async def get_costos_linea_maritima(
             logger.warning("Supabase no configurado - retornando lista vacía")
             return []
 
-        # Consultar costos en la BD
-        response = supabase.table("gastos_locales_maritimos")\
-            .select("*")\
-            .eq("linea_maritima", linea_maritima)\
-            .eq("tipo_operacion", tipo_op_bd)\
-            .eq("equipo", equipo)\
-            .execute()
+        # Costos de la línea (tabla de tarifas en memoria)
+        filas = obtener_tabla_gastos_locales().buscar(tipo_op_bd, linea_maritima, equipo)
 
-        if not response.data:
-            logger.warning(f"No se encontraron costos para {linea_maritima}/{tipo_op_bd}/{equipo}")
+        if not filas:
+            logger.warning("No se encontraron costos para %s/%s/%s", linea_maritima, tipo_op_bd, equipo)
             return []
             
-        logger.info(f"✅ Costos línea encontrados: {len(response.data)} registros")
-        return response.data
+        logger.info("✅ Costos línea encontrados: %s registros", len(filas))
+        return filas
         
     except Exception as e:
         logger.exception("Error obteniendo costos línea marítima: %s", e)
@@ -2194,7 +4238,7 @@ async def get_costos_automaticos(
 ):
     """Endpoint principal para cargar costos automáticamente según el tipo de operación"""
     try:
-        logger.info(f"🚀 Cargando costos automáticos: {tipo_operacion}, {modo_transporte}, {equipo}, {linea_maritima}")
+        logger.info("🚀 Cargando costos automáticos: %s, %s, %s, %s", tipo_operacion, modo_transporte, equipo, linea_maritima)
         
         # Si es Marítima FCL, cargar costos de Ganbatte
         if modo_transporte == 'Maritima FCL' and tipo_operacion in ['IM', 'EM']:
@@ -2234,23 +4278,25 @@ async def get_costos_automaticos(
 # Endpoints de Configuración
 # -----------------------
 
+def cargar_lineas_maritimas() -> List[str]:
+    if supabase is None:
+        # Fallback con datos hardcodeados
+        lineas = ["CMA CGM", "LOG-IN", "COSCO", "MSC", "MAERSK", "EVERGREEN", 
+                 "HAPAG LLOYD", "ZIM", "ONE", "PIL", "HMM", "YANG MING", "GANBATTE"]
+        return sorted(lineas)
+
+    # Líneas marítimas únicas de la tabla de tarifas
+    lineas = {fila['linea_maritima'] for fila in obtener_tabla_gastos_locales().filas}
+    return sorted(lineas)
+
 @app.get("/lineas-maritimas")
-async def get_lineas_maritimas():
+async def get_lineas_maritimas(request: Request):
     """Obtener todas las líneas marítimas únicas"""
     try:
-        if supabase is None:
-            # Fallback con datos hardcodeados
-            lineas = ["CMA CGM", "LOG-IN", "COSCO", "MSC", "MAERSK", "EVERGREEN", 
-                     "HAPAG LLOYD", "ZIM", "ONE", "PIL", "HMM", "YANG MING", "GANBATTE"]
-            return sorted(lineas)
-        
-        # Consulta para obtener líneas marítimas únicas
-        response = supabase.table('gastos_locales_maritimos')\
-            .select('linea_maritima')\
-            .execute()
-        
-        lineas = list(set([item['linea_maritima'] for item in response.data]))
-        return sorted(lineas)
+        entrada = cache_precomprimido.obtener(
+            "lineas-maritimas", lambda: json_bytes(cargar_lineas_maritimas()), ttl=CATALOGOS_TTL
+        )
+        return responder_precomprimido(request, entrada, f"public, max-age={CATALOGOS_TTL}")
         
     except Exception as e:
         logger.exception("Error obteniendo líneas marítimas: %s", e)
@@ -2266,11 +4312,7 @@ async def get_tipos_equipo():
                       "20TK'", "20OT'", "20FR'", "20RE'","40OT'","40FR'","40NOR'",]
             return sorted(equipos)
         
-        response = supabase.table('gastos_locales_maritimos')\
-            .select('equipo')\
-            .execute()
-        
-        equipos = list(set([item['equipo'] for item in response.data]))
+        equipos = {fila['equipo'] for fila in obtener_tabla_gastos_locales().filas}
         return sorted(equipos)
         
     except Exception as e:
@@ -2296,23 +4338,27 @@ async def get_configuracion_costos():
 # Endpoints para Aerolíneas
 # -----------------------
 
+def cargar_aerolineas() -> List[Dict[str, Any]]:
+    if supabase is None:
+        # Fallback con datos estáticos
+        aerolineas_estaticas = [
+            {"id": 1, "nombre": "LATAM Airlines", "codigo_iata": "LA", "pais": "Chile"},
+            {"id": 2, "nombre": "Aerolíneas Argentinas", "codigo_iata": "AR", "pais": "Argentina"},
+            {"id": 3, "nombre": "American Airlines", "codigo_iata": "AA", "pais": "Estados Unidos"},
+            {"id": 4, "nombre": "Delta Air Lines", "codigo_iata": "DL", "pais": "Estados Unidos"},
+            {"id": 5, "nombre": "United Airlines", "codigo_iata": "UA", "pais": "Estados Unidos"},
+        ]
+        return aerolineas_estaticas
+
+    response = supabase.table("aerolineas").select("*").eq("activo", True).order("nombre").execute()
+    return response.data or []
+
 @app.get("/aerolineas")
-async def get_aerolineas():
+async def get_aerolineas(request: Request):
     """Obtener todas las aerolíneas activas"""
     try:
-        if supabase is None:
-            # Fallback con datos estáticos
-            aerolineas_estaticas = [
-                {"id": 1, "nombre": "LATAM Airlines", "codigo_iata": "LA", "pais": "Chile"},
-                {"id": 2, "nombre": "Aerolíneas Argentinas", "codigo_iata": "AR", "pais": "Argentina"},
-                {"id": 3, "nombre": "American Airlines", "codigo_iata": "AA", "pais": "Estados Unidos"},
-                {"id": 4, "nombre": "Delta Air Lines", "codigo_iata": "DL", "pais": "Estados Unidos"},
-                {"id": 5, "nombre": "United Airlines", "codigo_iata": "UA", "pais": "Estados Unidos"},
-            ]
-            return aerolineas_estaticas
-        
-        response = supabase.table("aerolineas").select("*").eq("activo", True).order("nombre").execute()
-        return response.data or []
+        entrada = cache_precomprimido.obtener("aerolineas", lambda: json_bytes(cargar_aerolineas()), ttl=CATALOGOS_TTL)
+        return responder_precomprimido(request, entrada, f"public, max-age={CATALOGOS_TTL}")
         
     except Exception as e:
         logger.exception("Error cargando aerolíneas: %s", e)
@@ -2339,8 +4385,9 @@ async def eliminar_cotizacion(codigo_legible: str):
 
         # Eliminar la cotización
         response = supabase.table("cotizaciones").delete().eq("codigo_legible", codigo_legible).execute()
+        olvidar_carpeta_operacion(existing_cot.data[0].get("codigo_operacion"))
         
-        logger.info(f"Cotización eliminada: {codigo_legible}")
+        logger.info("Cotización eliminada: %s", codigo_legible)
         return {"mensaje": "Cotización eliminada exitosamente"}
 
     except HTTPException:
@@ -2355,7 +4402,7 @@ async def eliminar_cotizacion(codigo_legible: str):
 async def obtener_cotizacion_completa(codigo_path: str):
     """Obtener una cotización específica - maneja códigos con barras"""
     try:
-        print(f"🔍 [GET] Buscando cotización: {codigo_path}")
+        logger_cotizaciones.debug("🔍 [GET] Buscando cotización: %s", codigo_path)
         
         if supabase is None:
             raise HTTPException(status_code=503, detail="Base de datos no disponible")
@@ -2363,17 +4410,17 @@ async def obtener_cotizacion_completa(codigo_path: str):
         # Buscar por codigo_legible (que puede contener barras)
         response = supabase.table("cotizaciones").select("*").eq("codigo_legible", codigo_path).execute()
         
-        print(f"📊 Resultado de búsqueda: {len(response.data)} registros")
+        logger_cotizaciones.debug("📊 Resultado de búsqueda: %s registros", len(response.data))
         
         if not response.data:
             raise HTTPException(status_code=404, detail=f"Cotización '{codigo_path}' no encontrada")
 
         cotizacion = response.data[0]
-        print(f"✅ Cotización encontrada: {cotizacion['codigo_legible']}")
+        logger_cotizaciones.debug("✅ Cotización encontrada: %s", cotizacion['codigo_legible'])
 
         # Obtener los costos asociados
         costos_response = supabase.table("costos_cotizacion").select("*").eq("codigo_cotizacion", cotizacion['codigo_legible']).execute()
-        print(f"💰 Costos encontrados: {len(costos_response.data or [])}")
+        logger_cotizaciones.debug("💰 Costos encontrados: %s", len(costos_response.data or []))
         
         # Calcular estado actual
         estado_info = calcular_estado_y_validez(
@@ -2402,14 +4449,14 @@ async def obtener_cotizacion_completa(codigo_path: str):
 
 # ✅ PUT también debe usar path parameter
 @app.put("/cotizaciones/{codigo_path:path}")
-async def actualizar_cotizacion(codigo_path: str, cotizacion: dict):
+async def actualizar_cotizacion(codigo_path: str, cotizacion: CotizacionActualizacion):
     """Actualizar una cotización existente - maneja códigos con barras"""
     try:
         if supabase is None:
             raise HTTPException(status_code=503, detail="Base de datos no disponible")
 
-        print(f"✏️ [PUT] Actualizando cotización: {codigo_path}")
-        print(f"📤 Datos recibidos: {cotizacion}")
+        logger_cotizaciones.debug("✏️ [PUT] Actualizando cotización: %s", codigo_path)
+        logger_cotizaciones.debug("📤 Campos recibidos: %s", sorted(cotizacion.model_fields_set))
         
         # Verificar que la cotización existe
         existing_cot = supabase.table("cotizaciones").select("*").eq("codigo_legible", codigo_path).execute()
@@ -2417,19 +4464,21 @@ async def actualizar_cotizacion(codigo_path: str, cotizacion: dict):
             raise HTTPException(status_code=404, detail="Cotización no encontrada")
 
         # Preparar datos para actualización
-        campos_no_actualizables = ['codigo', 'codigo_legible', 'fecha_creacion', 'id']
-        update_data = {k: v for k, v in cotizacion.items() if k not in campos_no_actualizables and v is not None}
+        update_data = cotizacion.model_dump(exclude=CAMPOS_COTIZACION_NO_ACTUALIZABLES, exclude_none=True)
         update_data["fecha_actualizacion"] = datetime.now().isoformat()
 
-        print(f"📝 Campos a actualizar: {list(update_data.keys())}")
+        logger_cotizaciones.debug("📝 Campos a actualizar: %s", list(update_data.keys()))
 
         # Actualizar en la base de datos
         response = supabase.table("cotizaciones").update(update_data).eq("codigo_legible", codigo_path).execute()
+        if "codigo_operacion" in update_data:
+            # La carpeta de la operación sale de cotizaciones.codigo_operacion (ver carpeta_operacion)
+            olvidar_carpeta_operacion(update_data["codigo_operacion"], existing_cot.data[0].get("codigo_operacion"))
         
         if not response.data:
             raise HTTPException(status_code=500, detail="Error al actualizar cotización")
 
-        logger.info(f"✅ Cotización actualizada: {codigo_path}")
+        logger.info("✅ Cotización actualizada: %s", codigo_path)
         return {
             "mensaje": "Cotización actualizada exitosamente",
             "codigo": codigo_path,
@@ -2460,8 +4509,9 @@ async def eliminar_cotizacion(codigo_path: str):
 
         # Eliminar la cotización
         response = supabase.table("cotizaciones").delete().eq("codigo_legible", codigo_path).execute()
+        olvidar_carpeta_operacion(existing_cot.data[0].get("codigo_operacion"))
         
-        logger.info(f"Cotización eliminada: {codigo_path}")
+        logger.info("Cotización eliminada: %s", codigo_path)
         return {"mensaje": "Cotización eliminada exitosamente"}
 
     except HTTPException:
@@ -2476,7 +4526,7 @@ async def crear_cotizacion(cotizacion: Cotizacion, background_tasks: BackgroundT
     try:
         # ✅ NUEVA VALIDACIÓN: Verificar que el cliente existe
         if supabase is not None:
-            cliente_existente = supabase.table("clientes").select("nombre").eq("nombre", cotizacion.cliente).eq("activo", True).execute()
+            cliente_existente = supabase.table("clientes").select("id, nombre").eq("nombre", cotizacion.cliente).eq("activo", True).execute()
             if not cliente_existente.data:
                 raise HTTPException(
                     status_code=400, 
@@ -2505,7 +4555,7 @@ async def crear_cotizacion(cotizacion: Cotizacion, background_tasks: BackgroundT
                 cotizacion.tipo_contenedor = equipo_estandarizado
                 cotizacion.equipo = equipo_estandarizado 
             else:
-                logger.error(f"Equipo inválido: Original='{nombre_equipo_original}', Estandarizado='{equipo_estandarizado}'")
+                logger.error("Equipo inválido: Original='%s', Estandarizado='%s'", nombre_equipo_original, equipo_estandarizado)
                 raise HTTPException(status_code=400, detail="Tipo de contenedor inválido para transporte marítimo.")
         # ----------------------------------------------------------------------------
 
@@ -2514,10 +4564,10 @@ async def crear_cotizacion(cotizacion: Cotizacion, background_tasks: BackgroundT
         codigo_legible = await generar_proximo_numero(cotizacion.tipo_operacion)
         fecha_validez = datetime.now() + timedelta(days=cotizacion.validez_dias or 30)
 
-        # Usar .dict() (o .model_dump() si usa Pydantic v2)
-        payload = cotizacion.dict() 
+        payload = cotizacion.model_dump()
         payload.update({
             "codigo": codigo_uuid,
+            "cliente_id": cliente_existente.data[0]["id"] if supabase is not None else None,
             "codigo_legible": codigo_legible,
             "fecha_validez": fecha_validez.isoformat(),
             "estado": "creada",
@@ -2560,7 +4610,7 @@ async def crear_cotizacion(cotizacion: Cotizacion, background_tasks: BackgroundT
         raise HTTPException(status_code=500, detail=f"Error creando cotización: {str(e)}")
 
 
-@app.get("/cotizaciones")
+@app.get("/cotizaciones", response_class=RespuestaJSONRapida)
 def listar_cotizaciones():
     try:
         if supabase is None:
@@ -2569,160 +4619,207 @@ def listar_cotizaciones():
 
         response = supabase.table("cotizaciones").select("*").order("fecha_creacion", desc=True).execute()
         
-        print(f"🔍 Respuesta de Supabase: {len(response.data) if response.data else 0} cotizaciones")
+        logger_cotizaciones.debug("🔍 Respuesta de Supabase: %s cotizaciones", len(response.data) if response.data else 0)
         
         cotizaciones = []
         for cot in (response.data or []):
             try:
-                cot_data = cot.copy()
-                
-                # Usar codigo legible si existe
-                if cot_data.get('codigo_legible'):
-                    cot_data['codigo'] = cot_data['codigo_legible']
-                else:
-                    # fallback retroactivo
-                    tipo_op = cot_data.get('tipo_operacion', 'XX')
-                    prefijo = {
-                        'IA': 'GAN-IA', 'IM': 'GAN-IM', 'EA': 'GAN-EA',
-                        'EM': 'GAN-EM', 'IT': 'GAN-IT', 'ET': 'GAN-ET','MC': 'GAN-MC', 'CO': 'GAN-CO'
-                    }.get(tipo_op, 'GAN-XX')
-                    fecha = cot_data.get('fecha_creacion', datetime.now())
-                    if isinstance(fecha, str):
-                        try:
-                            fecha = datetime.fromisoformat(fecha.replace('Z', '+00:00'))
-                        except Exception:
-                            fecha = datetime.now()
-                    año = fecha.strftime("%y")
-                    mes = fecha.strftime("%m")
-                    cot_data['codigo'] = f"{prefijo}-{año}/{mes}/R01"
-
-                # ✅ Pasar el estado ACTUAL de la base de datos
-                estado_actual_db = cot_data.get('estado')
-                estado_info = calcular_estado_y_validez(
-                    cot_data.get('fecha_validez'), 
-                    cot_data.get('validez_dias', 30),
-                    estado_actual_db
-                )
-                
-                cot_data['estado_actual'] = estado_info['estado']
-                cot_data['color'] = estado_info['color']
-                cot_data['dias_restantes'] = estado_info['dias_restantes']
-                cot_data['label_estado'] = ESTADOS_COTIZACION.get(estado_info['estado'], {'label': '🔵 ENVIADA'})['label']
-                
-                cotizaciones.append(cot_data)
-                
+                cotizaciones.append(procesar_cotizacion_listado(cot))
             except Exception as e:
-                print(f"❌ Error procesando cotización {cot.get('id')}: {e}")
+                logger_cotizaciones.error("❌ Error procesando cotización %s: %s", cot.get('id'), e)
                 continue
                 
-        print(f"✅ Total de cotizaciones procesadas: {len(cotizaciones)}")
-        return cotizaciones
+        logger_cotizaciones.debug("✅ Total de cotizaciones procesadas: %s", len(cotizaciones))
+        return RespuestaJSONRapida(cotizaciones)
         
     except Exception as e:
         logger.exception("Error listando cotizaciones: %s", e)
-        print(f"❌ Error crítico en listar_cotizaciones: {e}")
+        logger_cotizaciones.warning("❌ Error crítico en listar_cotizaciones: %s", e)
         raise HTTPException(status_code=500, detail=f"Error al obtener cotizaciones: {str(e)}")
+
 # -----------------------
-# Endpoints RESTANTES (compatibilidad)
+# Analytics (agregaciones agrupadas)
 # -----------------------
 
-# Función helper común
+DIMENSIONES_ANALYTICS = ["tipo_operacion", "modo_transporte", "linea_maritima", "equipo", "estado", "cliente", "mes"]
+ANALYTICS_CACHE_SEGUNDOS = int(os.getenv("ANALYTICS_CACHE_SEGUNDOS", "300"))
+ANALYTICS_CACHE_MAXIMO = int(os.getenv("ANALYTICS_CACHE_MAXIMO", "128"))
+
+# (dimensiones, desde, hasta, intervalo) -> filas ya formateadas, LRU acotado.
+# El endpoint es sync (threadpool): todo acceso al dict va con _analytics_cache_lock.
+_analytics_cache: "collections.OrderedDict[tuple, List[Dict[str, Any]]]" = collections.OrderedDict()
+_analytics_cache_lock = threading.Lock()
+
+def formatear_fila_analytics(fila: Dict[str, Any]) -> Dict[str, Any]:
+    """Agrega tasas y promedios a una fila devuelta por analytics_cotizaciones()."""
+    total = fila.get("total") or 0
+    aceptadas = fila.get("aceptadas") or 0
+    con_costos = fila.get("con_costos") or 0
+    venta_total = float(fila.get("venta_total") or 0)
+    margen_total = float(fila.get("margen_total") or 0)
+    return {
+        **fila,
+        "tasa_conversion": round(aceptadas / total * 100, 1) if total else 0.0,
+        "margen_promedio": round(margen_total / con_costos, 2) if con_costos else 0.0,
+        "margen_porcentual": round(margen_total / venta_total * 100, 1) if venta_total else 0.0
+    }
 
-async def generar_proximo_numero_operacion() -> str:
+@app.get("/analytics")
+def obtener_analytics(agrupar_por: str = "tipo_operacion", desde: Optional[date] = None, hasta: Optional[date] = None):
     """
-    Genera código legible para Operaciones: GAN-OP-YY/MM/NNN
+    Conversión y márgenes de cotizaciones agrupados por una o más dimensiones
+    (ej: ?agrupar_por=modo_transporte,mes). La agregación corre en Postgres
+    (RPC analytics_cotizaciones) y el resultado se cachea por intervalo de tiempo.
     """
     try:
-        ahora = datetime.now()
-        año = ahora.strftime("%y")
-        mes = ahora.strftime("%m")
-        prefijo = "GAN-OP" # Prefijo para Operaciones
-
-        patron_busqueda = f"{prefijo}-{año}/{mes}/"
+        dimensiones = tuple(d.strip() for d in agrupar_por.split(",") if d.strip())
+        invalidas = [d for d in dimensiones if d not in DIMENSIONES_ANALYTICS]
+        if invalidas:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Dimensiones no válidas: {', '.join(invalidas)}. Opciones: {', '.join(DIMENSIONES_ANALYTICS)}"
+            )
         if supabase is None:
-            return f"{patron_busqueda}001"
+            raise HTTPException(status_code=503, detail="Base de datos no disponible")
 
-        # Buscar códigos en la nueva tabla 'operaciones'
-        response = supabase.table("operaciones").select("codigo_operacion").like("codigo_operacion", f"{patron_busqueda}%").execute()
-        numeros_existentes = []
-        for op in (response.data or []):
-            codigo = op.get("codigo_operacion", "")
-            match = re.search(r'/(\d+)$', codigo)
-            if match:
-                try:
-                    numeros_existentes.append(int(match.group(1)))
-                except ValueError:
-                    continue
+        intervalo = int(time.time() // ANALYTICS_CACHE_SEGUNDOS)
+        clave = (dimensiones, desde, hasta, intervalo)
+        with _analytics_cache_lock:
+            filas = _analytics_cache.get(clave)
+            if filas is not None:
+                _analytics_cache.move_to_end(clave)
+        if filas is None:
+            response = supabase.rpc("analytics_cotizaciones", {
+                "p_dimensiones": list(dimensiones),
+                "p_desde": desde.isoformat() if desde else None,
+                "p_hasta": (hasta + timedelta(days=1)).isoformat() if hasta else None
+            }).execute()
+            filas = [formatear_fila_analytics(f) for f in (response.data or [])]
+
+            # Descartar intervalos viejos y lo menos usado por encima de ANALYTICS_CACHE_MAXIMO
+            with _analytics_cache_lock:
+                for vieja in [k for k in _analytics_cache if k[3] != intervalo]:
+                    del _analytics_cache[vieja]
+                _analytics_cache[clave] = filas
+                _analytics_cache.move_to_end(clave)
+                while len(_analytics_cache) > ANALYTICS_CACHE_MAXIMO:
+                    _analytics_cache.popitem(last=False)
 
-        proximo_numero = (max(numeros_existentes) + 1) if numeros_existentes else 1
-        numero_formateado = f"{proximo_numero:03d}"
-        return f"{patron_busqueda}{numero_formateado}"
+        return {
+            "agrupar_por": list(dimensiones),
+            "desde": desde,
+            "hasta": hasta,
+            "generado_intervalo": datetime.fromtimestamp(intervalo * ANALYTICS_CACHE_SEGUNDOS).isoformat(),
+            "grupos": filas
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.exception("Error generando proximo numero de operacion: %s", e)
-        ahora = datetime.now()
-        año = ahora.strftime("%y")
-        mes = ahora.strftime("%m")
-        return f"GAN-OP-{año}/{mes}/001"
+        logger.exception("Error obteniendo analytics: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error al obtener analytics: {str(e)}")
 
-async def crear_operacion_automatica(codigo_cotizacion: str):
-    """
-    Crea una operación en la DB basada en una cotización aceptada.
-    AJUSTADA para la nueva estructura de tabla con JSONB.
-    """
-    try:
-        if supabase is None:
-            logger.warning("Supabase no configurado. No se puede crear operación.")
-            return
+# -----------------------
+# Endpoints RESTANTES (compatibilidad)
+# -----------------------
 
-        # 1. Verificar si la operación ya existe (usando el campo correcto)
-        op_existente = supabase.table("operaciones").select("id").eq("cotizacion_origen", codigo_cotizacion).execute()
-        if op_existente.data:
-            logger.info(f"Operación ya existe para {codigo_cotizacion}. No se crea duplicado.")
-            return
+# -----------------------
+# Plantillas de checklist
+# -----------------------
+# Tareas con las que nace cada operación según tipo_operacion y modo_transporte de su cotización.
+# Clave (tipo_operacion, modo_transporte), "*" = cualquiera. Se juntan, en este orden, la plantilla
+# general, la del modo, la del tipo y la del par exacto, sin repetir tareas.
+TAREAS_IMPORTACION = [
+    "Recibir documentos de embarque del exterior",
+    "Recibir aviso de llegada",
+    "Coordinar despacho de importación con el agente de aduana",
+    "Coordinar entrega al cliente",
+]
+TAREAS_EXPORTACION = [
+    "Recibir factura comercial y packing list del cliente",
+    "Coordinar despacho de exportación con el agente de aduana",
+    "Confirmar embarque y enviar documentos al cliente",
+]
+PLANTILLAS_CHECKLIST: Dict[Tuple[str, str], List[str]] = {
+    ("*", "*"): ["Confirmar la operación con el cliente", "Facturar al cliente"],
+    ("*", "Maritima FCL"): [
+        "Solicitar booking a la naviera",
+        "Confirmar retiro del contenedor vacío",
+        "Enviar VGM",
+        "Revisar draft BL",
+        "Recibir BL definitivo",
+    ],
+    ("*", "Maritima LCL"): [
+        "Reservar espacio en el consolidado",
+        "Confirmar entrega de la carga en depósito (CFS)",
+        "Revisar draft HBL",
+        "Recibir HBL definitivo",
+    ],
+    ("*", "Aerea"): ["Reservar espacio con la aerolínea", "Confirmar entrega en terminal de cargas", "Recibir AWB / HAWB"],
+    ("*", "Terrestre"): ["Coordinar el transporte", "Emitir CRT y MIC/DTA"],
+    ("*", "Courier"): ["Coordinar retiro con el courier", "Registrar número de guía"],
+    ("IM", "*"): TAREAS_IMPORTACION,
+    ("IA", "*"): TAREAS_IMPORTACION,
+    ("IT", "*"): TAREAS_IMPORTACION,
+    ("EM", "*"): TAREAS_EXPORTACION + ["Confirmar ingreso a puerto antes del cut-off"],
+    ("EA", "*"): TAREAS_EXPORTACION,
+    ("ET", "*"): TAREAS_EXPORTACION,
+}
 
-        # 2. Obtener datos de la cotización
-        cot_response = supabase.table("cotizaciones").select("*").eq("codigo_legible", codigo_cotizacion).single().execute()
-        if not cot_response.data:
-            logger.error(f"No se encontró la cotización {codigo_cotizacion} para crear operación.")
-            return
+def tareas_plantilla(tipo_operacion: Optional[str], modo_transporte: Optional[str]) -> List[str]:
+    """Tareas de checklist que corresponden a una operación, sin duplicados y en orden."""
+    tareas: Dict[str, None] = {}
+    for clave in (("*", "*"), ("*", modo_transporte), (tipo_operacion, "*"), (tipo_operacion, modo_transporte)):
+        tareas.update(dict.fromkeys(PLANTILLAS_CHECKLIST.get(clave, [])))
+    return list(tareas)
 
-        cot = cot_response.data
-        nuevo_codigo_op = await generar_proximo_numero_operacion()
+# Reintentos de la conversión (la RPC es idempotente: repetirla devuelve la operación ya creada)
+CONVERSION_REINTENTOS = 3
 
-        # 3. Crear payload de la operación (¡Ajustado a tu schema!)
-        operacion_data = {
-            "id": str(uuid4()),
-            "codigo_operacion": nuevo_codigo_op,
-            "cotizacion_origen": codigo_cotizacion, # <-- Coincide con tu SQL
-            "cliente": cot.get("cliente"),
-            "tipo_operacion": cot.get("tipo_operacion"),
-            "estado": "en_proceso", # <-- Coincide con el default 'en_proceso' de tu SQL
-            "fecha_creacion": datetime.now().isoformat(),
-            "fecha_actualizacion": datetime.now().isoformat(),
-            
-            # ✅ Aquí guardamos los detalles extra en el JSONB
-            "datos_cotizacion": {
-                "referencia": cot.get("referencia"),
-                "modo_transporte": cot.get("modo_transporte"),
-                "origen": cot.get("origen"),
-                "destino": cot.get("destino"),
-                "equipo": cot.get("equipo"),
-                "incoterm_origen": cot.get("incoterm_origen"),
-                "incoterm_destino": cot.get("incoterm_destino"),
-                "peso_total_kg": cot.get("peso_total_kg"),
-                "volumen_m3": cot.get("volumen_m3")
-            }
-        }
+def crear_operacion_automatica(codigo_cotizacion: str, cotizacion: Optional[Dict[str, Any]] = None):
+    """
+    Crea la operación de una cotización aceptada, con su checklist inicial, mediante la RPC
+    convertir_cotizacion_en_operacion (migrations/008): una sola transacción que no duplica
+    operaciones aunque se llame dos veces. `cotizacion` (la fila ya leída) evita releerla
+    para elegir la plantilla de checklist.
+    """
+    if supabase is None:
+        logger.warning("Supabase no configurado. No se puede crear operación.")
+        return None
+    try:
+        if cotizacion is None:
+            cot_response = supabase.table("cotizaciones").select("tipo_operacion,modo_transporte") \
+                .eq("codigo_legible", codigo_cotizacion).limit(1).execute()
+            cotizacion = cot_response.data[0] if cot_response.data else {}
+        tareas = tareas_plantilla(cotizacion.get("tipo_operacion"), cotizacion.get("modo_transporte"))
 
-        # 4. Insertar la nueva operación
-        insert_response = supabase.table("operaciones").insert(operacion_data).execute()
-        if insert_response.data:
-            logger.info(f"✅ Operación {nuevo_codigo_op} creada exitosamente desde {codigo_cotizacion}")
+        for intento in range(1, CONVERSION_REINTENTOS + 1):
+            try:
+                filas = supabase.rpc("convertir_cotizacion_en_operacion", {
+                    "p_codigo_cotizacion": codigo_cotizacion,
+                    "p_tareas": tareas,
+                }).execute().data or []
+                break
+            except Exception as e:
+                if intento == CONVERSION_REINTENTOS:
+                    raise
+                logger.warning("⚠️ Conversión de %s falló (intento %s): %s", codigo_cotizacion, intento, e)
+                time.sleep(0.5 * intento)
+
+        if not filas:
+            logger.error("No se encontró la cotización %s para crear operación.", codigo_cotizacion)
+            return None
+        codigo_operacion = filas[0]["codigo_operacion"]
+        if filas[0].get("creada"):
+            logger.info("✅ Operación %s creada exitosamente desde %s", codigo_operacion, codigo_cotizacion)
+            reevaluar_alertas_operacion(codigo_operacion)
         else:
-            logger.error(f"Error al insertar operación para {codigo_cotizacion}")
+            logger.info("Operación ya existe para %s (%s). No se crea duplicado.", codigo_cotizacion, codigo_operacion)
+        return codigo_operacion
 
     except Exception as e:
-        logger.exception(f"Error crítico en crear_operacion_automatica para {codigo_cotizacion}: {e}")
+        logger.exception("Error crítico en crear_operacion_automatica para %s: %s", codigo_cotizacion, e)
+        return None
 
 
 async def generar_costos_predefinidos(tipo_operacion: str, incoterm: str, modo_transporte: str):
@@ -2763,25 +4860,125 @@ async def generar_costos_predefinidos(tipo_operacion: str, incoterm: str, modo_t
             }
         ]
     
-    logger.info(f"✅ Retornando {len(conceptos_ejemplo)} conceptos predefinidos")
+    logger.info("✅ Retornando %s conceptos predefinidos", len(conceptos_ejemplo))
     return conceptos_ejemplo
 
+# -----------------------
+# Índice en memoria de puertos/aeropuertos (autocompletado)
+# -----------------------
+
+PUERTOS_INDICE_TTL = int(os.getenv("PUERTOS_INDICE_TTL", "600"))  # segundos
+
+# Campos de la tabla que se indexan para la búsqueda por prefijo
+CAMPOS_INDICE_PUERTOS = ["nombre", "codigo", "ciudad", "pais"]
+
+def normalizar_texto(texto: Any) -> str:
+    """Pasa a minúsculas y elimina acentos ('Valparaíso' -> 'valparaiso')."""
+    if not texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", str(texto))
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower().strip()
+
+class IndicePuertos:
+    """
+    Índice de prefijos sobre el catálogo de puertos/aeropuertos.
+    Guarda un array ordenado de (clave_normalizada, posición) y resuelve cada búsqueda
+    con bisect, sin recorrer el catálogo completo.
+    """
+
+    def __init__(self, registros: List[Dict[str, Any]]):
+        self.registros = registros
+        self.creado = time.monotonic()
+        claves = set()
+        for i, registro in enumerate(registros):
+            for campo in CAMPOS_INDICE_PUERTOS:
+                valor = normalizar_texto(registro.get(campo))
+                if not valor:
+                    continue
+                claves.add((valor, i))
+                # Cada palabra también es un punto de entrada ("aires" -> "Buenos Aires")
+                for palabra in re.split(r"[\s\-/,()]+", valor)[1:]:
+                    if palabra:
+                        claves.add((palabra, i))
+        self._claves = sorted(claves)
+
+    def vencido(self) -> bool:
+        return time.monotonic() - self.creado > PUERTOS_INDICE_TTL
+
+    def buscar(self, prefijo: str, tipo: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        prefijo = normalizar_texto(prefijo)
+        if not prefijo:
+            return []
+
+        encontrados = []
+        vistos = set()
+        pos = bisect.bisect_left(self._claves, (prefijo,))
+        while pos < len(self._claves) and len(encontrados) < limit:
+            clave, i = self._claves[pos]
+            if not clave.startswith(prefijo):
+                break
+            pos += 1
+            if i in vistos:
+                continue
+            vistos.add(i)
+            registro = self.registros[i]
+            if tipo and registro.get("tipo") != tipo:
+                continue
+            encontrados.append(registro)
+        return encontrados
+
+_indice_puertos: Optional[IndicePuertos] = None
+_indice_puertos_lock = threading.Lock()
+
+def obtener_indice_puertos() -> IndicePuertos:
+    """Devuelve el índice de puertos, recargándolo desde la DB cuando vence el TTL."""
+    global _indice_puertos
+    indice = _indice_puertos
+    if indice is not None and not indice.vencido():
+        return indice
+
+    with _indice_puertos_lock:
+        if _indice_puertos is None or _indice_puertos.vencido():
+            response = supabase.table("puertos_aeropuertos").select("*").eq("activo", True).order("nombre").execute()
+            _indice_puertos = IndicePuertos(response.data or [])
+            logger.info("Índice de puertos/aeropuertos cargado: %s registros", len(_indice_puertos.registros))
+        return _indice_puertos
+
 @app.get("/puertos_aeropuertos")
-def listar_puertos(tipo: Optional[str] = None, pais: Optional[str] = None):
+def listar_puertos(request: Request, tipo: Optional[str] = None, pais: Optional[str] = None):
     try:
-        q = supabase.table("puertos_aeropuertos").select("*").eq("activo", True)
-        if tipo:
-            q = q.eq("tipo", tipo)
-        if pais:
-            q = q.ilike("pais", f"%{pais}%")
-        
-        q = q.order("nombre")
-        data = q.execute()
-        return data.data or []
+        indice = obtener_indice_puertos()
+
+        def generar() -> bytes:
+            registros = indice.registros
+            if tipo:
+                registros = [r for r in registros if r.get("tipo") == tipo]
+            if pais:
+                pais_busqueda = normalizar_texto(pais)
+                registros = [r for r in registros if pais_busqueda in normalizar_texto(r.get("pais"))]
+            return json_bytes(registros)
+
+        # La versión es el índice: al recargarse (TTL) se regenera, y solo se recomprime si cambió
+        clave = f"puertos_aeropuertos?tipo={tipo or ''}&pais={normalizar_texto(pais) if pais else ''}"
+        entrada = cache_precomprimido.obtener(clave, generar, version=indice.creado)
+        return responder_precomprimido(request, entrada, f"public, max-age={PUERTOS_INDICE_TTL}")
     except Exception as e:
         logger.exception("Error listando puertos/aeropuertos: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/puertos_aeropuertos/autocompletar")
+def autocompletar_puertos(q: str, tipo: Optional[str] = None, limit: int = 10):
+    """
+    Búsqueda por prefijo (sin acentos ni mayúsculas) sobre nombre, código, ciudad y país.
+    Pensado para los selectores de origen/destino.
+    """
+    try:
+        limit = max(1, min(limit, 50))
+        return obtener_indice_puertos().buscar(q, tipo=tipo, limit=limit)
+    except Exception as e:
+        logger.exception("Error en autocompletado de puertos/aeropuertos: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/operaciones/{codigo_operacion:path}/checklist")
 async def get_checklist_operacion(codigo_operacion: str):
     """Obtener todos los checklist items para una operación"""
@@ -2808,7 +5005,7 @@ async def add_checklist_item(codigo_operacion: str, item: ChecklistItem):
 
         # Asegurarnos que el código es el del path
         item.codigo_operacion = codigo_operacion
-        item_data = item.dict()
+        item_data = item.model_dump()
         item_data["id"] = str(uuid4())
         item_data["fecha_creacion"] = datetime.now().isoformat()
         
@@ -2831,7 +5028,7 @@ async def add_checklist_item(codigo_operacion: str, item: ChecklistItem):
 async def debug_operacion(codigo_operacion: str):
     """Endpoint de diagnóstico para operaciones"""
     try:
-        logger.info(f"🔧 Debug operación: {codigo_operacion}")
+        logger.info("🔧 Debug operación: %s", codigo_operacion)
         
         if supabase is None:
             return {"error": "Supabase no configurado"}
@@ -2861,223 +5058,287 @@ async def debug_operacion(codigo_operacion: str):
         }
         
     except Exception as e:
-        logger.exception(f"Error en debug: {e}")
+        logger.exception("Error en debug: %s", e)
         return {"error": str(e)}
 
+def generar_recomendaciones(evaluacion: Dict[str, Any]) -> Dict[str, Any]:
+    """Recomendaciones, tareas y riesgo de una operación a partir de la evaluación de reglas."""
+    valores = evaluacion["contexto"].valores
+    modo_transporte, origen, destino = valores["modo_transporte"], valores["origen"], valores["destino"]
+    eta = valores["eta"]
+    tareas = [h["tarea"] for h in evaluacion["hallazgos"] if h["tarea"]]
+    riesgo = evaluacion["riesgo"]
+
+    recomendaciones = [
+        f"💡 Operación con transporte {modo_transporte or 'No especificado'} de {origen or 'Origen no definido'} a {destino or 'Destino no definido'}.",
+        f"📦 Volumen: {valores['volumen_m3'] or 0} m³, Peso total: {valores['peso_total_kg'] or 0} kg",
+        f"📝 Tareas pendientes: {', '.join(tareas) if tareas else 'Ninguna'}",
+        f"🤖 Predicción de entrega a tiempo: 90-95%",
+        f"⚠️ Nivel de riesgo: {riesgo}"
+    ]
+
+    # Agregar recomendaciones específicas basadas en datos disponibles
+    if not valores["etd"] and not eta:
+        recomendaciones.append("⏰ Complete las fechas ETD/ETA para mejorar la precisión de las predicciones")
+
+    for hallazgo in evaluacion["hallazgos"]:
+        if hallazgo["tipo"] == "incoterm":
+            recomendaciones.append(f"📑 {hallazgo['mensaje']}")
+
+    if valores["equipo"]:
+        recomendaciones.append(f"🚚 Equipo asignado: {valores['equipo']}")
+
+    return {
+        "recomendaciones": recomendaciones,
+        "tareas": tareas,
+        "riesgo": riesgo,
+        "fecha_estimada": eta or "Pendiente"
+    }
+
 @app.get("/ia/recomendaciones/{codigo_operacion:path}")
 async def obtener_recomendaciones(codigo_operacion: str):
     """
     Devuelve recomendaciones IA basadas en la operación y su cotización.
     """
     try:
-        logger.info(f"🤖 Solicitando recomendaciones IA para: {codigo_operacion}")
+        logger.info("🤖 Solicitando recomendaciones IA para: %s", codigo_operacion)
         
         if supabase is None:
             raise HTTPException(status_code=503, detail="Base de datos no disponible")
 
         # 1️⃣ Obtener operación
         op_resp = supabase.table("operaciones").select("*").eq("codigo_operacion", codigo_operacion).execute()
-        logger.info(f"📊 Operación encontrada: {len(op_resp.data) if op_resp.data else 0}")
+        logger.info("📊 Operación encontrada: %s", len(op_resp.data) if op_resp.data else 0)
         
         if not op_resp.data:
             raise HTTPException(status_code=404, detail="Operación no encontrada")
         
         operacion = op_resp.data[0]
         datos = operacion.get("datos_cotizacion", {})
-        logger.info(f"📦 Datos operación: {datos}")
+        logger.debug("📦 Datos operación: %s", datos)
 
         # 2️⃣ Obtener cotización origen (para datos faltantes o duplicados)
-        cotizacion_origen = operacion.get("cotizacion_origen")
-        cotizacion = {}
-        
-        if cotizacion_origen:
-            cot_resp = supabase.table("cotizaciones").select("*").eq("codigo_legible", cotizacion_origen).execute()
-            if cot_resp.data:
-                cotizacion = cot_resp.data[0]
-                logger.info(f"✅ Cotización origen encontrada: {cotizacion_origen}")
-            else:
-                logger.warning(f"⚠️ Cotización origen no encontrada: {cotizacion_origen}")
-
-        # 3️⃣ Completar datos para IA
-        equipo = datos.get("equipo") or cotizacion.get("equipo")
-        origen = datos.get("origen") or cotizacion.get("origen")
-        destino = datos.get("destino") or cotizacion.get("destino")
-        modo_transporte = datos.get("modo_transporte") or cotizacion.get("modo_transporte")
-        volumen_m3 = datos.get("volumen_m3") or cotizacion.get("volumen_m3") or 0
-        peso_total_kg = datos.get("peso_total_kg") or cotizacion.get("peso_total_kg") or 0
-        incoterm_origen = datos.get("incoterm_origen") or cotizacion.get("incoterm_origen")
-        incoterm_destino = datos.get("incoterm_destino") or cotizacion.get("incoterm_destino")
-        etd = datos.get("etd")
-        eta = datos.get("eta")
-        fecha_carga = datos.get("fecha_carga")
-        fecha_descarga = datos.get("fecha_descarga")
-
-        logger.info(f"🔍 Datos completados - Origen: {origen}, Destino: {destino}, Equipo: {equipo}")
-
-        # 4️⃣ Simulación de IA (aquí se puede reemplazar con modelo real)
-        tareas = []
-        if not fecha_carga:
-            tareas.append("Registrar fecha efectiva de carga")
-        if not fecha_descarga:
-            tareas.append("Registrar fecha efectiva de descarga")
-        if not etd:
-            tareas.append("Confirmar ETD con transportista")
-        if not eta:
-            tareas.append("Estimación de ETA pendiente")
-
-        recomendaciones = [
-            f"💡 Operación con transporte {modo_transporte or 'No especificado'} de {origen or 'Origen no definido'} a {destino or 'Destino no definido'}.",
-            f"📦 Volumen: {volumen_m3} m³, Peso total: {peso_total_kg} kg",
-            f"📝 Tareas pendientes: {', '.join(tareas) if tareas else 'Ninguna'}",
-            f"🤖 Predicción de entrega a tiempo: 90-95%",
-            f"⚠️ Nivel de riesgo: Bajo"
-        ]
-
-        # Agregar recomendaciones específicas basadas en datos disponibles
-        if not etd and not eta:
-            recomendaciones.append("⏰ Complete las fechas ETD/ETA para mejorar la precisión de las predicciones")
-        
-        if equipo:
-            recomendaciones.append(f"🚚 Equipo asignado: {equipo}")
+        cotizacion = leer_cotizacion_origen(operacion)
 
-        logger.info(f"✅ Recomendaciones generadas: {len(recomendaciones)}")
+        # 3️⃣ Recomendaciones a partir de las reglas sobre la operación y su cotización
+        resultado = generar_recomendaciones(motor_reglas.evaluar(datos, cotizacion))
+        logger.info("✅ Recomendaciones generadas: %s", len(resultado['recomendaciones']))
 
-        return {
-            "operacion": operacion,
-            "cotizacion": cotizacion,
-            "recomendaciones": recomendaciones,
-            "tareas": tareas,
-            "riesgo": "Bajo",
-            "fecha_estimada": eta or "Pendiente"
-        }
+        return {"operacion": operacion, "cotizacion": cotizacion, **resultado}
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception(f"❌ ERROR en obtener_recomendaciones: {e}")
+        logger.exception("❌ ERROR en obtener_recomendaciones: %s", e)
         raise HTTPException(status_code=500, detail=f"Error generando recomendaciones: {str(e)}")
     
 
 
+def analizar_datos_faltantes(codigo_operacion: str, evaluacion: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos críticos para la IA que faltan en la operación (completando desde la cotización origen)."""
+    contexto = evaluacion["contexto"]
+    campos_criticos = CAMPOS_CRITICOS_OPERACION
+
+    # Verificar datos faltantes (los valores ya vienen completados desde la cotización)
+    datos_faltantes = []
+    datos_completados = []
+
+    for campo, info in campos_criticos.items():
+        valor_actual = contexto.valores[campo]
+
+        if contexto.fuentes[campo] == "cotizacion":
+            datos_completados.append({
+                'campo': campo,
+                'nombre': info['nombre'],
+                'valor': valor_actual,
+                'fuente': 'cotizacion'
+            })
+
+        if not valor_actual:
+            datos_faltantes.append({
+                'campo': campo,
+                'nombre': info['nombre'],
+                'tipo': info['tipo'],
+                'critico': info.get('critico', False)  # Campos más críticos
+            })
+
+    # Calcular porcentaje de completitud
+    total_campos = len(campos_criticos)
+    campos_completos = total_campos - len(datos_faltantes)
+    porcentaje_completitud = (campos_completos / total_campos) * 100 if total_campos > 0 else 0
+
+    # Determinar nivel de alerta
+    if porcentaje_completitud < 50:
+        nivel_alerta = "alto"
+        mensaje_alerta = "⚠️ Datos críticos faltantes. Complete la información para habilitar predicciones de IA."
+    elif porcentaje_completitud < 80:
+        nivel_alerta = "medio" 
+        mensaje_alerta = "ℹ️ Algunos datos importantes faltan. Mejore la precisión de las predicciones completando la información."
+    else:
+        nivel_alerta = "bajo"
+        mensaje_alerta = "✅ Datos suficientes para predicciones básicas."
+
+    return {
+        "operacion_codigo": codigo_operacion,
+        "porcentaje_completitud": round(porcentaje_completitud, 1),
+        "nivel_alerta": nivel_alerta,
+        "mensaje_alerta": mensaje_alerta,
+        "datos_faltantes": datos_faltantes,
+        "datos_completados": datos_completados,
+        "total_campos": total_campos,
+        "campos_completos": campos_completos
+    }
+
 @app.get("/ia/datos-faltantes/{codigo_operacion:path}")
 async def obtener_datos_faltantes(codigo_operacion: str):
     """
     Detecta datos faltantes críticos para las predicciones de IA
     """
     try:
-        logger.info(f"🔍 Analizando datos faltantes para: {codigo_operacion}")
+        logger.info("🔍 Analizando datos faltantes para: %s", codigo_operacion)
         
         if supabase is None:
             raise HTTPException(status_code=503, detail="Base de datos no disponible")
 
         # 1. Obtener operación
         op_resp = supabase.table("operaciones").select("*").eq("codigo_operacion", codigo_operacion).execute()
-        logger.info(f"📊 Respuesta operación: {len(op_resp.data) if op_resp.data else 0} registros")
+        logger.info("📊 Respuesta operación: %s registros", len(op_resp.data) if op_resp.data else 0)
         
         if not op_resp.data:
             raise HTTPException(status_code=404, detail="Operación no encontrada")
         
         operacion = op_resp.data[0]
         datos = operacion.get("datos_cotizacion", {})
-        logger.info(f"📦 Datos cotización: {datos}")
+        logger.debug("📦 Datos cotización: %s", datos)
         
         # 2. Obtener cotización origen para completar datos
-        cotizacion_origen = operacion.get("cotizacion_origen")
-        logger.info(f"🔗 Cotización origen: {cotizacion_origen}")
-        
-        cotizacion = {}
-        if cotizacion_origen:
-            cot_resp = supabase.table("cotizaciones").select("*").eq("codigo_legible", cotizacion_origen).execute()
-            if cot_resp.data:
-                cotizacion = cot_resp.data[0]
-                logger.info(f"✅ Cotización encontrada: {cotizacion_origen}")
-            else:
-                logger.warning(f"⚠️ Cotización origen no encontrada: {cotizacion_origen}")
-
-        # 3. Definir campos críticos para IA
-        campos_criticos = {
-            'etd': {'nombre': 'ETD (Estimated Time of Departure)', 'tipo': 'date'},
-            'eta': {'nombre': 'ETA (Estimated Time of Arrival)', 'tipo': 'date'},
-            'fecha_carga': {'nombre': 'Fecha efectiva de carga', 'tipo': 'date'},
-            'fecha_descarga': {'nombre': 'Fecha efectiva de descarga', 'tipo': 'date'},
-            'equipo': {'nombre': 'Equipo/Contenedor', 'tipo': 'text'},
-            'origen': {'nombre': 'Origen', 'tipo': 'text'},
-            'destino': {'nombre': 'Destino', 'tipo': 'text'},
-            'volumen_m3': {'nombre': 'Volumen (m³)', 'tipo': 'number'},
-            'peso_total_kg': {'nombre': 'Peso total (kg)', 'tipo': 'number'},
-            'incoterm_origen': {'nombre': 'Incoterm Origen', 'tipo': 'text'},
-            'incoterm_destino': {'nombre': 'Incoterm Destino', 'tipo': 'text'}
-        }
-        
-        # 4. Verificar datos faltantes
-        datos_faltantes = []
-        datos_completados = []
-        
-        for campo, info in campos_criticos.items():
-            valor_actual = datos.get(campo)
-            
-            # Si no está en datos_cotizacion, buscar en cotización
-            if not valor_actual and campo in ['equipo', 'origen', 'destino', 'volumen_m3', 'peso_total_kg', 'incoterm_origen', 'incoterm_destino']:
-                valor_actual = cotizacion.get(campo)
-                if valor_actual:
-                    datos_completados.append({
-                        'campo': campo,
-                        'nombre': info['nombre'],
-                        'valor': valor_actual,
-                        'fuente': 'cotizacion'
-                    })
-                    logger.info(f"✅ Campo {campo} completado desde cotización: {valor_actual}")
-            
-            # Verificar si el campo sigue vacío
-            if not valor_actual:
-                datos_faltantes.append({
-                    'campo': campo,
-                    'nombre': info['nombre'],
-                    'tipo': info['tipo'],
-                    'critico': campo in ['etd', 'eta', 'fecha_carga', 'origen', 'destino']  # Campos más críticos
-                })
-                logger.info(f"❌ Campo {campo} faltante")
-            else:
-                logger.info(f"✅ Campo {campo} presente: {valor_actual}")
-        
-        # 5. Calcular porcentaje de completitud
-        total_campos = len(campos_criticos)
-        campos_completos = total_campos - len(datos_faltantes)
-        porcentaje_completitud = (campos_completos / total_campos) * 100 if total_campos > 0 else 0
-        
-        # 6. Determinar nivel de alerta
-        if porcentaje_completitud < 50:
-            nivel_alerta = "alto"
-            mensaje_alerta = "⚠️ Datos críticos faltantes. Complete la información para habilitar predicciones de IA."
-        elif porcentaje_completitud < 80:
-            nivel_alerta = "medio" 
-            mensaje_alerta = "ℹ️ Algunos datos importantes faltan. Mejore la precisión de las predicciones completando la información."
-        else:
-            nivel_alerta = "bajo"
-            mensaje_alerta = "✅ Datos suficientes para predicciones básicas."
+        cotizacion = leer_cotizacion_origen(operacion)
 
-        logger.info(f"📈 Análisis completado: {porcentaje_completitud}% - {nivel_alerta}")
+        # 3. Analizar campos críticos para IA
+        resultado = analizar_datos_faltantes(codigo_operacion, motor_reglas.evaluar(datos, cotizacion))
+        logger.info("📈 Análisis completado: %s%% - %s", resultado['porcentaje_completitud'], resultado['nivel_alerta'])
 
-        return {
-            "operacion_codigo": codigo_operacion,
-            "porcentaje_completitud": round(porcentaje_completitud, 1),
-            "nivel_alerta": nivel_alerta,
-            "mensaje_alerta": mensaje_alerta,
-            "datos_faltantes": datos_faltantes,
-            "datos_completados": datos_completados,
-            "total_campos": total_campos,
-            "campos_completos": campos_completos
-        }
+        return resultado
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception(f"❌ ERROR CRÍTICO en obtener_datos_faltantes: {e}")
+        logger.exception("❌ ERROR CRÍTICO en obtener_datos_faltantes: %s", e)
         raise HTTPException(status_code=500, detail=f"Error analizando datos: {str(e)}")
     
 
 
 
+# -----------------------
+# Workspace de operación (todo en un request)
+# -----------------------
+# Al abrir una operación el frontend pedía por separado la operación, checklist, archivos,
+# estadísticas, alertas, recomendaciones y datos faltantes; cada uno volvía a leer la fila
+# de operaciones y varios también la cotización origen. Acá se lee la operación una vez y,
+# en paralelo, cotización origen, checklist y carpeta; las secciones de IA se calculan en
+# memoria. Si una sección falla, las demás se devuelven igual y el error queda en "errores".
+
+@app.get("/operaciones/{codigo_operacion:path}/workspace", response_class=RespuestaJSONRapida)
+async def obtener_workspace_operacion(codigo_operacion: str):
+    """Operación + cotización origen + checklist + archivos + estadísticas + IA en una sola respuesta."""
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Base de datos no disponible")
+
+    try:
+        op_resp = await asyncio.to_thread(
+            lambda: supabase.table("operaciones").select("*").eq("codigo_operacion", codigo_operacion).limit(1).execute()
+        )
+    except Exception as e:
+        logger.exception("Error obteniendo operación %s para workspace: %s", codigo_operacion, e)
+        raise HTTPException(status_code=500, detail=f"Error al obtener operación: {str(e)}")
+    if not op_resp.data:
+        raise HTTPException(status_code=404, detail="Operación no encontrada")
+
+    operacion = op_resp.data[0]
+    datos = operacion.get("datos_cotizacion") or {}
+    cotizacion_origen = operacion.get("cotizacion_origen")
+
+    def leer_cotizacion() -> Dict[str, Any]:
+        if not cotizacion_origen:
+            return {}
+        cot_resp = supabase.table("cotizaciones").select("*").eq("codigo_legible", cotizacion_origen).limit(1).execute()
+        return cot_resp.data[0] if cot_resp.data else {}
+
+    def leer_checklist() -> List[Dict[str, Any]]:
+        response = supabase.table("operacion_checklist").select("*") \
+            .eq("codigo_operacion", codigo_operacion) \
+            .order("fecha_creacion", desc=False) \
+            .execute()
+        return response.data or []
+
+    tarea_cotizacion = asyncio.ensure_future(asyncio.to_thread(leer_cotizacion))
+
+    async def leer_archivos() -> Optional[Dict[str, Any]]:
+        # La carpeta lleva el código de la cotización que tiene asignada esta operación; casi
+        # siempre es la cotización origen que ya se está leyendo, si no se consulta aparte.
+        try:
+            cotizacion = await tarea_cotizacion
+        except Exception:
+            cotizacion = {}
+        if cotizacion.get("codigo_operacion") == codigo_operacion and cotizacion.get("codigo_legible"):
+            codigo_folder = cotizacion["codigo_legible"]
+        else:
+            codigo_folder = await asyncio.to_thread(buscar_carpeta_operacion, codigo_operacion)
+        return await asyncio.to_thread(listar_archivos_operacion, codigo_operacion, codigo_folder)
+
+    cotizacion, checklist, archivos = await asyncio.gather(
+        tarea_cotizacion, asyncio.to_thread(leer_checklist), leer_archivos(), return_exceptions=True
+    )
+
+    errores: Dict[str, str] = {}
+    for seccion, valor in (("cotizacion", cotizacion), ("checklist", checklist), ("archivos", archivos)):
+        if isinstance(valor, Exception):
+            logger.warning("⚠️ Workspace %s: falló la sección %s: %s", codigo_operacion, seccion, valor)
+            errores[seccion] = str(valor)
+    if "cotizacion" in errores:
+        cotizacion = {}
+    if "checklist" in errores:
+        checklist = None
+    if "archivos" in errores:
+        archivos = None
+
+    def seccion(nombre: str, calcular: Callable[[], Any]) -> Any:
+        try:
+            return calcular()
+        except Exception as e:
+            logger.warning("⚠️ Workspace %s: falló la sección %s: %s", codigo_operacion, nombre, e)
+            errores[nombre] = str(e)
+            return None
+
+    estadisticas = None
+    if checklist is not None and "archivos" not in errores:
+        estadisticas = seccion("estadisticas", lambda: calcular_estadisticas_operacion(
+            len(checklist),
+            sum(1 for tarea in checklist if tarea.get("completada")),
+            {nombre: len((archivos or {}).get("subcarpetas", {}).get(nombre, [])) for nombre in SUBCARPETAS_OPERACION},
+            hitos_operacion(datos),
+        ))
+
+    # Una sola evaluación de reglas para las tres secciones de IA
+    evaluacion = seccion("reglas", lambda: motor_reglas.evaluar(datos, cotizacion))
+    secciones_ia = {"alertas": None, "recomendaciones": None, "datos_faltantes": None}
+    if evaluacion is not None:
+        secciones_ia = {
+            "alertas": seccion("alertas", lambda: generar_alertas_proactivas(evaluacion)),
+            "recomendaciones": seccion("recomendaciones", lambda: generar_recomendaciones(evaluacion)),
+            "datos_faltantes": seccion("datos_faltantes", lambda: analizar_datos_faltantes(codigo_operacion, evaluacion)),
+        }
+
+    return {
+        "operacion": operacion,
+        "cotizacion": cotizacion,
+        "checklist": checklist,
+        "archivos": archivos,
+        "estadisticas": estadisticas,
+        **secciones_ia,
+        "errores": errores,
+    }
+
 @app.put("/checklist/{item_id}")
 async def update_checklist_item(item_id: str, item_update: ChecklistItemUpdate):
     """Actualizar una tarea (marcar como completada)"""
@@ -3085,7 +5346,7 @@ async def update_checklist_item(item_id: str, item_update: ChecklistItemUpdate):
         if supabase is None:
             raise HTTPException(status_code=503, detail="Base de datos no disponible")
             
-        update_data = item_update.dict(exclude_unset=True)
+        update_data = item_update.model_dump(exclude_unset=True)
         
         response = supabase.table("operacion_checklist").update(update_data).eq("id", item_id).execute()
         
@@ -3114,7 +5375,48 @@ async def delete_checklist_item(item_id: str):
         logger.exception("Error eliminando tarea: %s", e)
         raise HTTPException(status_code=500, detail=f"Error al eliminar tarea: {str(e)}")
 
-@app.post("/cotizaciones/cambiar-estado")
+@app.get("/checklist/plantillas")
+def obtener_plantilla_checklist(tipo_operacion: Optional[str] = None, modo_transporte: Optional[str] = None):
+    """Tareas con las que se crea el checklist de una operación de ese tipo y modo."""
+    return {
+        "tipo_operacion": tipo_operacion,
+        "modo_transporte": modo_transporte,
+        "tareas": tareas_plantilla(tipo_operacion, modo_transporte),
+    }
+
+def aplicar_checklist_lote(ids: List[str], completada: Optional[bool]) -> Dict[str, Any]:
+    """Completa/descompleta (completada=True/False) o elimina (None) varias tareas en una sola sentencia."""
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Base de datos no disponible")
+    ids = list(dict.fromkeys(ids))
+    tabla = supabase.table("operacion_checklist")
+    consulta = tabla.delete() if completada is None else tabla.update({"completada": completada})
+    try:
+        afectadas = {fila["id"] for fila in consulta.in_("id", ids).execute().data or []}
+    except Exception as e:
+        logger.exception("Error en operación de checklist en lote: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error al actualizar tareas: {str(e)}")
+    accion = "eliminadas" if completada is None else "completadas" if completada else "marcadas como pendientes"
+    return {
+        "mensaje": f"{len(afectadas)} tareas {accion}",
+        "solicitadas": len(ids),
+        "afectadas": len(afectadas),
+        "no_encontradas": [i for i in ids if i not in afectadas],
+    }
+
+@app.post("/checklist/lote/completar", response_model=RespuestaChecklistLote)
+def completar_checklist_lote(solicitud: SolicitudChecklistLote):
+    return aplicar_checklist_lote(solicitud.ids, True)
+
+@app.post("/checklist/lote/descompletar", response_model=RespuestaChecklistLote)
+def descompletar_checklist_lote(solicitud: SolicitudChecklistLote):
+    return aplicar_checklist_lote(solicitud.ids, False)
+
+@app.post("/checklist/lote/eliminar", response_model=RespuestaChecklistLote)
+def eliminar_checklist_lote(solicitud: SolicitudChecklistLote):
+    return aplicar_checklist_lote(solicitud.ids, None)
+
+@app.post("/cotizaciones/cambiar-estado", response_model=RespuestaCambioEstado)
 async def cambiar_estado(request: CambioEstadoRequest, background_tasks: BackgroundTasks):
     try:
         if request.nuevo_estado not in ESTADOS_COTIZACION:
@@ -3124,7 +5426,8 @@ async def cambiar_estado(request: CambioEstadoRequest, background_tasks: Backgro
 
         response = supabase.table("cotizaciones").update({
             "estado": request.nuevo_estado,
-            "fecha_estado": datetime.now().isoformat()
+            "fecha_estado": datetime.now().isoformat(),
+            "fecha_actualizacion": datetime.now().isoformat()
         }).eq("codigo_legible", request.codigo_legible).execute()
 
         if not response or not response.data:
@@ -3132,9 +5435,9 @@ async def cambiar_estado(request: CambioEstadoRequest, background_tasks: Backgro
 
         # ✅ ¡AQUÍ ESTÁ EL TRIGGER!
         if request.nuevo_estado == "aceptada":
-            logger.info(f"Disparando creación de operación para: {request.codigo_legible}")
+            logger.info("Disparando creación de operación para: %s", request.codigo_legible)
             # Usamos background_tasks para no retrasar la respuesta al usuario
-            background_tasks.add_task(crear_operacion_automatica, request.codigo_legible)
+            background_tasks.add_task(crear_operacion_automatica, request.codigo_legible, response.data[0])
 
         background_tasks.add_task(enviar_notificacion, response.data[0], f"cambio_estado_{request.nuevo_estado}", f"Cambio de estado a {request.nuevo_estado}")
 
@@ -3145,13 +5448,68 @@ async def cambiar_estado(request: CambioEstadoRequest, background_tasks: Backgro
         logger.exception("Error cambiando estado: %s", e)
         raise HTTPException(status_code=500, detail=f"Error cambiando estado: {str(e)}")
 
+def crear_operaciones_automaticas(cotizaciones: List[Dict[str, Any]]):
+    """Conversión de varias cotizaciones aceptadas en una sola tarea de fondo (una RPC por cotización)."""
+    creadas = [crear_operacion_automatica(cot["codigo_legible"], cot) for cot in cotizaciones]
+    logger.info("Operaciones para %s cotizaciones aceptadas: %s listas", len(cotizaciones), sum(1 for c in creadas if c))
+
+@app.post("/cotizaciones/cambiar-estado/lote", response_model=RespuestaCambioEstadoLote)
+def cambiar_estado_lote(request: CambioEstadoLoteRequest, background_tasks: BackgroundTasks):
+    """
+    Cambia el estado de varias cotizaciones con un solo UPDATE ... WHERE codigo_legible IN (...).
+    Las que ya estaban en ese estado no se tocan ni notifican. Notificaciones y operaciones
+    (si el estado es "aceptada") se generan en lote, en segundo plano.
+    """
+    if request.nuevo_estado not in ESTADOS_COTIZACION:
+        raise HTTPException(status_code=400, detail="Estado no válido.")
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Base de datos no disponible")
+
+    codigos = list(dict.fromkeys(c.strip() for c in request.codigos if c and c.strip()))
+    if not codigos:
+        raise HTTPException(status_code=400, detail="No se indicaron cotizaciones.")
+    ahora = datetime.now().isoformat()
+    try:
+        query = supabase.table("cotizaciones").update({
+            "estado": request.nuevo_estado,
+            "fecha_estado": ahora,
+            "fecha_actualizacion": ahora
+        }).in_("codigo_legible", codigos)
+        cambiadas = filtro_or(query, f"estado.is.null,estado.neq.{request.nuevo_estado}").execute().data or []
+
+        actualizadas = {cot["codigo_legible"] for cot in cambiadas}
+        restantes = [c for c in codigos if c not in actualizadas]
+        existentes = set()
+        if restantes:
+            existentes = {fila["codigo_legible"] for fila in supabase.table("cotizaciones").select("codigo_legible")
+                          .in_("codigo_legible", restantes).execute().data or []}
+    except Exception as e:
+        logger.exception("Error cambiando estado en lote: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error cambiando estado: {str(e)}")
+
+    if cambiadas:
+        background_tasks.add_task(enviar_notificaciones, cambiadas, f"cambio_estado_{request.nuevo_estado}",
+                                  f"Cambio de estado a {request.nuevo_estado}")
+        if request.nuevo_estado == "aceptada":
+            logger.info("Disparando creación de operaciones para %s cotizaciones", len(cambiadas))
+            background_tasks.add_task(crear_operaciones_automaticas, cambiadas)
+
+    return {
+        "mensaje": f"{len(cambiadas)} cotizaciones cambiadas a {request.nuevo_estado}",
+        "estado": request.nuevo_estado,
+        "color": ESTADOS_COTIZACION[request.nuevo_estado]['color'],
+        "actualizadas": [c for c in codigos if c in actualizadas],
+        "sin_cambios": [c for c in restantes if c in existentes],
+        "no_encontradas": [c for c in restantes if c not in existentes],
+    }
+
 @app.put("/operaciones/{codigo_operacion:path}")
-async def actualizar_operacion(codigo_operacion: str, datos_actualizados: dict):
+async def actualizar_operacion(codigo_operacion: str, datos_actualizados: OperacionActualizacion, background_tasks: BackgroundTasks):
     """
     Actualizar los datos de una operación existente
     """
     try:
-        logger.info(f"🔄 Actualizando operación: {codigo_operacion}")
+        logger.info("🔄 Actualizando operación: %s", codigo_operacion)
         
         if supabase is None:
             raise HTTPException(status_code=503, detail="Base de datos no disponible")
@@ -3163,27 +5521,27 @@ async def actualizar_operacion(codigo_operacion: str, datos_actualizados: dict):
             raise HTTPException(status_code=404, detail="Operación no encontrada")
         
         operacion_actual = op_resp.data[0]
-        logger.info(f"📋 Operación actual: {operacion_actual.get('codigo_operacion')}")
+        logger.info("📋 Operación actual: %s", operacion_actual.get('codigo_operacion'))
         
         # Preparar datos para actualizar
         update_data = {}
         
         # Actualizar datos_cotizacion si se proporciona
-        if 'datos_cotizacion' in datos_actualizados:
+        if datos_actualizados.datos_cotizacion is not None:
             datos_actuales = operacion_actual.get('datos_cotizacion', {}) or {}
-            nuevos_datos = datos_actualizados['datos_cotizacion']
+            nuevos_datos = datos_actualizados.datos_cotizacion
             
             # Fusionar los datos existentes con los nuevos
             datos_fusionados = {**datos_actuales, **nuevos_datos}
             update_data['datos_cotizacion'] = datos_fusionados
             
-            logger.info(f"📦 Datos cotización actualizados: {list(nuevos_datos.keys())}")
-            logger.info(f"🔍 Valores actualizados: {nuevos_datos}")
+            logger.info("📦 Datos cotización actualizados: %s", list(nuevos_datos.keys()))
+            logger.debug("🔍 Valores actualizados: %s", nuevos_datos)
         
         # Actualizar fecha_actualizacion
         update_data['fecha_actualizacion'] = datetime.now().isoformat()
         
-        logger.info(f"💾 Ejecutando UPDATE en Supabase: {update_data}")
+        logger.debug("💾 Ejecutando UPDATE en Supabase: %s", list(update_data))
         
         # Realizar la actualización en Supabase
         response = supabase.table("operaciones").update(update_data).eq("codigo_operacion", codigo_operacion).execute()
@@ -3194,19 +5552,19 @@ async def actualizar_operacion(codigo_operacion: str, datos_actualizados: dict):
         
         operacion_actualizada = response.data[0]
         
-        logger.info(f"✅ Operación actualizada exitosamente: {codigo_operacion}")
-        logger.info(f"📊 Nuevos datos_cotizacion: {operacion_actualizada.get('datos_cotizacion', {})}")
+        logger.info("✅ Operación actualizada exitosamente: %s", codigo_operacion)
+        background_tasks.add_task(reevaluar_alertas_operacion, codigo_operacion)
         
         return {
             "mensaje": "Operación actualizada exitosamente",
             "operacion": operacion_actualizada,
-            "campos_actualizados": list(datos_actualizados.get('datos_cotizacion', {}).keys())
+            "campos_actualizados": list((datos_actualizados.datos_cotizacion or {}).keys())
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception(f"❌ ERROR actualizando operación: {e}")
+        logger.exception("❌ ERROR actualizando operación: %s", e)
         raise HTTPException(status_code=500, detail=f"Error actualizando operación: {str(e)}")
 
 
@@ -3214,15 +5572,91 @@ async def actualizar_operacion(codigo_operacion: str, datos_actualizados: dict):
 # Endpoints de Operaciones
 # -----------------------
 
-@app.get("/operaciones")
-async def listar_operaciones():
-    """Obtener lista de todas las operaciones"""
+# Listado paginado: orden (fecha_creacion, id) descendente con cursor keyset (ver migrations/007).
+# Sin limit se mantiene la respuesta anterior (todas las operaciones, select *).
+OPERACIONES_PAGINA_MAXIMA = 200
+COLUMNAS_OPERACION_LISTADO = "id,codigo_operacion,cotizacion_origen,cliente,tipo_operacion,estado,fecha_creacion,fecha_actualizacion"
+RESUMEN_COTIZACION_ORIGEN = "cotizaciones(modo_transporte,origen,destino,equipo)"
+
+def filtro_or(query, condiciones: str):
+    """Filtro or=(...) de PostgREST; postgrest-py 0.11 (supabase 1.1.1) todavía no tiene .or_()."""
+    if hasattr(query, "or_"):
+        return query.or_(condiciones)
+    query.params = query.params.add("or", f"({condiciones})")
+    return query
+
+def codificar_cursor_operaciones(fila: Dict[str, Any]) -> str:
+    crudo = json.dumps([fila.get("fecha_creacion"), fila.get("id")], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+def decodificar_cursor_operaciones(cursor: str) -> Tuple[Optional[str], str]:
+    """(fecha_creacion, id) del cursor; fecha None si la última fila de la página no tenía fecha_creacion."""
+    try:
+        fecha, id_operacion = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if id_operacion is None:
+            raise ValueError("cursor sin id")
+        return (None if fecha is None else str(fecha)), str(id_operacion)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def filtro_siguiente_pagina_operaciones(fecha: Optional[str], id_operacion: str) -> str:
+    """Condición "después del cursor" para el orden fecha_creacion.desc.nullslast,id.desc."""
+    if fecha is None:
+        # Ya estamos en el tramo final de operaciones sin fecha_creacion: solo queda bajar por id
+        return f'and(fecha_creacion.is.null,id.lt."{id_operacion}")'
+    return f'fecha_creacion.lt."{fecha}",and(fecha_creacion.eq."{fecha}",id.lt."{id_operacion}"),fecha_creacion.is.null'
+
+@app.get("/operaciones", response_class=RespuestaJSONRapida)
+def listar_operaciones(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    estado: Optional[str] = None,
+    cliente: Optional[str] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    incluir_datos: bool = False,
+):
+    """
+    Operaciones, más nuevas primero. Con limit devuelve una página {operaciones, siguiente_cursor}:
+    estado acepta varios valores separados por coma, cliente busca por texto parcial y
+    desde/hasta filtran por fecha de creación. Cada operación trae el resumen de su cotización
+    origen en "cotizacion"; datos_cotizacion solo con incluir_datos=true.
+    """
     try:
         if supabase is None:
             raise HTTPException(status_code=503, detail="Base de datos no disponible")
-        
-        response = supabase.table("operaciones").select("*").order("fecha_creacion", desc=True).execute()
-        return response.data or []
+
+        if limit is None and cursor is None:
+            response = supabase.table("operaciones").select("*").order("fecha_creacion", desc=True).execute()
+            return RespuestaJSONRapida(response.data or [])
+
+        limit = max(1, min(limit or 50, OPERACIONES_PAGINA_MAXIMA))
+        columnas = COLUMNAS_OPERACION_LISTADO + (",datos_cotizacion" if incluir_datos else "")
+        query = supabase.table("operaciones").select(f"{columnas},{RESUMEN_COTIZACION_ORIGEN}")
+        if estado:
+            query = query.in_("estado", [e.strip() for e in estado.split(",") if e.strip()])
+        if cliente:
+            query = query.ilike("cliente", f"%{cliente}%")
+        if desde:
+            query = query.gte("fecha_creacion", desde.isoformat())
+        if hasta:
+            query = query.lt("fecha_creacion", (hasta + timedelta(days=1)).isoformat())
+        if cursor:
+            fecha, id_operacion = decodificar_cursor_operaciones(cursor)
+            query = filtro_or(query, filtro_siguiente_pagina_operaciones(fecha, id_operacion))
+
+        # Un solo parámetro order: postgrest-py 0.11 repite "order" en cada .order() y PostgREST usa uno solo.
+        # Las operaciones sin fecha_creacion van al final (nullslast) y el cursor las recorre por id.
+        filas = query.order("fecha_creacion.desc.nullslast,id", desc=True).limit(limit + 1).execute().data or []
+        for fila in filas:
+            fila["cotizacion"] = fila.pop("cotizaciones", None)
+
+        return RespuestaJSONRapida({
+            "operaciones": filas[:limit],
+            "siguiente_cursor": codificar_cursor_operaciones(filas[limit - 1]) if len(filas) > limit else None,
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Error listando operaciones: %s", e)
         raise HTTPException(status_code=500, detail=f"Error al obtener operaciones: {str(e)}")
@@ -3255,78 +5689,12 @@ async def actualizar_operacion(codigo_operacion: str, update_data: dict):
         if not response.data:
             raise HTTPException(status_code=404, detail="Operación no encontrada para actualizar")
             
-        logger.info(f"Operación actualizada: {codigo_operacion}")
+        logger.info("Operación actualizada: %s", codigo_operacion)
         return response.data[0]
     except Exception as e:
         logger.exception("Error actualizando operación: %s", e)
         raise HTTPException(status_code=500, detail=f"Error al actualizar operación: {str(e)}")
 
-# CÓDIGO A AGREGAR AL FINAL DE TU MAIN.PY:
-
-@app.get("/clientes/{cliente_id}/cotizaciones")
-async def obtener_cotizaciones_por_cliente(cliente_id: str):
-    """
-    Obtiene todas las cotizaciones asociadas a un cliente específico por su ID.
-    """
-    try:
-        # Nota: La tabla 'cotizaciones' usa el 'nombre' del cliente,
-        # pero la solicitud usa el 'id' (UUID).
-        # Primero, buscamos el nombre del cliente usando el ID.
-        cliente_response = supabase.table("clientes").select("nombre").eq("id", cliente_id).single().execute()
-        
-        if not cliente_response.data:
-            raise HTTPException(status_code=404, detail="Cliente no encontrado")
-            
-        nombre_cliente = cliente_response.data['nombre']
-        
-        # Luego, buscamos las cotizaciones usando el nombre del cliente (asumiendo que así está en la tabla cotizaciones)
-        response = supabase.table("cotizaciones") \
-            .select("*") \
-            .eq("cliente", nombre_cliente) \
-            .order("fecha_creacion", desc=True) \
-            .execute()
-            
-        return response.data
-        
-    except HTTPException:
-        raise # Re-lanzar el 404 si el cliente no existe
-    except Exception as e:
-        logger.error(f"Error obteniendo cotizaciones para cliente {cliente_id}: {e}")
-        # Asegurarse de que si el error es de Supabase (por ejemplo, single() falla si no encuentra)
-        # se maneje elegantemente.
-        if "PostgrestError" in str(e) or "Row Not Found" in str(e):
-             raise HTTPException(status_code=404, detail="Cliente o datos no encontrados.")
-        raise HTTPException(status_code=500, detail=f"Error interno al obtener cotizaciones por cliente: {str(e)}")
-        @app.get("/api/clientes/{cliente_id}/cotizaciones")
-async def obtener_cotizaciones_por_cliente(cliente_id: str):
-    """
-    Obtiene todas las cotizaciones asociadas a un cliente específico por su ID.
-    """
-    try:
-        # 1. Buscamos el nombre del cliente usando el ID (UUID)
-        cliente_response = supabase.table("clientes").select("nombre").eq("id", cliente_id).single().execute()
-        
-        if not cliente_response.data:
-            raise HTTPException(status_code=404, detail="Cliente no encontrado")
-            
-        nombre_cliente = cliente_response.data['nombre']
-        
-        # 2. Buscamos las cotizaciones usando el nombre
-        response = supabase.table("cotizaciones") \
-            .select("*") \
-            .eq("cliente", nombre_cliente) \
-            .order("fecha_creacion", desc=True) \
-            .execute()
-            
-        return response.data
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error obteniendo cotizaciones para cliente {cliente_id}: {e}")
-        # Asegúrate de importar 'logger' si no lo has hecho
-        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
-
 # -----------------------
 # Main (for local run)
 # -----------------------
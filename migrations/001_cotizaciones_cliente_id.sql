@@ -0,0 +1,10 @@
+-- Vincula las cotizaciones con el cliente por id en lugar del nombre.
+-- Ejecutar en el SQL editor de Supabase y luego correr scripts/backfill_cliente_id.py
+-- para completar las cotizaciones existentes.
+
+ALTER TABLE cotizaciones
+    ADD COLUMN IF NOT EXISTS cliente_id uuid REFERENCES clientes(id);
+
+-- Índice para el historial de un cliente (GET /clientes/{id}/cotizaciones)
+CREATE INDEX IF NOT EXISTS idx_cotizaciones_cliente_id_fecha
+    ON cotizaciones (cliente_id, fecha_creacion DESC);
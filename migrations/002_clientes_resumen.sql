@@ -0,0 +1,161 @@
+-- Resumen por cliente mantenido de forma incremental (GET /clientes/{id}/resumen).
+-- Los triggers aplican solo la diferencia de cada alta, cambio de estado o borrado,
+-- así el dashboard lee una fila por cliente en lugar de recorrer sus cotizaciones.
+-- Requiere 001_cotizaciones_cliente_id.sql.
+
+CREATE TABLE IF NOT EXISTS clientes_resumen (
+    cliente_id uuid PRIMARY KEY REFERENCES clientes(id) ON DELETE CASCADE,
+    total_cotizaciones integer NOT NULL DEFAULT 0,
+    por_estado jsonb NOT NULL DEFAULT '{}'::jsonb,
+    valor_comercial_total numeric NOT NULL DEFAULT 0,
+    valor_comercial_aceptado numeric NOT NULL DEFAULT 0,
+    margen_aceptado numeric NOT NULL DEFAULT 0,
+    ultima_actividad timestamptz
+);
+
+-- Margen (venta - costo) de una cotización según sus costos guardados
+CREATE OR REPLACE FUNCTION margen_cotizacion(p_codigo text)
+RETURNS numeric LANGUAGE sql STABLE AS $$
+    SELECT coalesce(sum(coalesce(venta, 0) - coalesce(costo, 0)), 0)
+    FROM costos_cotizacion
+    WHERE codigo_cotizacion = p_codigo
+$$;
+
+-- Suma (p_signo = 1) o resta (p_signo = -1) el aporte de una cotización al resumen
+CREATE OR REPLACE FUNCTION resumen_cliente_aplicar(
+    p_cliente_id uuid,
+    p_estado text,
+    p_valor numeric,
+    p_margen numeric,
+    p_signo integer
+) RETURNS void LANGUAGE plpgsql AS $$
+DECLARE
+    v_estado text := coalesce(p_estado, 'creada');
+BEGIN
+    IF p_cliente_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO clientes_resumen (cliente_id) VALUES (p_cliente_id)
+    ON CONFLICT (cliente_id) DO NOTHING;
+
+    UPDATE clientes_resumen SET
+        total_cotizaciones = total_cotizaciones + p_signo,
+        por_estado = por_estado || jsonb_build_object(
+            v_estado, coalesce((por_estado ->> v_estado)::integer, 0) + p_signo
+        ),
+        valor_comercial_total = valor_comercial_total + p_signo * coalesce(p_valor, 0),
+        valor_comercial_aceptado = valor_comercial_aceptado
+            + CASE WHEN v_estado = 'aceptada' THEN p_signo * coalesce(p_valor, 0) ELSE 0 END,
+        margen_aceptado = margen_aceptado
+            + CASE WHEN v_estado = 'aceptada' THEN p_signo * coalesce(p_margen, 0) ELSE 0 END,
+        ultima_actividad = now()
+    WHERE cliente_id = p_cliente_id;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION trg_cotizaciones_resumen_cliente()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.estado IS NOT DISTINCT FROM NEW.estado
+       AND OLD.valor_comercial IS NOT DISTINCT FROM NEW.valor_comercial
+       AND OLD.cliente_id IS NOT DISTINCT FROM NEW.cliente_id THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM resumen_cliente_aplicar(
+            OLD.cliente_id, OLD.estado, OLD.valor_comercial,
+            CASE WHEN OLD.estado = 'aceptada' THEN margen_cotizacion(OLD.codigo_legible) ELSE 0 END,
+            -1
+        );
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM resumen_cliente_aplicar(
+            NEW.cliente_id, NEW.estado, NEW.valor_comercial,
+            CASE WHEN NEW.estado = 'aceptada' THEN margen_cotizacion(NEW.codigo_legible) ELSE 0 END,
+            1
+        );
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS cotizaciones_resumen_cliente ON cotizaciones;
+CREATE TRIGGER cotizaciones_resumen_cliente
+    AFTER INSERT OR DELETE OR UPDATE OF estado, valor_comercial, cliente_id ON cotizaciones
+    FOR EACH ROW EXECUTE FUNCTION trg_cotizaciones_resumen_cliente();
+
+-- Los costos de una cotización ya aceptada mueven el margen aceptado del cliente
+CREATE OR REPLACE FUNCTION trg_costos_resumen_cliente()
+RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    v_delta numeric := 0;
+    v_codigo text;
+    v_cliente_id uuid;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        v_delta := v_delta - (coalesce(OLD.venta, 0) - coalesce(OLD.costo, 0));
+        v_codigo := OLD.codigo_cotizacion;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        v_delta := v_delta + (coalesce(NEW.venta, 0) - coalesce(NEW.costo, 0));
+        v_codigo := NEW.codigo_cotizacion;
+    END IF;
+
+    SELECT cliente_id INTO v_cliente_id
+    FROM cotizaciones
+    WHERE codigo_legible = v_codigo AND estado = 'aceptada';
+
+    IF v_cliente_id IS NOT NULL AND v_delta <> 0 THEN
+        UPDATE clientes_resumen
+        SET margen_aceptado = margen_aceptado + v_delta
+        WHERE cliente_id = v_cliente_id;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS costos_cotizacion_resumen_cliente ON costos_cotizacion;
+CREATE TRIGGER costos_cotizacion_resumen_cliente
+    AFTER INSERT OR DELETE OR UPDATE OF costo, venta ON costos_cotizacion
+    FOR EACH ROW EXECUTE FUNCTION trg_costos_resumen_cliente();
+
+-- Reconstrucción completa (carga inicial o corrección). Llamar vía RPC o SQL editor.
+CREATE OR REPLACE FUNCTION recalcular_clientes_resumen()
+RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    v_filas integer;
+BEGIN
+    DELETE FROM clientes_resumen;
+
+    INSERT INTO clientes_resumen (
+        cliente_id, total_cotizaciones, por_estado, valor_comercial_total,
+        valor_comercial_aceptado, margen_aceptado, ultima_actividad
+    )
+    SELECT
+        c.cliente_id,
+        count(*),
+        (SELECT jsonb_object_agg(e.estado, e.cantidad)
+           FROM (SELECT coalesce(estado, 'creada') AS estado, count(*) AS cantidad
+                   FROM cotizaciones
+                  WHERE cliente_id = c.cliente_id
+                  GROUP BY 1) e),
+        coalesce(sum(c.valor_comercial), 0),
+        coalesce(sum(c.valor_comercial) FILTER (WHERE c.estado = 'aceptada'), 0),
+        coalesce(sum(margen_cotizacion(c.codigo_legible)) FILTER (WHERE c.estado = 'aceptada'), 0),
+        max(greatest(c.fecha_creacion, c.fecha_actualizacion))
+    FROM cotizaciones c
+    WHERE c.cliente_id IS NOT NULL
+    GROUP BY c.cliente_id;
+
+    GET DIAGNOSTICS v_filas = ROW_COUNT;
+    RETURN v_filas;
+END;
+$$;
+
+SELECT recalcular_clientes_resumen();
@@ -0,0 +1,80 @@
+-- Agregaciones agrupadas para GET /analytics.
+-- El agrupamiento se resuelve en Postgres; la API solo cachea el resultado por intervalo.
+
+CREATE OR REPLACE FUNCTION analytics_cotizaciones(
+    p_dimensiones text[],
+    p_desde timestamptz DEFAULT NULL,
+    p_hasta timestamptz DEFAULT NULL
+)
+RETURNS TABLE (
+    grupo jsonb,
+    total bigint,
+    aceptadas bigint,
+    rechazadas bigint,
+    con_costos bigint,
+    valor_comercial_total numeric,
+    costo_total numeric,
+    venta_total numeric,
+    margen_total numeric,
+    margen_aceptado numeric
+)
+LANGUAGE plpgsql STABLE AS $$
+DECLARE
+    v_dim text;
+    v_expr text;
+    v_partes text[] := '{}';
+    v_grupo text;
+BEGIN
+    -- Solo dimensiones conocidas: nunca se interpola texto del usuario en el SQL
+    FOREACH v_dim IN ARRAY coalesce(p_dimensiones, '{}'::text[]) LOOP
+        v_expr := CASE v_dim
+            WHEN 'tipo_operacion' THEN 'c.tipo_operacion'
+            WHEN 'modo_transporte' THEN 'c.modo_transporte'
+            WHEN 'linea_maritima' THEN 'c.linea_maritima'
+            WHEN 'equipo' THEN 'c.equipo'
+            WHEN 'estado' THEN 'c.estado'
+            WHEN 'cliente' THEN 'c.cliente'
+            WHEN 'mes' THEN 'to_char(c.fecha_creacion, ''YYYY-MM'')'
+        END;
+        IF v_expr IS NULL THEN
+            RAISE EXCEPTION 'Dimensión no soportada: %', v_dim;
+        END IF;
+        v_partes := v_partes || format('%L, %s', v_dim, v_expr);
+    END LOOP;
+
+    v_grupo := CASE
+        WHEN array_length(v_partes, 1) IS NULL THEN '''{}''::jsonb'
+        ELSE 'jsonb_build_object(' || array_to_string(v_partes, ', ') || ')'
+    END;
+
+    RETURN QUERY EXECUTE format($q$
+        SELECT
+            %s AS grupo,
+            count(*),
+            count(*) FILTER (WHERE c.estado = 'aceptada'),
+            count(*) FILTER (WHERE c.estado = 'rechazada'),
+            count(k.costo),
+            coalesce(sum(c.valor_comercial), 0)::numeric,
+            coalesce(sum(k.costo), 0)::numeric,
+            coalesce(sum(k.venta), 0)::numeric,
+            coalesce(sum(k.venta - k.costo), 0)::numeric,
+            coalesce(sum(k.venta - k.costo) FILTER (WHERE c.estado = 'aceptada'), 0)::numeric
+        FROM cotizaciones c
+        LEFT JOIN LATERAL (
+            SELECT sum(cc.costo) AS costo, sum(cc.venta) AS venta
+            FROM costos_cotizacion cc
+            WHERE cc.codigo_cotizacion = c.codigo_legible
+        ) k ON true
+        WHERE ($1 IS NULL OR c.fecha_creacion >= $1)
+          AND ($2 IS NULL OR c.fecha_creacion < $2)
+        GROUP BY 1
+        ORDER BY 2 DESC
+    $q$, v_grupo)
+    USING p_desde, p_hasta;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_costos_cotizacion_codigo
+    ON costos_cotizacion (codigo_cotizacion);
+CREATE INDEX IF NOT EXISTS idx_cotizaciones_fecha_creacion
+    ON cotizaciones (fecha_creacion);
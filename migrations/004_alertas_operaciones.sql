@@ -0,0 +1,21 @@
+-- Alertas precalculadas de operaciones abiertas (GET /alertas).
+-- Las escribe el barrido periódico de la API (un worker a la vez) y la reevaluación que se
+-- dispara al modificar una operación; el dashboard solo lee esta tabla.
+-- Solo hay fila para operaciones con al menos una alerta; el barrido borra las demás.
+
+CREATE TABLE IF NOT EXISTS alertas_operaciones (
+    codigo_operacion text PRIMARY KEY,
+    cliente text,
+    estado text,
+    riesgo text NOT NULL,
+    severidad smallint NOT NULL,          -- nivel más alto: 3 crítico, 2 advertencia
+    puntaje integer NOT NULL,
+    hallazgos jsonb NOT NULL DEFAULT '[]'::jsonb,
+    tareas jsonb NOT NULL DEFAULT '[]'::jsonb,
+    huella text NOT NULL,                 -- hash de hallazgos/tareas: sin cambios no se reescribe
+    evaluado_en timestamptz NOT NULL DEFAULT now()
+);
+
+-- Orden del feed: más severas primero, luego por puntaje
+CREATE INDEX IF NOT EXISTS alertas_operaciones_feed_idx
+    ON alertas_operaciones (severidad DESC, puntaje DESC, codigo_operacion);
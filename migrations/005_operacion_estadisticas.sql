@@ -0,0 +1,109 @@
+-- Estadísticas por operación mantenidas de forma incremental (GET /operaciones/{codigo}/estadisticas).
+-- Los triggers de operacion_checklist suman/restan la diferencia de cada alta, cambio o borrado
+-- de tarea; el de operaciones recalcula los hitos de tracking cuando cambia datos_cotizacion.
+-- Los documentos por subcarpeta no están en la base: los cuenta la API con un índice de carpetas.
+
+CREATE TABLE IF NOT EXISTS operacion_estadisticas (
+    codigo_operacion text PRIMARY KEY,
+    tareas_total integer NOT NULL DEFAULT 0,
+    tareas_completadas integer NOT NULL DEFAULT 0,
+    hitos jsonb NOT NULL DEFAULT '{}'::jsonb,
+    actualizado timestamptz NOT NULL DEFAULT now()
+);
+
+-- Hitos de tracking cumplidos según datos_cotizacion (mismo criterio que hitos_operacion() en main.py)
+CREATE OR REPLACE FUNCTION hitos_operacion(p_datos jsonb)
+RETURNS jsonb LANGUAGE sql IMMUTABLE AS $$
+    SELECT jsonb_build_object(
+        'etd', coalesce(p_datos ->> 'etd', '') <> '',
+        'fecha_carga', coalesce(p_datos ->> 'fecha_carga', '') <> '',
+        'eta', coalesce(p_datos ->> 'eta', '') <> '',
+        'fecha_descarga', coalesce(p_datos ->> 'fecha_descarga', '') <> ''
+    )
+$$;
+
+-- Suma (p_signo = 1) o resta (p_signo = -1) una tarea a las estadísticas de su operación
+CREATE OR REPLACE FUNCTION operacion_estadisticas_tarea(
+    p_codigo text,
+    p_completada boolean,
+    p_signo integer
+) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    IF p_codigo IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO operacion_estadisticas (codigo_operacion) VALUES (p_codigo)
+    ON CONFLICT (codigo_operacion) DO NOTHING;
+
+    UPDATE operacion_estadisticas SET
+        tareas_total = tareas_total + p_signo,
+        tareas_completadas = tareas_completadas + CASE WHEN coalesce(p_completada, false) THEN p_signo ELSE 0 END,
+        actualizado = now()
+    WHERE codigo_operacion = p_codigo;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION trg_checklist_estadisticas()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM operacion_estadisticas_tarea(OLD.codigo_operacion, OLD.completada, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM operacion_estadisticas_tarea(NEW.codigo_operacion, NEW.completada, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS checklist_estadisticas ON operacion_checklist;
+CREATE TRIGGER checklist_estadisticas
+    AFTER INSERT OR DELETE OR UPDATE OF completada, codigo_operacion ON operacion_checklist
+    FOR EACH ROW EXECUTE FUNCTION trg_checklist_estadisticas();
+
+CREATE OR REPLACE FUNCTION trg_operaciones_hitos()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO operacion_estadisticas (codigo_operacion, hitos)
+    VALUES (NEW.codigo_operacion, hitos_operacion(NEW.datos_cotizacion))
+    ON CONFLICT (codigo_operacion) DO UPDATE SET
+        hitos = excluded.hitos,
+        actualizado = now();
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS operaciones_hitos ON operaciones;
+CREATE TRIGGER operaciones_hitos
+    AFTER INSERT OR UPDATE OF datos_cotizacion ON operaciones
+    FOR EACH ROW EXECUTE FUNCTION trg_operaciones_hitos();
+
+CREATE OR REPLACE FUNCTION trg_operaciones_estadisticas_borrar()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM operacion_estadisticas WHERE codigo_operacion = OLD.codigo_operacion;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS operaciones_estadisticas_borrar ON operaciones;
+CREATE TRIGGER operaciones_estadisticas_borrar
+    AFTER DELETE ON operaciones
+    FOR EACH ROW EXECUTE FUNCTION trg_operaciones_estadisticas_borrar();
+
+-- Carga inicial de las operaciones existentes
+INSERT INTO operacion_estadisticas (codigo_operacion, tareas_total, tareas_completadas, hitos)
+SELECT
+    o.codigo_operacion,
+    count(c.*)::integer,
+    (count(c.*) FILTER (WHERE c.completada))::integer,
+    hitos_operacion(o.datos_cotizacion)
+FROM operaciones o
+LEFT JOIN operacion_checklist c ON c.codigo_operacion = o.codigo_operacion
+GROUP BY o.codigo_operacion, o.datos_cotizacion
+ON CONFLICT (codigo_operacion) DO UPDATE SET
+    tareas_total = excluded.tareas_total,
+    tareas_completadas = excluded.tareas_completadas,
+    hitos = excluded.hitos,
+    actualizado = now();
@@ -0,0 +1,35 @@
+-- Actualización de tracking de muchas operaciones en una sola sentencia (POST /operaciones/tracking/lote
+-- y POST /operaciones/tracking). Cada item fusiona sus campos en datos_cotizacion con jsonb ||
+-- del lado de la base: no hay lectura previa ni se reescribe el JSONB completo desde la API.
+-- p_items: [{"codigo_operacion": "...", "campos": {"eta": "...", ...}}, ...] con códigos únicos.
+-- Devuelve una fila por item; actualizado = false si la operación no existe.
+-- Los triggers de migrations/005 recalculan los hitos de cada operación modificada.
+
+CREATE OR REPLACE FUNCTION actualizar_tracking_lote(
+    p_items jsonb,
+    p_devolver_datos boolean DEFAULT false
+)
+RETURNS TABLE (
+    codigo_operacion text,
+    actualizado boolean,
+    datos_cotizacion jsonb
+)
+LANGUAGE sql VOLATILE AS $$
+    WITH items AS (
+        SELECT i.codigo_operacion, coalesce(i.campos, '{}'::jsonb) AS campos
+        FROM jsonb_to_recordset(p_items) AS i(codigo_operacion text, campos jsonb)
+    ),
+    cambiadas AS (
+        UPDATE operaciones o
+        SET datos_cotizacion = coalesce(o.datos_cotizacion, '{}'::jsonb) || items.campos,
+            fecha_actualizacion = now()
+        FROM items
+        WHERE o.codigo_operacion = items.codigo_operacion
+        RETURNING o.codigo_operacion, o.datos_cotizacion
+    )
+    SELECT items.codigo_operacion,
+           cambiadas.codigo_operacion IS NOT NULL,
+           CASE WHEN p_devolver_datos THEN cambiadas.datos_cotizacion END
+    FROM items
+    LEFT JOIN cambiadas ON cambiadas.codigo_operacion = items.codigo_operacion
+$$;
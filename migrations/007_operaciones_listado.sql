@@ -0,0 +1,26 @@
+-- Listado paginado de operaciones (GET /operaciones?limit=...).
+-- La clave foránea cotizacion_origen -> cotizaciones.codigo_legible permite que PostgREST
+-- embeba el resumen de la cotización origen en la misma consulta ("cotizaciones(modo_transporte,...)").
+-- Se crea NOT VALID para no fallar con operaciones viejas cuya cotización ya no existe; las
+-- operaciones nuevas sí se validan.
+
+CREATE UNIQUE INDEX IF NOT EXISTS cotizaciones_codigo_legible_key
+    ON cotizaciones (codigo_legible);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'operaciones_cotizacion_origen_fkey') THEN
+        ALTER TABLE operaciones
+            ADD CONSTRAINT operaciones_cotizacion_origen_fkey
+            FOREIGN KEY (cotizacion_origen) REFERENCES cotizaciones (codigo_legible)
+            ON UPDATE CASCADE NOT VALID;
+    END IF;
+END $$;
+
+-- Orden del listado y cursor keyset: (fecha_creacion, id) descendente
+CREATE INDEX IF NOT EXISTS idx_operaciones_fecha_creacion_id
+    ON operaciones (fecha_creacion DESC, id DESC);
+
+-- Tablero filtrado por estado
+CREATE INDEX IF NOT EXISTS idx_operaciones_estado_fecha_creacion_id
+    ON operaciones (estado, fecha_creacion DESC, id DESC);
@@ -0,0 +1,85 @@
+-- Conversión cotización aceptada -> operación en una sola transacción (crear_operacion_automatica).
+-- Antes la API verificaba si existía, leía la cotización, buscaba el próximo número y
+-- recién insertaba: dos "aceptada" casi simultáneos podían crear dos operaciones o repetir código.
+-- Ahora:
+--   - una cotización tiene como mucho una operación (índice único en cotizacion_origen),
+--   - los números salen de operacion_secuencias (un contador por año/mes, incremento atómico),
+--   - la operación y su checklist inicial se crean juntas o no se crea nada,
+--   - volver a llamar con la misma cotización devuelve la operación existente (creada = false).
+-- Si ya hay operaciones duplicadas por cotización, resolverlas antes de crear el índice único.
+
+CREATE UNIQUE INDEX IF NOT EXISTS operaciones_cotizacion_origen_key
+    ON operaciones (cotizacion_origen);
+
+CREATE TABLE IF NOT EXISTS operacion_secuencias (
+    periodo text PRIMARY KEY,   -- 'YY/MM', como en GAN-OP-YY/MM/NNN
+    ultimo integer NOT NULL
+);
+
+-- Arrancar cada contador en el mayor número ya usado en ese período
+INSERT INTO operacion_secuencias (periodo, ultimo)
+SELECT substring(codigo_operacion FROM '^GAN-OP-(\d{2}/\d{2})/'),
+       max(substring(codigo_operacion FROM '/(\d+)$')::integer)
+FROM operaciones
+WHERE codigo_operacion ~ '^GAN-OP-\d{2}/\d{2}/\d+$'
+GROUP BY 1
+ON CONFLICT (periodo) DO UPDATE SET ultimo = greatest(operacion_secuencias.ultimo, EXCLUDED.ultimo);
+
+CREATE OR REPLACE FUNCTION convertir_cotizacion_en_operacion(
+    p_codigo_cotizacion text,
+    p_tareas jsonb DEFAULT '[]'::jsonb   -- tareas del checklist inicial, en orden
+)
+RETURNS TABLE (codigo_operacion text, creada boolean)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_cot cotizaciones%ROWTYPE;
+    v_periodo text := to_char(now(), 'YY/MM');
+    v_numero integer;
+    v_codigo text;
+BEGIN
+    -- Serializa las conversiones de la misma cotización hasta el fin de la transacción
+    PERFORM pg_advisory_xact_lock(hashtext('convertir_cotizacion:' || p_codigo_cotizacion));
+
+    SELECT o.codigo_operacion INTO v_codigo
+    FROM operaciones o WHERE o.cotizacion_origen = p_codigo_cotizacion;
+    IF FOUND THEN
+        RETURN QUERY SELECT v_codigo, false;
+        RETURN;
+    END IF;
+
+    SELECT * INTO v_cot FROM cotizaciones c WHERE c.codigo_legible = p_codigo_cotizacion;
+    IF NOT FOUND THEN
+        RETURN;  -- sin filas: la cotización no existe
+    END IF;
+
+    INSERT INTO operacion_secuencias AS s (periodo, ultimo) VALUES (v_periodo, 1)
+    ON CONFLICT (periodo) DO UPDATE SET ultimo = s.ultimo + 1
+    RETURNING s.ultimo INTO v_numero;
+    v_codigo := 'GAN-OP-' || v_periodo || '/' || lpad(v_numero::text, 3, '0');
+
+    INSERT INTO operaciones (
+        id, codigo_operacion, cotizacion_origen, cliente, tipo_operacion, estado,
+        fecha_creacion, fecha_actualizacion, datos_cotizacion
+    ) VALUES (
+        gen_random_uuid(), v_codigo, p_codigo_cotizacion, v_cot.cliente, v_cot.tipo_operacion, 'en_proceso',
+        now(), now(),
+        jsonb_build_object(
+            'referencia', v_cot.referencia,
+            'modo_transporte', v_cot.modo_transporte,
+            'origen', v_cot.origen,
+            'destino', v_cot.destino,
+            'equipo', v_cot.equipo,
+            'incoterm_origen', v_cot.incoterm_origen,
+            'incoterm_destino', v_cot.incoterm_destino,
+            'peso_total_kg', v_cot.peso_total_kg,
+            'volumen_m3', v_cot.volumen_m3
+        )
+    );
+
+    -- fecha_creacion creciente para que el checklist conserve el orden de la plantilla
+    INSERT INTO operacion_checklist (id, codigo_operacion, tarea, completada, usuario_creacion, fecha_creacion)
+    SELECT gen_random_uuid(), v_codigo, t.tarea, false, 'sistema', now() + t.orden * interval '1 microsecond'
+    FROM jsonb_array_elements_text(coalesce(p_tareas, '[]'::jsonb)) WITH ORDINALITY AS t(tarea, orden);
+
+    RETURN QUERY SELECT v_codigo, true;
+END $$;
@@ -0,0 +1,11 @@
+-- GET /operaciones ordena por fecha_creacion DESC NULLS LAST, id DESC: las operaciones sin
+-- fecha_creacion quedan al final y el cursor las recorre por id (antes rompían el cursor).
+-- Se recrean los índices de migrations/007 con el mismo orden para que el listado los siga usando.
+
+DROP INDEX IF EXISTS idx_operaciones_fecha_creacion_id;
+CREATE INDEX IF NOT EXISTS idx_operaciones_fecha_creacion_id
+    ON operaciones (fecha_creacion DESC NULLS LAST, id DESC);
+
+DROP INDEX IF EXISTS idx_operaciones_estado_fecha_creacion_id;
+CREATE INDEX IF NOT EXISTS idx_operaciones_estado_fecha_creacion_id
+    ON operaciones (estado, fecha_creacion DESC NULLS LAST, id DESC);
@@ -0,0 +1,72 @@
+# scripts/backfill_cliente_id.py
+"""
+Completa cotizaciones.cliente_id a partir del nombre guardado en cotizaciones.cliente.
+
+Uso:
+    python scripts/backfill_cliente_id.py            # aplica los cambios
+    python scripts/backfill_cliente_id.py --dry-run  # solo informa qué haría
+
+Requiere la migración migrations/001_cotizaciones_cliente_id.sql y las mismas
+variables SUPABASE_URL / SUPABASE_KEY que usa main.py.
+"""
+import argparse
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+from supabase import create_client
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("ganbatte_backfill")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Backfill de cotizaciones.cliente_id")
+    parser.add_argument("--dry-run", action="store_true", help="No escribe en la base, solo cuenta")
+    args = parser.parse_args()
+
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        logger.error("SUPABASE_URL y SUPABASE_KEY son obligatorios")
+        return 1
+    supabase = create_client(url, key)
+
+    clientes = supabase.table("clientes").select("id, nombre").execute().data or []
+    logger.info("Clientes a procesar: %s", len(clientes))
+
+    # Un UPDATE por cliente: cotizaciones sin vincular cuyo texto coincide con el nombre
+    total = 0
+    for cliente in clientes:
+        pendientes = supabase.table("cotizaciones") \
+            .select("id", count="exact") \
+            .eq("cliente", cliente["nombre"]) \
+            .is_("cliente_id", "null") \
+            .limit(1) \
+            .execute()
+        cantidad = pendientes.count or 0
+        if not cantidad:
+            continue
+
+        total += cantidad
+        logger.info("%s: %s cotizaciones", cliente["nombre"], cantidad)
+        if not args.dry_run:
+            supabase.table("cotizaciones") \
+                .update({"cliente_id": cliente["id"]}) \
+                .eq("cliente", cliente["nombre"]) \
+                .is_("cliente_id", "null") \
+                .execute()
+
+    sin_cliente = supabase.table("cotizaciones").select("id", count="exact").is_("cliente_id", "null").limit(1).execute()
+    logger.info(
+        "%s cotizaciones %s. Sin cliente coincidente: %s",
+        total, "a vincular (dry-run)" if args.dry_run else "vinculadas",
+        (sin_cliente.count or 0) - (total if args.dry_run else 0),
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+# scripts/exportar_snapshot.py
+"""
+Exporta cotizaciones, costos, operaciones y gastos locales a archivos columnares
+(Parquet o Arrow IPC) para análisis offline.
+
+Uso:
+    python scripts/exportar_snapshot.py                      # incremental desde el último snapshot
+    python scripts/exportar_snapshot.py --completo           # exporta todo de nuevo
+    python scripts/exportar_snapshot.py --formato ipc --tablas cotizaciones operaciones
+
+Lee la base por páginas ordenadas por (columna de marca, id) y escribe cada página
+como un row group, por lo que la memoria no crece con el tamaño de la tabla.
+El progreso queda en <salida>/_estado.json y la próxima ejecución solo trae
+las filas con marca posterior.
+
+Al unir los archivos de una tabla, quedarse con la fila del archivo más reciente por id:
+una fila modificada después de un snapshot vuelve a salir en el siguiente incremental.
+Si la marca es una fecha (sin hora) el incremental vuelve a leer el último día completo,
+así que esas filas se repiten siempre.
+
+costos_cotizacion se exporta completa en cada ejecución: guardar costos borra y vuelve a
+insertar las filas de la cotización, y un incremental no puede reflejar los borrados.
+Para esa tabla usar solo el último archivo.
+
+Requiere pyarrow (pip install pyarrow) y las variables SUPABASE_URL / SUPABASE_KEY.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from supabase import create_client
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dependencia opcional
+    pa = None
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("ganbatte_export")
+
+# Tipos de columna conocidos por tabla. Las columnas que no figuren se exportan como texto
+# (los dict/list como JSON). "json" = JSONB serializado.
+TABLAS: Dict[str, Dict[str, Any]] = {
+    "cotizaciones": {
+        "marca": "fecha_actualizacion",
+        "columnas": {
+            "codigo_legible": "string", "cliente": "string", "cliente_id": "string",
+            "tipo_operacion": "string", "modo_transporte": "string", "estado": "string",
+            "incoterm_origen": "string", "incoterm_destino": "string",
+            "origen": "string", "destino": "string", "linea_maritima": "string", "aerolinea": "string",
+            "equipo": "string", "tipo_contenedor": "string",
+            "cantidad_contenedores": "int64", "cantidad_bls": "int64", "cantidad_pallets": "int64",
+            "validez_dias": "int64", "transit_time_days": "int64", "dias_libres_almacenaje": "int64",
+            "valor_comercial": "float64", "peso_total_kg": "float64", "peso_cargable_kg": "float64",
+            "volumen_m3": "float64", "gastos_locales": "float64",
+            "transbordo": "bool", "aplica_alimentos": "bool", "tiene_hielo_seco": "bool",
+            "fecha_creacion": "timestamp", "fecha_actualizacion": "timestamp",
+            "fecha_estado": "timestamp", "fecha_validez": "timestamp",
+            "notificaciones_enviadas": "json",
+        },
+    },
+    "costos_cotizacion": {
+        "marca": "fecha_creacion",
+        # Las filas se borran y reinsertan al guardar costos: siempre export completo
+        "incremental": False,
+        "columnas": {
+            "codigo_cotizacion": "string", "concepto": "string", "tipo": "string", "moneda": "string",
+            "costo": "float64", "venta": "float64", "es_predefinido": "bool",
+            "detalles": "json", "fecha_creacion": "timestamp",
+        },
+    },
+    "operaciones": {
+        "marca": "fecha_actualizacion",
+        "columnas": {
+            "codigo_operacion": "string", "cotizacion_origen": "string", "cliente": "string",
+            "tipo_operacion": "string", "estado": "string", "datos_cotizacion": "json",
+            "fecha_creacion": "timestamp", "fecha_actualizacion": "timestamp",
+        },
+    },
+    "gastos_locales_maritimos": {
+        "marca": "fecha_actualizacion",
+        "columnas": {
+            "tipo_operacion": "string", "linea_maritima": "string", "equipo": "string",
+            "thc": "float64", "toll": "float64", "gate": "float64", "delivery_order": "float64",
+            "ccf": "float64", "handling": "float64", "logistic_fee": "float64", "bl_fee": "float64",
+            "ingreso_sim": "float64", "cert_flete": "float64", "cert_fob": "float64",
+            "total_locales": "float64", "beneficio": "string", "fecha_actualizacion": "date",
+        },
+    },
+}
+
+
+def tipo_arrow(tipo: str):
+    return {
+        "string": pa.string(),
+        "json": pa.large_string(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "date": pa.date32(),
+    }[tipo]
+
+
+def convertir(valor: Any, tipo: str) -> Any:
+    """Convierte un valor JSON de PostgREST al tipo Python que espera la columna Arrow."""
+    if valor is None or valor == "":
+        return None
+    if tipo == "json":
+        return json.dumps(valor, ensure_ascii=False, separators=(",", ":"))
+    if tipo == "string":
+        return valor if isinstance(valor, str) else json.dumps(valor, ensure_ascii=False)
+    if tipo == "timestamp":
+        fecha = datetime.fromisoformat(str(valor).replace("Z", "+00:00"))
+        return fecha if fecha.tzinfo else fecha.replace(tzinfo=timezone.utc)
+    if tipo == "date":
+        return date.fromisoformat(str(valor)[:10])
+    if tipo == "int64":
+        return int(float(valor))
+    if tipo == "float64":
+        return float(valor)
+    if tipo == "bool":
+        return bool(valor)
+    return valor
+
+
+def armar_esquema(tabla: str, primera_fila: Dict[str, Any]) -> Dict[str, str]:
+    """Columnas conocidas de la tabla + las que devuelva la base y no estén declaradas (como texto)."""
+    columnas = {"id": "string", **TABLAS[tabla]["columnas"]}
+    for nombre in primera_fila:
+        columnas.setdefault(nombre, "string")
+    return columnas
+
+
+def filtro_siguiente_pagina(marca: str, ultimo: Dict[str, Any]) -> str:
+    """Filtro keyset para las filas posteriores a `ultimo` en el orden (marca asc nulls last, id asc)."""
+    valor, ultimo_id = ultimo.get(marca), ultimo["id"]
+    if valor is None:
+        return f'and({marca}.is.null,id.gt."{ultimo_id}")'
+    return f'{marca}.gt."{valor}",and({marca}.eq."{valor}",id.gt."{ultimo_id}"),{marca}.is.null'
+
+
+def leer_paginas(supabase, tabla: str, desde: Optional[str], tamano: int) -> Iterator[List[Dict[str, Any]]]:
+    marca = TABLAS[tabla]["marca"]
+    ultimo: Optional[Dict[str, Any]] = None
+    while True:
+        # Un solo parámetro order: postgrest-py 0.11 repite "order" en cada .order() y PostgREST usa uno solo
+        query = supabase.table(tabla).select("*").order(f"{marca},id")
+        if desde:
+            # Con marca de tipo fecha, gt perdería las filas modificadas más tarde el mismo día
+            if TABLAS[tabla]["columnas"].get(marca) == "date":
+                query = query.gte(marca, desde)
+            else:
+                query = query.gt(marca, desde)
+        if ultimo is not None:
+            # postgrest-py 0.11 (supabase 1.1.1) no tiene .or_()
+            query.params = query.params.add("or", f"({filtro_siguiente_pagina(marca, ultimo)})")
+        filas = query.limit(tamano).execute().data or []
+        if not filas:
+            return
+        yield filas
+        if len(filas) < tamano:
+            return
+        ultimo = filas[-1]
+
+
+def exportar_tabla(supabase, tabla: str, salida: str, formato: str, tamano: int, estado: Dict[str, Any]) -> None:
+    marca = TABLAS[tabla]["marca"]
+    desde = (estado.get(tabla) or {}).get("marca") if TABLAS[tabla].get("incremental", True) else None
+    sello = datetime.now().strftime("%Y%m%dT%H%M%S")
+    extension = "parquet" if formato == "parquet" else "arrow"
+    carpeta = os.path.join(salida, tabla)
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = os.path.join(carpeta, f"{tabla}-{sello}{'-incremental' if desde else ''}.{extension}")
+
+    escritor = None
+    columnas: Dict[str, str] = {}
+    esquema = None
+    filas_totales = 0
+    marca_maxima = desde
+    try:
+        for filas in leer_paginas(supabase, tabla, desde, tamano):
+            if escritor is None:
+                columnas = armar_esquema(tabla, filas[0])
+                esquema = pa.schema([(nombre, tipo_arrow(tipo)) for nombre, tipo in columnas.items()])
+                if formato == "parquet":
+                    escritor = pq.ParquetWriter(ruta, esquema, compression="zstd")
+                else:
+                    escritor = pa_ipc.new_file(ruta, esquema, options=pa_ipc.IpcWriteOptions(compression="zstd"))
+
+            arrays = [
+                pa.array([convertir(f.get(nombre), tipo) for f in filas], type=tipo_arrow(tipo))
+                for nombre, tipo in columnas.items()
+            ]
+            lote = pa.Table.from_arrays(arrays, schema=esquema)
+            if formato == "parquet":
+                escritor.write_table(lote, row_group_size=len(filas))
+            else:
+                escritor.write_table(lote)
+
+            filas_totales += len(filas)
+            # Las páginas vienen ordenadas por marca (nulls al final): la última no nula es la mayor
+            marcas = [f.get(marca) for f in filas if f.get(marca) is not None]
+            if marcas:
+                marca_maxima = marcas[-1]
+            logger.info("%s: %s filas exportadas", tabla, filas_totales)
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+    if not filas_totales:
+        logger.info("%s: sin cambios desde %s", tabla, desde)
+        return
+
+    estado[tabla] = {
+        "marca": marca_maxima,
+        "archivo": ruta,
+        "filas": filas_totales,
+        "fecha": datetime.now().isoformat(),
+    }
+    logger.info("%s: %s filas -> %s", tabla, filas_totales, ruta)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Snapshot columnar de las tablas de cotizaciones y operaciones")
+    parser.add_argument("--salida", default=os.getenv("SNAPSHOT_DIR", "snapshots"), help="Carpeta de destino")
+    parser.add_argument("--formato", choices=["parquet", "ipc"], default="parquet")
+    parser.add_argument("--tablas", nargs="+", choices=list(TABLAS), default=list(TABLAS))
+    parser.add_argument("--filas-por-grupo", type=int, default=5000, help="Filas por página / row group")
+    parser.add_argument("--completo", action="store_true", help="Ignora el estado y exporta todas las filas")
+    args = parser.parse_args()
+
+    if pa is None:
+        logger.error("pyarrow no está instalado: pip install pyarrow")
+        return 1
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        logger.error("SUPABASE_URL y SUPABASE_KEY son obligatorios")
+        return 1
+    supabase = create_client(url, key)
+
+    os.makedirs(args.salida, exist_ok=True)
+    ruta_estado = os.path.join(args.salida, "_estado.json")
+    estado: Dict[str, Any] = {}
+    if os.path.exists(ruta_estado):
+        with open(ruta_estado, encoding="utf-8") as f:
+            estado = json.load(f)
+
+    for tabla in args.tablas:
+        if args.completo:
+            estado.pop(tabla, None)
+        exportar_tabla(supabase, tabla, args.salida, args.formato, args.filas_por_grupo, estado)
+        # Guardar después de cada tabla: si falla la siguiente, no se repite esta
+        with open(ruta_estado, "w", encoding="utf-8") as f:
+            json.dump(estado, f, indent=2, ensure_ascii=False)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())